@@ -0,0 +1,231 @@
+"""
+Login Sessions for CRM / GEM BID users
+A login starts a session: a short-lived JWT access token plus an opaque
+refresh token. POST /auth/refresh trades the refresh token for a new pair
+without touching `users` or checking the password again. Refresh tokens
+rotate: each one is single-use, and presenting a used one again (a stolen
+copy racing the real client) revokes the whole session. A token spent less
+than REFRESH_REUSE_GRACE_SECONDS ago is only refused, since that is usually
+a second browser tab refreshing at the same moment.
+
+Refresh tokens are stored only as SHA-256 hashes in `refresh_tokens`, with
+a TTL index on `expires_at` so MongoDB deletes them once they lapse.
+
+Access tokens carry the session id (`sid`). Revoking a session records it
+in `revoked_sessions` until every access token issued for it has expired;
+each worker keeps that set in memory and re-reads it every few seconds, so
+verify_token checks revocation with a set lookup instead of a query.
+
+Settings (environment):
+    ACCESS_TOKEN_EXPIRE_MINUTES   access token lifetime (default 15)
+    REFRESH_TOKEN_EXPIRE_DAYS     refresh token lifetime, renewed on every refresh (default 7)
+    SESSION_SYNC_SECONDS          how often revocations by other workers are picked up (default 10)
+    REFRESH_REUSE_GRACE_SECONDS   reuse of a just-spent token that does not revoke (default 10)
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = float(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+SESSION_SYNC_SECONDS = float(os.getenv("SESSION_SYNC_SECONDS", "10"))
+REFRESH_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_REUSE_GRACE_SECONDS", "10"))
+
+REFRESH_TOKENS_COLLECTION = "refresh_tokens"
+REVOKED_SESSIONS_COLLECTION = "revoked_sessions"
+
+# sid -> time after which no access token for the session is still valid
+revoked_sessions = {}
+sync_task = None
+
+
+def utcnow() -> datetime:
+    # Naive UTC, as MongoDB returns dates; TTL indexes treat them as UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _hash(refresh_token: str) -> str:
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+async def _issue_refresh_token(database, sid: str, email: str, name: str, system: str) -> str:
+    refresh_token = secrets.token_urlsafe(32)
+    now = utcnow()
+    await database[REFRESH_TOKENS_COLLECTION].insert_one({
+        "token_hash": _hash(refresh_token),
+        "sid": sid,
+        "email": email,
+        "name": name,
+        "system": system,
+        "used": False,
+        "created_at": now,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    })
+    return refresh_token
+
+
+async def create_session(database, user: dict, system: str) -> Tuple[str, str]:
+    """
+    Start a session for an authenticated user
+
+    Args:
+        database: MongoDB database instance
+        user: {"email", "name"}
+        system: "crm" or "gem_bid"
+
+    Returns:
+        tuple: (session id for the access token, refresh token for the client)
+    """
+    sid = str(uuid.uuid4())
+    return sid, await _issue_refresh_token(database, sid, user["email"], user["name"], system)
+
+
+async def rotate_refresh_token(database, refresh_token: str, system: str) -> Optional[Tuple[dict, str]]:
+    """
+    Redeem a refresh token for its successor
+
+    Args:
+        database: MongoDB database instance
+        refresh_token: Token presented by the client
+        system: "crm" or "gem_bid"; tokens only refresh the system they were issued for
+
+    Returns:
+        tuple: (session {"sid", "email", "name"}, new refresh token), or None
+        if the token is unknown, expired, revoked or already used
+    """
+    token_hash = _hash(refresh_token)
+    now = utcnow()
+    # Marking it used is atomic, so two concurrent refreshes cannot both win
+    session = await database[REFRESH_TOKENS_COLLECTION].find_one_and_update(
+        {"token_hash": token_hash, "system": system, "used": False, "expires_at": {"$gt": now}},
+        {"$set": {"used": True, "used_at": now}},
+        projection={"_id": 0, "sid": 1, "email": 1, "name": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if session is None:
+        reused = await database[REFRESH_TOKENS_COLLECTION].find_one(
+            {"token_hash": token_hash, "system": system, "used": True}, {"_id": 0, "sid": 1, "used_at": 1}
+        )
+        if reused and reused["used_at"] > now - timedelta(seconds=REFRESH_REUSE_GRACE_SECONDS):
+            logger.info(f"Refresh token reused within the grace window; {system} session {reused['sid']} kept")
+        elif reused:
+            logger.warning(f"Refresh token reused; revoking {system} session {reused['sid']}")
+            await revoke_session(database, reused["sid"])
+        return None
+    if is_revoked(session["sid"]):
+        return None
+    new_token = await _issue_refresh_token(database, session["sid"], session["email"], session["name"], system)
+    return session, new_token
+
+
+async def revoke_session(database, sid: str):
+    """
+    End a session: its refresh tokens are deleted and its access tokens
+    are refused from now until they expire
+
+    Args:
+        database: MongoDB database instance
+        sid: Session id
+    """
+    until = utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    revoked_sessions[sid] = until
+    await database[REVOKED_SESSIONS_COLLECTION].update_one(
+        {"sid": sid}, {"$set": {"sid": sid, "expires_at": until}}, upsert=True
+    )
+    await database[REFRESH_TOKENS_COLLECTION].delete_many({"sid": sid})
+
+
+async def revoke_refresh_token(database, refresh_token: str, system: str) -> bool:
+    """
+    Log out: revoke the session a refresh token belongs to
+
+    Returns:
+        bool: Whether the token belonged to a live session
+    """
+    token = await database[REFRESH_TOKENS_COLLECTION].find_one(
+        {"token_hash": _hash(refresh_token), "system": system}, {"_id": 0, "sid": 1}
+    )
+    if token is None:
+        return False
+    await revoke_session(database, token["sid"])
+    return True
+
+
+def is_revoked(sid: Optional[str]) -> bool:
+    """Whether access tokens of session `sid` must be refused (in-memory, no query)"""
+    return sid is not None and sid in revoked_sessions
+
+
+async def sync_revoked_sessions(database, prune_expired: bool = False):
+    """
+    Reload the revoked-session set and drop entries that have expired
+
+    Args:
+        database: MongoDB database instance
+        prune_expired: Also delete expired tokens and revocations, for
+            stores without a TTL monitor (the in-memory demo database)
+    """
+    now = utcnow()
+    if prune_expired:
+        await database[REFRESH_TOKENS_COLLECTION].delete_many({"expires_at": {"$lte": now}})
+        await database[REVOKED_SESSIONS_COLLECTION].delete_many({"expires_at": {"$lte": now}})
+    docs = await database[REVOKED_SESSIONS_COLLECTION].find(
+        {"expires_at": {"$gt": now}}, {"_id": 0, "sid": 1, "expires_at": 1}
+    ).to_list(None)
+    current = {doc["sid"]: doc["expires_at"] for doc in docs}
+    # Keep local revocations whose write may not be visible to this read yet
+    for sid, until in list(revoked_sessions.items()):
+        if until > now:
+            current.setdefault(sid, until)
+    revoked_sessions.clear()
+    revoked_sessions.update(current)
+
+
+def start_session_sync(database, prune_expired: bool = False):
+    """
+    Start the background task that keeps the revoked-session set current
+
+    Args:
+        database: MongoDB database instance
+        prune_expired: See sync_revoked_sessions
+    """
+    global sync_task
+    sync_task = asyncio.create_task(_sync_loop(database, prune_expired))
+
+
+async def stop_session_sync():
+    global sync_task
+    if sync_task:
+        sync_task.cancel()
+        await asyncio.gather(sync_task, return_exceptions=True)
+        sync_task = None
+
+
+async def _sync_loop(database, prune_expired: bool):
+    while True:
+        try:
+            await sync_revoked_sessions(database, prune_expired)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Revoked session sync failed: {e}")
+        await asyncio.sleep(SESSION_SYNC_SECONDS)
+
+
+def get_session_stats() -> dict:
+    return {
+        "revoked_sessions": len(revoked_sessions),
+        "access_token_expire_minutes": ACCESS_TOKEN_EXPIRE_MINUTES,
+        "refresh_token_expire_days": REFRESH_TOKEN_EXPIRE_DAYS,
+        "sync_seconds": SESSION_SYNC_SECONDS,
+    }
@@ -0,0 +1,111 @@
+"""
+Benchmark: authentication overhead per request
+
+1. Token verification alone: jwt.decode vs decode_token (cache hit)
+2. Per-request overhead in FastAPI: the same tiny endpoint with no auth,
+   with the previous dependency (sync `def`, so run in the threadpool, and
+   jwt.decode every time) and with the current one (async, cached decode),
+   driven in-process through httpx's ASGI transport
+
+Usage (from backend/):
+    python benchmarks/bench_auth.py
+    BENCH_REQUESTS=20000 python benchmarks/bench_auth.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import httpx
+import jwt
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from token_cache import decode_token
+
+BENCH_DECODES = int(os.getenv("BENCH_DECODES", "50000"))
+BENCH_REQUESTS = int(os.getenv("BENCH_REQUESTS", "5000"))
+SECRET_KEY = "benchmark-secret-key-of-at-least-32-bytes"
+ALGORITHM = "HS256"
+
+security = HTTPBearer()
+
+
+def verify_uncached(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        return jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+async def verify_cached(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    try:
+        return decode_token(credentials.credentials, SECRET_KEY, [ALGORITHM])
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+app = FastAPI()
+
+
+@app.get("/none")
+async def no_auth():
+    return {"ok": True}
+
+
+@app.get("/uncached")
+async def uncached(user: dict = Depends(verify_uncached)):
+    return {"ok": True}
+
+
+@app.get("/cached")
+async def cached(user: dict = Depends(verify_cached)):
+    return {"ok": True}
+
+
+def per_call_us(func, n):
+    start = time.perf_counter()
+    for _ in range(n):
+        func()
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def per_request_us(client, path, n):
+    for _ in range(100):
+        await client.get(path)
+    start = time.perf_counter()
+    for _ in range(n):
+        await client.get(path)
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main():
+    token = jwt.encode(
+        {"email": "bench@bora.tech", "name": "Bench", "exp": datetime.now(timezone.utc) + timedelta(hours=1)},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+    decode = per_call_us(lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), BENCH_DECODES)
+    cached_decode = per_call_us(lambda: decode_token(token, SECRET_KEY, [ALGORITHM]), BENCH_DECODES)
+    print(f"token verification, {BENCH_DECODES} calls")
+    print(f"{'jwt.decode':>24}{decode:>10.2f} us")
+    print(f"{'decode_token (hit)':>24}{cached_decode:>10.2f} us\n")
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        baseline = await per_request_us(client, "/none", BENCH_REQUESTS)
+        before = await per_request_us(client, "/uncached", BENCH_REQUESTS)
+        after = await per_request_us(client, "/cached", BENCH_REQUESTS)
+    print(f"per request, {BENCH_REQUESTS} sequential requests (auth overhead = request - no-auth request)")
+    print(f"{'':>24}{'request':>10}{'auth':>10}")
+    print(f"{'no auth':>24}{baseline:>10.1f}{0:>10.1f}")
+    print(f"{'sync + jwt.decode':>24}{before:>10.1f}{before - baseline:>10.1f}")
+    print(f"{'async + cache':>24}{after:>10.1f}{after - baseline:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
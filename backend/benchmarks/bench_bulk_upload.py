@@ -0,0 +1,72 @@
+"""
+Benchmark: streaming customer bulk upload
+
+Builds a customer sheet with N rows and posts it to
+POST /api/customers/bulk-upload against a scratch database, reporting wall
+time, rows/second and peak Python heap (tracemalloc) during the import.
+
+Usage (from backend/):
+    MONGO_URI=mongodb://localhost:27017 DB_NAME=crm_bench python benchmarks/bench_bulk_upload.py [rows]
+"""
+
+import io
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DB_NAME", "crm_bench_upload")
+
+from fastapi.testclient import TestClient  # noqa: E402
+import server  # noqa: E402
+
+ROWS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+
+def build_sheet(rows):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Customers")
+    ws.append(["Customer Name*", "Reference Name", "Contact Number*", "Email*"])
+    for i in range(rows):
+        ws.append([f"Bench Customer {i}", f"REF{i:06d}", f"98{i:08d}", f"bench{i}@example.com"])
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def main():
+    print(f"Building {ROWS:,}-row sheet...")
+    payload = build_sheet(ROWS)
+    print(f"Sheet size: {len(payload) / 1024 / 1024:.1f} MB")
+
+    token = server.create_access_token({"email": "bench@example.com", "name": "Bench"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    cleanup = {"customer_name": {"$regex": "^Bench Customer "}}
+    with TestClient(server.app) as client:
+        client.portal.call(server.db.customers.delete_many, cleanup)
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.post(
+            "/api/customers/bulk-upload",
+            files={"file": ("customers.xlsx", payload, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+            headers=headers,
+        )
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = response.json()
+        print(f"Status: {response.status_code}, created: {result.get('created')}, errors: {len(result.get('errors', []))}")
+        print(f"Elapsed: {elapsed:.2f}s ({ROWS / elapsed:,.0f} rows/s)")
+        print(f"Peak traced memory: {peak / 1024 / 1024:.1f} MB")
+
+        client.portal.call(server.db.customers.delete_many, cleanup)
+
+
+if __name__ == "__main__":
+    main()
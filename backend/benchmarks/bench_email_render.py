@@ -0,0 +1,115 @@
+"""
+Benchmark: rendering bid reminder emails
+
+Renders N reminder messages with
+  - the previous per-message f-string builder (inlined below as the baseline)
+  - the precompiled templates in email_service
+
+and reports the time for the bodies alone and for a complete serialized
+message (MIME build + as_bytes), which is what the dispatcher sends.
+
+Usage (from backend/):
+    python benchmarks/bench_email_render.py
+"""
+
+import os
+import sys
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from email_service import TEMPLATES, build_bid_reminder_message  # noqa: E402
+
+MESSAGE_COUNT = int(os.getenv("BENCH_MESSAGES", "10000"))
+EMAIL_FROM = EMAIL_TO = "crm@example.com"
+
+
+def legacy_bodies(gem_bid_no, bid_details, end_date):
+    text_content = f"""
+Please check this {gem_bid_no}.
+The bid end date is on tomorrow {end_date}.
+
+Bid Details:
+- Bid Number: {gem_bid_no}
+- Bid Details: {bid_details}
+- End Date: {end_date}
+
+This is an automated reminder from GEM BID CRM.
+"""
+    html_content = f"""
+<html>
+  <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
+    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px;">
+      <h2 style="color: #059669; border-bottom: 2px solid #059669; padding-bottom: 10px;">
+        GEM BID Reminder
+      </h2>
+      <p style="font-size: 16px;">
+        Please check this <strong>{gem_bid_no}</strong>.
+      </p>
+      <p style="font-size: 16px; color: #dc2626;">
+        ⚠️ The bid end date is <strong>tomorrow {end_date}</strong>.
+      </p>
+      <div style="background-color: #f3f4f6; padding: 15px; border-radius: 6px; margin: 20px 0;">
+        <h3 style="margin-top: 0; color: #059669;">Bid Details:</h3>
+        <ul style="list-style: none; padding: 0;">
+          <li style="padding: 5px 0;"><strong>Bid Number:</strong> {gem_bid_no}</li>
+          <li style="padding: 5px 0;"><strong>Bid Details:</strong> {bid_details}</li>
+          <li style="padding: 5px 0;"><strong>End Date:</strong> {end_date}</li>
+        </ul>
+      </div>
+      <p style="font-size: 14px; color: #6b7280; margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb;">
+        This is an automated reminder from GEM BID CRM.
+      </p>
+    </div>
+  </body>
+</html>
+"""
+    return text_content, html_content
+
+
+def legacy_message(gem_bid_no, bid_details, end_date):
+    message = MIMEMultipart("alternative")
+    message["From"] = EMAIL_FROM
+    message["To"] = EMAIL_TO
+    message["Subject"] = f"This {gem_bid_no} has been end on {end_date}"
+    text_content, html_content = legacy_bodies(gem_bid_no, bid_details, end_date)
+    message.attach(MIMEText(text_content, "plain"))
+    message.attach(MIMEText(html_content, "html"))
+    return message
+
+
+def template_bodies(gem_bid_no, bid_details, end_date):
+    context = {"gem_bid_no": gem_bid_no, "bid_details": bid_details, "end_date": end_date}
+    return TEMPLATES["bid_reminder.txt"].render(**context), TEMPLATES["bid_reminder.html"].render(**context)
+
+
+def timed(fn, reminders):
+    start = time.perf_counter()
+    for reminder in reminders:
+        fn(**reminder)
+    return time.perf_counter() - start
+
+
+def main():
+    reminders = [
+        {"gem_bid_no": f"GEM/2024/B/{i}", "bid_details": f"Supply of <item {i}> & spares", "end_date": "January 15, 2025"}
+        for i in range(MESSAGE_COUNT)
+    ]
+    cases = [
+        ("bodies: f-strings (no escaping)", legacy_bodies),
+        ("bodies: compiled templates", template_bodies),
+        ("message: f-strings + MIME", lambda **r: legacy_message(**r).as_bytes()),
+        ("message: templates + MIME", lambda **r: build_bid_reminder_message(**r).as_bytes()),
+    ]
+
+    print(f"{MESSAGE_COUNT} messages\n")
+    print(f"{'case':<34}{'total s':>10}{'us/msg':>10}")
+    for label, fn in cases:
+        elapsed = timed(fn, reminders)
+        print(f"{label:<34}{elapsed:>10.3f}{elapsed / MESSAGE_COUNT * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark: login latency and event-loop responsiveness under login load
+
+Starts `python serve.py` with one worker in demo mode, then:
+1. Probes the unauthenticated /api/ endpoint alone (baseline)
+2. Runs BENCH_CONNECTIONS concurrent login loops for BENCH_SECONDS while the
+   same probe keeps running, and reports login and probe latency percentiles
+
+bcrypt runs on the credentials thread pool, so the probe should stay close
+to its baseline however slow the logins are; if hashing ran on the event
+loop, every probe would queue behind the logins in flight.
+
+Usage (from backend/):
+    python benchmarks/bench_login.py
+    BCRYPT_ROUNDS=10 BENCH_CONNECTIONS=32 python benchmarks/bench_login.py
+"""
+
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+BENCH_SECONDS = float(os.getenv("BENCH_SECONDS", "5"))
+BENCH_CONNECTIONS = int(os.getenv("BENCH_CONNECTIONS", "16"))
+PROBE_INTERVAL = 0.01
+CRM_USER_EMAIL = os.getenv("CRM_USER_EMAIL", "sunil@bora.tech")
+CRM_USER_PASSWORD = os.getenv("CRM_USER_PASSWORD", "sunil@1202")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, data_dir):
+    env = {
+        **os.environ, "WEB_CONCURRENCY": "1", "HOST": "127.0.0.1", "PORT": str(port),
+        "DEMO_DATA_DIR": data_dir,
+        # Every benchmark login comes from 127.0.0.1
+        "LOGIN_MAX_FAILURES": "1000000", "LOGIN_MAX_IP_FAILURES": "1000000",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+
+def percentiles(latencies):
+    if not latencies:
+        return 0.0, 0.0
+    ordered = sorted(latencies)
+    return statistics.median(ordered) * 1000, ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+
+
+async def probe(client, stop):
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/api/")
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(PROBE_INTERVAL)
+    return latencies
+
+
+async def login_loop(client, stop):
+    latencies, failures = [], 0
+    body = {"email": CRM_USER_EMAIL, "password": CRM_USER_PASSWORD}
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post("/api/auth/login", json=body)
+        latencies.append(time.perf_counter() - started)
+        failures += response.status_code != 200
+    return latencies, failures
+
+
+async def measure(base_url, connections, seconds):
+    limits = httpx.Limits(max_connections=connections + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # Seeding (and the first hash) happens after startup
+        await client.post("/api/auth/login", json={"email": CRM_USER_EMAIL, "password": CRM_USER_PASSWORD})
+        stop = asyncio.Event()
+        probe_task = asyncio.create_task(probe(client, stop))
+        login_tasks = [asyncio.create_task(login_loop(client, stop)) for _ in range(connections)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        probe_latencies = await probe_task
+        results = await asyncio.gather(*login_tasks)
+    login_latencies = [latency for latencies, _ in results for latency in latencies]
+    failures = sum(failed for _, failed in results)
+    return probe_latencies, login_latencies, failures
+
+
+def main():
+    port = free_port()
+    with tempfile.TemporaryDirectory() as data_dir:
+        process, base_url = start_server(port, data_dir)
+        try:
+            baseline, _, _ = asyncio.run(measure(base_url, 0, BENCH_SECONDS))
+            probes, logins, failures = asyncio.run(measure(base_url, BENCH_CONNECTIONS, BENCH_SECONDS))
+        finally:
+            process.terminate()
+            process.wait()
+
+    print(f"BCRYPT_ROUNDS={os.getenv('BCRYPT_ROUNDS', '12')}, {BENCH_CONNECTIONS} concurrent login loops, "
+          f"{BENCH_SECONDS:.0f} s, {len(logins)} logins ({len(logins) / BENCH_SECONDS:.1f}/s), {failures} failed\n")
+    print(f"{'':>26}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, latencies in (("/api/ alone", baseline), ("/api/ during logins", probes), ("login", logins)):
+        p50, p99 = percentiles(latencies)
+        print(f"{label:>26}{p50:>10.1f}{p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
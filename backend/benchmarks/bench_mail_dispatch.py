@@ -0,0 +1,101 @@
+"""
+Benchmark: bid reminder throughput against a local SMTP stand-in
+
+Starts an aiosmtpd server on localhost and sends N reminder emails:
+  - one aiosmtplib.send() per message, one at a time (the old reminder loop)
+  - through MailDispatcher with several pool sizes
+
+and reports messages/second for each. SMTP_LATENCY_MS adds a delay to every
+DATA reply to approximate a remote provider; set it to 0 to measure pure
+client overhead.
+
+Usage (from backend/, needs `pip install aiosmtpd`):
+    python benchmarks/bench_mail_dispatch.py
+"""
+
+import asyncio
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from email_service import build_bid_reminder_message  # noqa: E402
+from mail_dispatcher import MailDispatcher  # noqa: E402
+
+MESSAGE_COUNT = int(os.getenv("BENCH_MESSAGES", "500"))
+SMTP_LATENCY_MS = float(os.getenv("SMTP_LATENCY_MS", "5"))
+POOL_SIZES = [1, 4, 8]
+
+
+class CountingHandler:
+    def __init__(self):
+        self.count = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        if SMTP_LATENCY_MS:
+            await asyncio.sleep(SMTP_LATENCY_MS / 1000)
+        self.count += 1
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def build_messages():
+    return [
+        build_bid_reminder_message(f"GEM/2024/B/{i}", f"Supply of item {i}", "January 15, 2025")
+        for i in range(MESSAGE_COUNT)
+    ]
+
+
+async def bench_send_per_message(host, port, messages):
+    start = time.perf_counter()
+    for message in messages:
+        await aiosmtplib.send(message, hostname=host, port=port, start_tls=False)
+    return time.perf_counter() - start
+
+
+async def bench_dispatcher(host, port, messages, pool_size):
+    dispatcher = MailDispatcher(hostname=host, port=port, start_tls=False, pool_size=pool_size)
+    start = time.perf_counter()
+    try:
+        results = await dispatcher.send_many(messages)
+    finally:
+        await dispatcher.close()
+    elapsed = time.perf_counter() - start
+    assert all(results), "dispatcher reported failed sends"
+    return elapsed, dispatcher.connections_opened
+
+
+async def main():
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+    controller.start()
+    try:
+        messages = build_messages()
+        print(f"{MESSAGE_COUNT} messages, {SMTP_LATENCY_MS:g} ms simulated DATA latency\n")
+        print(f"{'mode':<28}{'seconds':>10}{'msg/s':>10}{'connections':>14}")
+
+        elapsed = await bench_send_per_message(controller.hostname, controller.port, messages)
+        print(f"{'aiosmtplib.send per message':<28}{elapsed:>10.2f}{MESSAGE_COUNT / elapsed:>10.0f}{MESSAGE_COUNT:>14}")
+
+        for pool_size in POOL_SIZES:
+            elapsed, opened = await bench_dispatcher(controller.hostname, controller.port, messages, pool_size)
+            label = f"dispatcher pool={pool_size}"
+            print(f"{label:<28}{elapsed:>10.2f}{MESSAGE_COUNT / elapsed:>10.0f}{opened:>14}")
+
+        assert handler.count == MESSAGE_COUNT * (len(POOL_SIZES) + 1)
+    finally:
+        controller.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Benchmark: round-trips issued by the margin calculator
+
+Seeds a scratch database with N proforma invoices (each with linked purchase
+orders and freight entries), then counts the MongoDB commands issued by the
+old per-invoice loop and by the aggregation pipeline used by
+GET /api/margin-calculator.
+
+Usage (from backend/):
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/bench_margin_calculator.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from server import fetch_margin_rows  # noqa: E402
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+BENCH_DB = os.getenv("BENCH_DB_NAME", "crm_bench_margin")
+INVOICE_COUNTS = [10, 100, 1000]
+ORDERS_PER_INVOICE = 2
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(database, invoice_count):
+    await database.proforma_invoices.drop()
+    await database.purchase_orders.drop()
+    await database.margins.drop()
+
+    invoices, orders, margins = [], [], []
+    for i in range(invoice_count):
+        pf_id = str(uuid.uuid4())
+        invoices.append({
+            "id": pf_id,
+            "proforma_invoice_number": f"PI-{i:06d}",
+            "total_amount": 10000.0
+        })
+        for j in range(ORDERS_PER_INVOICE):
+            po_id = str(uuid.uuid4())
+            orders.append({
+                "id": po_id,
+                "purchase_order_number": f"PO-{i:06d}-{j}",
+                "proforma_invoice_id": pf_id,
+                "total_amount": 2500.0
+            })
+            margins.append({"proforma_invoice_id": pf_id, "purchase_order_id": po_id, "freight_amount": 150.0})
+
+    await database.proforma_invoices.insert_many(invoices)
+    await database.purchase_orders.insert_many(orders)
+    await database.margins.insert_many(margins)
+
+
+async def legacy_margin_rows(database):
+    """The pre-pipeline implementation: 1 + N + N*M round-trips"""
+    rows = []
+    for pf in await database.proforma_invoices.find({}, {"_id": 0}).to_list(1000):
+        for po in await database.purchase_orders.find({"proforma_invoice_id": pf["id"]}, {"_id": 0}).to_list(100):
+            margin_doc = await database.margins.find_one(
+                {"proforma_invoice_id": pf["id"], "purchase_order_id": po["id"]}, {"_id": 0}
+            )
+            rows.append((pf["id"], po["id"], margin_doc.get("freight_amount", 0) if margin_doc else 0))
+    return rows
+
+
+async def measure(counter, func, database):
+    counter.count = 0
+    start = time.perf_counter()
+    rows = await func(database)
+    return len(rows), counter.count, (time.perf_counter() - start) * 1000
+
+
+async def main():
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(MONGO_URI, event_listeners=[counter])
+    database = client[BENCH_DB]
+
+    print(f"{'invoices':>9} | {'rows':>6} | {'legacy trips':>12} | {'legacy ms':>10} | {'pipeline trips':>14} | {'pipeline ms':>11}")
+    print("-" * 78)
+    try:
+        for invoice_count in INVOICE_COUNTS:
+            await seed(database, invoice_count)
+            rows, legacy_trips, legacy_ms = await measure(counter, legacy_margin_rows, database)
+            _, pipeline_trips, pipeline_ms = await measure(counter, fetch_margin_rows, database)
+            print(f"{invoice_count:>9} | {rows:>6} | {legacy_trips:>12} | {legacy_ms:>10.1f} | {pipeline_trips:>14} | {pipeline_ms:>11.1f}")
+    finally:
+        await client.drop_database(BENCH_DB)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+Benchmark: in-memory storage engine vs. the legacy demo-mode MockDB
+
+Loads N customer-like documents into both stores and times the operations
+the API runs most: insert, find_one by id, update_one by id, a sorted page
+(newest 20), count by an indexed field and delete_one by id. The memory
+store gets the unique id and (created_date, id) page indexes db_migrations
+declares for paginated collections, plus one on status.
+
+The legacy MockDB is inlined below exactly as it behaved before it was
+replaced (linear scans, and sort() was a no-op, so its "sorted page" time
+is a lower bound for an unsorted result).
+
+Usage (from backend/):
+    python benchmarks/bench_memory_store.py
+    BENCH_SIZES=10000,100000,1000000 BENCH_OPS=200 python benchmarks/bench_memory_store.py
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from memory_store import MemoryDatabase
+
+BENCH_SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "10000,100000").split(",")]
+BENCH_OPS = int(os.getenv("BENCH_OPS", "200"))
+STATUSES = ["Active", "Inactive", "Prospect", "Closed"]
+EPOCH = datetime(2024, 1, 1)
+
+
+class LegacyCollection:
+    def __init__(self, name):
+        self.name = name
+        self.data = []
+
+    async def find_one(self, query, projection=None):
+        for item in self.data:
+            if self._match(item, query):
+                return item.copy()
+        return None
+
+    def _match(self, item, query):
+        if not query: return True
+        for k, v in query.items():
+            if isinstance(v, dict):
+                if "$ne" in v:
+                    if item.get(k) == v["$ne"]: return False
+                else:
+                    if item.get(k) != v: return False
+            elif item.get(k) != v:
+                return False
+        return True
+
+    def find(self, query=None, projection=None):
+        class LegacyCursor:
+            def __init__(self, data): self.data = data
+            def sort(self, *args, **kwargs): return self
+            def limit(self, n):
+                self.data = self.data[:n]
+                return self
+            async def to_list(self, length): return self.data
+
+        return LegacyCursor([item.copy() for item in self.data if self._match(item, query)])
+
+    async def insert_one(self, doc):
+        self.data.append(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        self.data.extend(docs)
+
+    async def update_one(self, query, update, upsert=False):
+        for item in self.data:
+            if self._match(item, query):
+                if "$set" in update: item.update(update["$set"])
+                return True
+        return True
+
+    async def delete_one(self, query):
+        for i, item in enumerate(self.data):
+            if self._match(item, query):
+                self.data.pop(i)
+                return
+
+    async def count_documents(self, query):
+        return len([item for item in self.data if self._match(item, query)])
+
+
+class LegacyDB:
+    def __init__(self):
+        self.collections = {}
+
+    def __getattr__(self, name):
+        if name not in self.collections: self.collections[name] = LegacyCollection(name)
+        return self.collections[name]
+
+
+def make_doc(i):
+    return {
+        "id": f"C{i:08d}",
+        "customer_name": f"Customer {i}",
+        "status": STATUSES[i % len(STATUSES)],
+        "city": f"City {i % 97}",
+        "created_date": (EPOCH + timedelta(minutes=i)).isoformat(),
+    }
+
+
+async def memory_store():
+    db = MemoryDatabase()
+    await db.customers.create_index("id", unique=True)
+    await db.customers.create_index("status")
+    await db.customers.create_index([("created_date", -1), ("id", -1)])
+    return db
+
+
+async def timed(ops, make_call):
+    start = time.perf_counter()
+    for i in range(ops):
+        await make_call(i)
+    return (time.perf_counter() - start) / ops * 1e6
+
+
+async def run(db, size):
+    customers = db.customers
+    ids = [f"C{random.randrange(size):08d}" for _ in range(BENCH_OPS)]
+    results = {}
+
+    start = time.perf_counter()
+    await customers.insert_many([make_doc(i) for i in range(size)], ordered=False)
+    results["load (s)"] = time.perf_counter() - start
+
+    results["insert_one"] = await timed(BENCH_OPS, lambda i: customers.insert_one(make_doc(size + i)))
+    results["find_one id"] = await timed(BENCH_OPS, lambda i: customers.find_one({"id": ids[i]}, {"_id": 0}))
+    results["update_one id"] = await timed(BENCH_OPS, lambda i: customers.update_one({"id": ids[i]}, {"$set": {"city": "Pune"}}))
+    results["sorted page"] = await timed(
+        BENCH_OPS, lambda i: customers.find({"status": "Active"}, {"_id": 0}).sort([("created_date", -1), ("id", -1)]).limit(20).to_list(20)
+    )
+    results["count status"] = await timed(BENCH_OPS, lambda i: customers.count_documents({"status": STATUSES[i % 4]}))
+    results["delete_one id"] = await timed(BENCH_OPS, lambda i: customers.delete_one({"id": f"C{size + i:08d}"}))
+    return results
+
+
+async def main():
+    print(f"{BENCH_OPS} ops per operation; times in microseconds per op\n")
+    for size in BENCH_SIZES:
+        legacy = await run(LegacyDB(), size)
+        memory = await run(await memory_store(), size)
+        print(f"{size:,} documents")
+        print(f"{'operation':>16}{'legacy':>14}{'memory':>14}{'speedup':>10}")
+        for name in legacy:
+            fmt = ".2f" if name.startswith("load") else ".1f"
+            speedup = legacy[name] / memory[name] if memory[name] else float("inf")
+            print(f"{name:>16}{legacy[name]:>14{fmt}}{memory[name]:>14{fmt}}{speedup:>9.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
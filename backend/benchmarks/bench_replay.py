@@ -0,0 +1,89 @@
+"""
+Benchmark: demo data startup replay
+
+Writes N customer-like documents (plus an update for every tenth) through a
+MemoryJournal in a scratch directory, then reopens the directory and times
+recovery from the operation log alone, and again after compaction from the
+snapshot. The collection has the unique id and page indexes db_migrations
+declares, so replay includes rebuilding them.
+
+Usage (from backend/):
+    python benchmarks/bench_replay.py
+    BENCH_DOCS=1000000 python benchmarks/bench_replay.py
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from memory_store import MemoryDatabase
+from memory_persistence import open_journal
+from db_migrations import run_migrations
+
+BENCH_DOCS = int(os.getenv("BENCH_DOCS", "100000"))
+EPOCH = datetime(2024, 1, 1)
+
+
+def make_doc(i):
+    return {
+        "id": f"C{i:08d}",
+        "customer_name": f"Customer {i}",
+        "email": f"customer{i}@example.com",
+        "city": f"City {i % 97}",
+        "gst_number": f"{i:015d}",
+        "created_date": (EPOCH + timedelta(minutes=i)).isoformat(),
+    }
+
+
+def directory_bytes(path):
+    return sum(entry.stat().st_size for entry in Path(path).iterdir() if entry.name != "LOCK")
+
+
+async def reopen(path):
+    db = MemoryDatabase()
+    started = time.perf_counter()
+    journal = await open_journal(db, path)
+    elapsed = time.perf_counter() - started
+    return db, journal, elapsed
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as path:
+        db, journal, _ = await reopen(path)
+        await run_migrations(db)
+        started = time.perf_counter()
+        await db.customers.insert_many([make_doc(i) for i in range(BENCH_DOCS)])
+        for i in range(0, BENCH_DOCS, 10):
+            await db.customers.update_one({"id": f"C{i:08d}"}, {"$set": {"city": "Pune"}})
+        written = time.perf_counter() - started
+        records = journal.log_bytes
+        await journal.close()
+        print(f"{BENCH_DOCS:,} documents + {BENCH_DOCS // 10:,} updates written in {written:.2f} s "
+              f"({(BENCH_DOCS * 1.1) / written:,.0f} records/s), log {records / 1e6:.1f} MB\n")
+
+        db, journal, log_replay = await reopen(path)
+        count = await db.customers.count_documents({})
+        started = time.perf_counter()
+        await journal.compact()
+        compaction = time.perf_counter() - started
+        await journal.close()
+
+        db, journal, snapshot_replay = await reopen(path)
+        assert await db.customers.count_documents({}) == count == BENCH_DOCS
+        assert await db.customers.count_documents({"city": "Pune"}) == BENCH_DOCS // 10
+        size = directory_bytes(path)
+        await journal.close()
+
+    print(f"{'recovery from':>16}{'seconds':>10}")
+    print(f"{'log':>16}{log_replay:>10.2f}")
+    print(f"{'snapshot':>16}{snapshot_replay:>10.2f}")
+    print(f"\ncompaction {compaction:.2f} s, snapshot {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,156 @@
+"""
+Benchmark: request throughput vs. number of uvicorn workers
+
+Starts `python serve.py` with WEB_CONCURRENCY=1, 2, 4, ... (up to the CPU
+count), logs in once, then drives an authenticated endpoint from several
+load-generator processes for a fixed duration and reports requests/second
+and latency percentiles per worker count.
+
+Needs MONGO_URI/DB_NAME (environment or backend/.env) pointing at a
+scratch database: without them serve.py runs demo mode on a single worker
+whatever WEB_CONCURRENCY says, so there would be nothing to compare.
+
+Usage (from backend/):
+    MONGO_URI=mongodb://localhost:27017 DB_NAME=crm_bench python benchmarks/bench_workers.py
+    BENCH_PATH=/api/customers BENCH_SECONDS=10 BENCH_CONNECTIONS=64 python benchmarks/bench_workers.py
+"""
+
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+from database import get_mongo_uri  # noqa: E402
+
+BENCH_PATH = os.getenv("BENCH_PATH", "/api/customers")
+BENCH_SECONDS = float(os.getenv("BENCH_SECONDS", "5"))
+BENCH_CONNECTIONS = int(os.getenv("BENCH_CONNECTIONS", "64"))
+LOAD_PROCESSES = int(os.getenv("BENCH_LOAD_PROCESSES", str(max(1, (os.cpu_count() or 2) // 2))))
+CRM_USER_EMAIL = os.getenv("CRM_USER_EMAIL", "sunil@bora.tech")
+CRM_USER_PASSWORD = os.getenv("CRM_USER_PASSWORD", "sunil@1202")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def worker_counts():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def start_server(workers, port):
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "HOST": "127.0.0.1", "PORT": str(port)}
+    process = subprocess.Popen(
+        [sys.executable, "serve.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/api/", timeout=1).status_code == 200:
+                return process, base_url
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f"server with {workers} worker(s) did not start")
+
+
+def login(base_url):
+    # Any worker answering is fine since the JWT is verified statelessly
+    response = httpx.post(f"{base_url}/api/auth/login", json={"email": CRM_USER_EMAIL, "password": CRM_USER_PASSWORD})
+    response.raise_for_status()
+    return response.json()["token"]
+
+
+async def drive(base_url, token, connections, seconds):
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + seconds
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits) as client:
+        async def connection():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(BENCH_PATH)
+                    if response.status_code != 200:
+                        errors += 1
+                        continue
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        await asyncio.gather(*(connection() for _ in range(connections)))
+    return latencies, errors
+
+
+def load_process(base_url, token, connections, seconds, results):
+    results.put(asyncio.run(drive(base_url, token, connections, seconds)))
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))] if values else 0.0
+
+
+def run(workers):
+    process, base_url = start_server(workers, free_port())
+    try:
+        token = login(base_url)
+        results = multiprocessing.Queue()
+        per_process = max(1, BENCH_CONNECTIONS // LOAD_PROCESSES)
+        loaders = [
+            multiprocessing.Process(target=load_process, args=(base_url, token, per_process, BENCH_SECONDS, results))
+            for _ in range(LOAD_PROCESSES)
+        ]
+        for loader in loaders:
+            loader.start()
+        latencies, errors = [], 0
+        for _ in loaders:
+            part, failed = results.get()
+            latencies.extend(part)
+            errors += failed
+        for loader in loaders:
+            loader.join()
+    finally:
+        process.terminate()
+        process.wait()
+
+    latencies.sort()
+    return len(latencies) / BENCH_SECONDS, percentile(latencies, 50), percentile(latencies, 99), errors
+
+
+def main():
+    load_dotenv(BACKEND_DIR / ".env")
+    if not get_mongo_uri():
+        print("MONGO_URI is not set: demo mode always runs one worker, so worker counts cannot be compared")
+        return 1
+    print(f"GET {BENCH_PATH} for {BENCH_SECONDS:g}s, {BENCH_CONNECTIONS} connections from {LOAD_PROCESSES} load process(es)\n")
+    print(f"{'workers':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for workers in worker_counts():
+        rps, p50, p99, errors = run(workers)
+        print(f"{workers:>8}{rps:>10.0f}{p50 * 1000:>10.1f}{p99 * 1000:>10.1f}{errors:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
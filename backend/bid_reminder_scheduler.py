@@ -1,38 +1,133 @@
 """
 Bid Reminder Scheduler for GEM BID CRM
 Automatically checks for bids ending tomorrow and sends email reminders
+
+SCHEDULER_JOBSTORE selects where job state lives:
+- "memory" (default): an in-process scheduler per worker, for single-worker runs
+- "mongo": jobs persist in the `scheduler_jobs` collection and only the
+  worker holding the `scheduler_locks` lease runs the scheduler, so
+  `--workers N` sends each reminder once. Runs missed while no worker was
+  leading (restart, deploy) fire once when a worker takes over.
+
+Other once-per-deployment background work registers with
+`add_leader_service` and runs alongside the scheduler on the leader.
 """
 
+import asyncio
 import logging
+import os
+import socket
+import uuid
 from datetime import datetime, timedelta, timezone
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from email_service import send_bid_reminder_email, format_date_for_display
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 logger = logging.getLogger(__name__)
 
+# Bids sent and flagged per round; one bulk_write per batch
+REMINDER_BATCH_SIZE = 100
+
+# "per_bid": one email per bid; "digest": one email listing all bids ending
+# tomorrow, grouped by department and city
+REMINDER_MODE = os.getenv("REMINDER_MODE", "per_bid").lower()
+
+SCHEDULER_JOBSTORE = os.getenv("SCHEDULER_JOBSTORE", "memory").lower()
+JOBS_COLLECTION = "scheduler_jobs"
+LOCK_COLLECTION = "scheduler_locks"
+LOCK_ID = "bid_reminder_scheduler"
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "60"))
+
+# A missed daily run is still worth sending up to a day late; coalesce
+# collapses several missed runs into one
+MISFIRE_GRACE_SECONDS = 24 * 60 * 60
+
+REMINDER_JOB_ID = 'bid_reminder_check'
+
+# Identifies this worker in the leader lock
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
 # Global scheduler instance
 scheduler = None
 db = None
+jobstore_config = None
+leader_task = None
+is_leader = False
+# (start, stop) pairs run on the leader; see add_leader_service
+leader_services = []
+services_running = False
+
+
+def reminder_trigger():
+    from apscheduler.triggers.cron import CronTrigger
+    
+    # Schedule daily check at 9:00 AM IST (03:30 UTC)
+    return CronTrigger(hour=3, minute=30, timezone=timezone.utc)
+
+
+def add_leader_service(start, stop):
+    """
+    Run a background service only on the scheduler leader
+
+    Register before init_scheduler. With the in-memory job store every
+    worker is its own leader.
+
+    Args:
+        start: fn() starting the service
+        stop: async fn() stopping it
+    """
+    leader_services.append((start, stop))
+
+
+def _start_leader_services():
+    global services_running
+    if services_running:
+        return
+    services_running = True
+    for start, _ in leader_services:
+        try:
+            start()
+        except Exception as e:
+            logger.error(f"Failed to start leader service {start}: {e}", exc_info=True)
+
+
+async def _stop_leader_services():
+    global services_running
+    if not services_running:
+        return
+    services_running = False
+    for _, stop in leader_services:
+        try:
+            await stop()
+        except Exception as e:
+            logger.error(f"Failed to stop leader service {stop}: {e}")
 
 
-def init_scheduler(database):
+def init_scheduler(database, mongo_uri: str = None, db_name: str = None):
     """
     Initialize the scheduler with database connection
     
     Args:
         database: MongoDB database instance
+        mongo_uri: Connection string for the persistent job store
+        db_name: Database holding the persistent job store
     """
-    global scheduler, db
+    global scheduler, db, jobstore_config, leader_task
     db = database
     
+    if SCHEDULER_JOBSTORE == "mongo" and mongo_uri and db_name:
+        jobstore_config = {"uri": mongo_uri, "database": db_name}
+        leader_task = asyncio.create_task(_lead_scheduler())
+        logger.info(f"📅 Persistent scheduler mode; worker {WORKER_ID} competing for leadership")
+        return
+    
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    
     scheduler = AsyncIOScheduler()
     
-    # Schedule daily check at 9:00 AM IST (03:30 UTC)
     scheduler.add_job(
         check_and_send_reminders,
-        CronTrigger(hour=3, minute=30),  # 9:00 AM IST
-        id='bid_reminder_check',
+        reminder_trigger(),  # 9:00 AM IST
+        id=REMINDER_JOB_ID,
         name='Check bids ending tomorrow and send reminders',
         replace_existing=True
     )
@@ -47,15 +142,118 @@ def init_scheduler(database):
     )
     
     scheduler.start()
+    _start_leader_services()
     logger.info("✅ Bid reminder scheduler initialized and started")
     logger.info("📅 Daily reminder check scheduled for 9:00 AM IST")
 
 
+def _start_persistent_scheduler(event_loop):
+    """
+    Start a scheduler on the Mongo job store, keeping any persisted state
+
+    Blocking (sync pymongo round trips), so it runs in a thread; the
+    scheduler itself runs its jobs on `event_loop`.
+    """
+    from apscheduler.jobstores.mongodb import MongoDBJobStore
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from pymongo import MongoClient
+    from database import client_options
+    
+    # A couple of sync connections suffice for the job store; kept out of the
+    # API pool metrics
+    client = MongoClient(jobstore_config["uri"], **client_options(maxPoolSize=2, minPoolSize=0, event_listeners=[]))
+    persistent = AsyncIOScheduler(
+        jobstores={"default": MongoDBJobStore(database=jobstore_config["database"], collection=JOBS_COLLECTION, client=client)},
+        job_defaults={"coalesce": True, "misfire_grace_time": MISFIRE_GRACE_SECONDS},
+        timezone=timezone.utc,
+        event_loop=event_loop
+    )
+    
+    # Start paused so the stored job (and its pending next_run_time) is
+    # inspected before anything fires; a past-due run fires on resume
+    persistent.start(paused=True)
+    job = persistent.get_job(REMINDER_JOB_ID)
+    trigger = reminder_trigger()
+    if job is None:
+        persistent.add_job(
+            check_and_send_reminders,
+            trigger,
+            id=REMINDER_JOB_ID,
+            name='Check bids ending tomorrow and send reminders'
+        )
+    elif str(job.trigger) != str(trigger):
+        persistent.reschedule_job(REMINDER_JOB_ID, trigger=trigger)
+    persistent.resume()
+    return persistent
+
+
+async def acquire_leadership() -> bool:
+    """
+    Take or renew the scheduler lease
+    
+    Returns:
+        bool: True if this worker holds the lease
+    """
+    now = datetime.now(timezone.utc)
+    try:
+        lock = await db[LOCK_COLLECTION].find_one_and_update(
+            {"_id": LOCK_ID, "$or": [{"owner": WORKER_ID}, {"expires_at": {"$lt": now}}]},
+            {"$set": {"owner": WORKER_ID, "expires_at": now + timedelta(seconds=LEASE_SECONDS), "renewed_at": now}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Another worker holds an unexpired lease
+        return False
+    return lock is not None and lock.get("owner") == WORKER_ID
+
+
+async def _lead_scheduler():
+    global scheduler, is_leader
+    try:
+        while True:
+            try:
+                leading = await acquire_leadership()
+            except Exception as e:
+                logger.error(f"Scheduler lease check failed: {e}")
+                leading = False
+            
+            if leading and scheduler is None:
+                try:
+                    scheduler = await asyncio.to_thread(_start_persistent_scheduler, asyncio.get_running_loop())
+                    logger.info(f"👑 Worker {WORKER_ID} is the scheduler leader")
+                    _start_leader_services()
+                except Exception as e:
+                    # Keep the lease and retry on the next tick
+                    logger.error(f"Failed to start the persistent scheduler: {e}", exc_info=True)
+            elif not leading and scheduler is not None:
+                scheduler.shutdown(wait=False)
+                scheduler = None
+                await _stop_leader_services()
+                logger.info(f"Worker {WORKER_ID} lost the scheduler lease")
+            is_leader = leading
+            
+            # Renew well before the lease runs out
+            await asyncio.sleep(LEASE_SECONDS / 3)
+    finally:
+        if scheduler is not None:
+            scheduler.shutdown(wait=False)
+            scheduler = None
+        await _stop_leader_services()
+        if is_leader:
+            is_leader = False
+            # Let another worker take over without waiting for expiry
+            await db[LOCK_COLLECTION].delete_one({"_id": LOCK_ID, "owner": WORKER_ID})
+
+
 async def check_and_send_reminders():
     """
     Check for bids ending tomorrow and send email reminders
     This function runs daily via the scheduler
     """
+    # Email machinery (aiosmtplib, templates) loads on the first run, not at import
+    from email_service import close_mail_dispatcher, format_date_for_display
+    
     try:
         logger.info("🔍 Starting daily bid reminder check...")
         
@@ -66,71 +264,49 @@ async def check_and_send_reminders():
         
         logger.info(f"📆 Checking for bids ending on: {tomorrow_str}")
         
-        # Query bids ending tomorrow
-        # We need to check if the bid's end_date matches tomorrow
-        # and if we haven't already sent a reminder for this bid
-        
-        query = {
+        # Query bids ending tomorrow that have not been reminded yet; the
+        # (end_date, reminder_sent) index from db_migrations v5 serves it
+        ending_tomorrow = {
             "end_date": {
                 "$gte": tomorrow_str,
                 "$lt": (tomorrow + timedelta(days=1)).isoformat()
             }
         }
-        
-        bids = await db.gem_bids.find(query, {"_id": 0}).to_list(1000)
-        
-        if not bids:
-            logger.info("✅ No bids ending tomorrow. No reminders to send.")
-            return
-        
-        logger.info(f"📧 Found {len(bids)} bid(s) ending tomorrow")
+        query = {**ending_tomorrow, "reminder_sent": {"$ne": True}}
+        projection = {"_id": 0, "id": 1, "gem_bid_no": 1, "Bid_details": 1, "description": 1, "end_date": 1, "department": 1, "city": 1}
+        digest_mode = REMINDER_MODE == "digest"
         
         # Track reminders sent
         reminders_sent = 0
         reminders_failed = 0
-        reminders_skipped = 0
+        reminders_skipped = await db.gem_bids.count_documents({**ending_tomorrow, "reminder_sent": True})
+        total_bids = reminders_skipped
         
-        for bid in bids:
-            bid_id = bid.get("id")
-            gem_bid_no = bid.get("gem_bid_no", "N/A")
-            bid_details = bid.get("Bid_details") or bid.get("description") or "No details available"
-            end_date = bid.get("end_date", "N/A")
-            
-            # Check if reminder already sent for this bid
-            reminder_sent = bid.get("reminder_sent", False)
-            
-            if reminder_sent:
-                logger.info(f"⏭️  Skipping {gem_bid_no} - reminder already sent")
-                reminders_skipped += 1
-                continue
-            
-            # Format date for display
-            formatted_date = format_date_for_display(end_date)
-            
-            # Send email reminder
-            logger.info(f"📤 Sending reminder for bid: {gem_bid_no}")
-            success = await send_bid_reminder_email(
-                gem_bid_no=gem_bid_no,
-                bid_details=bid_details,
-                end_date=formatted_date
-            )
-            
-            if success:
-                # Mark reminder as sent in database
-                await db.gem_bids.update_one(
-                    {"id": bid_id},
-                    {"$set": {"reminder_sent": True, "reminder_sent_at": datetime.now(timezone.utc).isoformat()}}
-                )
-                reminders_sent += 1
-                logger.info(f"✅ Reminder sent and marked for bid: {gem_bid_no}")
-            else:
-                reminders_failed += 1
-                logger.warning(f"⚠️  Failed to send reminder for bid: {gem_bid_no}")
+        # Stream the cursor: per-bid mode sends and flags one batch at a time,
+        # digest mode collects every bid for a single email
+        batch = []
+        async for bid in db.gem_bids.find(query, projection).batch_size(REMINDER_BATCH_SIZE):
+            total_bids += 1
+            batch.append(bid)
+            if len(batch) >= REMINDER_BATCH_SIZE and not digest_mode:
+                sent, failed = await send_reminder_batch(batch)
+                reminders_sent, reminders_failed = reminders_sent + sent, reminders_failed + failed
+                batch = []
+        if batch and digest_mode:
+            sent, failed = await send_reminder_digest(batch, format_date_for_display(tomorrow_str))
+            reminders_sent, reminders_failed = reminders_sent + sent, reminders_failed + failed
+        elif batch:
+            sent, failed = await send_reminder_batch(batch)
+            reminders_sent, reminders_failed = reminders_sent + sent, reminders_failed + failed
+        
+        if not total_bids:
+            logger.info("✅ No bids ending tomorrow. No reminders to send.")
+            return
         
         # Summary log
         logger.info("=" * 60)
-        logger.info("📊 Bid Reminder Check Summary:")
-        logger.info(f"   Total bids ending tomorrow: {len(bids)}")
+        logger.info(f"📊 Bid Reminder Check Summary ({REMINDER_MODE}):")
+        logger.info(f"   Total bids ending tomorrow: {total_bids}")
         logger.info(f"   ✅ Reminders sent: {reminders_sent}")
         logger.info(f"   ⏭️  Reminders skipped (already sent): {reminders_skipped}")
         logger.info(f"   ❌ Reminders failed: {reminders_failed}")
@@ -138,15 +314,104 @@ async def check_and_send_reminders():
         
     except Exception as e:
         logger.error(f"❌ Error in bid reminder check: {str(e)}", exc_info=True)
+    finally:
+        await close_mail_dispatcher()
+
+
+def bid_details_text(bid: dict) -> str:
+    return bid.get("Bid_details") or bid.get("description") or "No details available"
 
 
-def shutdown_scheduler():
+async def mark_reminders_sent(bid_ids):
     """
-    Shutdown the scheduler gracefully
+    Flag bids as reminded, one bulk_write per REMINDER_BATCH_SIZE bids
     """
-    global scheduler
-    if scheduler:
+    sent_at = datetime.now(timezone.utc).isoformat()
+    for i in range(0, len(bid_ids), REMINDER_BATCH_SIZE):
+        await db.gem_bids.bulk_write([
+            UpdateOne({"id": bid_id}, {"$set": {"reminder_sent": True, "reminder_sent_at": sent_at}})
+            for bid_id in bid_ids[i:i + REMINDER_BATCH_SIZE]
+        ], ordered=False)
+
+
+async def send_reminder_digest(bids, end_date: str):
+    """
+    Send one digest email for every bid ending tomorrow and flag them all
+    
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    from email_service import send_bid_digest
+    
+    logger.info(f"📤 Sending reminder digest for {len(bids)} bid(s)")
+    success = await send_bid_digest([
+        {
+            "gem_bid_no": bid.get("gem_bid_no", "N/A"),
+            "bid_details": bid_details_text(bid),
+            "department": bid.get("department"),
+            "city": bid.get("city")
+        }
+        for bid in bids
+    ], end_date)
+    if not success:
+        return 0, len(bids)
+    await mark_reminders_sent([bid.get("id") for bid in bids])
+    return len(bids), 0
+
+
+async def send_reminder_batch(bids):
+    """
+    Send reminders for a batch of bids and flag the delivered ones
+    
+    Args:
+        bids: Bid documents that have not been reminded yet
+        
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    from email_service import send_bid_reminders, format_date_for_display
+    
+    reminders = [
+        {
+            "gem_bid_no": bid.get("gem_bid_no", "N/A"),
+            "bid_details": bid_details_text(bid),
+            "end_date": format_date_for_display(bid.get("end_date", "N/A"))
+        }
+        for bid in bids
+    ]
+    
+    # Send over pooled SMTP connections, a few at a time
+    logger.info(f"📤 Sending {len(reminders)} reminder(s)")
+    results = await send_bid_reminders(reminders)
+    
+    delivered = []
+    for bid, reminder, success in zip(bids, reminders, results):
+        if success:
+            delivered.append(bid.get("id"))
+            logger.info(f"✅ Reminder sent for bid: {reminder['gem_bid_no']}")
+        else:
+            logger.warning(f"⚠️  Failed to send reminder for bid: {reminder['gem_bid_no']}")
+    
+    # Mark delivered reminders as sent in one round-trip
+    if delivered:
+        await mark_reminders_sent(delivered)
+    return len(delivered), len(bids) - len(delivered)
+
+
+async def shutdown_scheduler():
+    """
+    Shutdown the scheduler gracefully, releasing the leader lease if held
+    """
+    global scheduler, leader_task
+    if leader_task:
+        leader_task.cancel()
+        await asyncio.gather(leader_task, return_exceptions=True)
+        leader_task = None
+        logger.info("🛑 Bid reminder scheduler stopped")
+    elif scheduler:
         scheduler.shutdown()
+        scheduler = None
+        await _stop_leader_services()
         logger.info("🛑 Bid reminder scheduler stopped")
 
 
@@ -158,6 +423,8 @@ def get_scheduler_status():
         dict: Scheduler status information
     """
     global scheduler
+    if leader_task and not scheduler:
+        return {"status": "standby", "jobstore": "mongo", "leader": False, "worker": WORKER_ID, "jobs": []}
     if not scheduler:
         return {"status": "not_initialized"}
     
@@ -173,5 +440,8 @@ def get_scheduler_status():
     
     return {
         "status": "running" if scheduler.running else "stopped",
+        "jobstore": "mongo" if leader_task else "memory",
+        "leader": is_leader if leader_task else True,
+        "worker": WORKER_ID,
         "jobs": job_info
     }
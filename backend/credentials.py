@@ -0,0 +1,225 @@
+"""
+Credential Store for CRM / GEM BID users
+Passwords are stored as bcrypt hashes (`password_hash` on the user document)
+through passlib, never in plaintext. Hashing and verification are CPU-bound
+(~0.2 s at the default cost), so they run on a small dedicated thread pool
+and the event loop keeps serving other requests meanwhile; bcrypt releases
+the GIL while it works.
+
+Raising the cost factor takes effect for existing users at their next
+login: verify_password returns a replacement hash when the stored one was
+made with a different cost.
+
+Failed logins are rate-limited in memory per client IP + email and per
+client IP, so passwords cannot be guessed at bcrypt speed. Each attempt is
+counted before its password is checked and refunded if it succeeds, so
+concurrent requests cannot overshoot the limit while bcrypt runs.
+
+Settings (environment):
+    BCRYPT_ROUNDS             cost factor, 2^rounds iterations (default 12)
+    CREDENTIAL_WORKERS        hashing threads (default: CPU count)
+    LOGIN_MAX_FAILURES        failures per IP + email per window (default 5)
+    LOGIN_MAX_IP_FAILURES     failures per IP per window (default 50)
+    LOGIN_FAILURE_WINDOW      window in seconds (default 300)
+"""
+
+import asyncio
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+# passlib 1.7 probes bcrypt.__about__ (gone in bcrypt 4.1) and logs a
+# harmless traceback on first use
+logging.getLogger("passlib").setLevel(logging.ERROR)
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+CREDENTIAL_WORKERS = int(os.getenv("CREDENTIAL_WORKERS", str(os.cpu_count() or 2)))
+LOGIN_MAX_FAILURES = int(os.getenv("LOGIN_MAX_FAILURES", "5"))
+LOGIN_MAX_IP_FAILURES = int(os.getenv("LOGIN_MAX_IP_FAILURES", "50"))
+LOGIN_FAILURE_WINDOW = float(os.getenv("LOGIN_FAILURE_WINDOW", "300"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    # Hashes made with a lower cost are upgraded on the next login
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = None
+_dummy_hash = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=CREDENTIAL_WORKERS, thread_name_prefix="credentials")
+    return _executor
+
+
+async def _run(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_get_executor(), func, *args)
+
+
+async def hash_password(password: str) -> str:
+    """bcrypt hash of `password`, computed off the event loop"""
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password(password: str, password_hash: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Check `password` against a stored hash, off the event loop
+
+    With no stored hash (unknown user) a dummy hash is checked instead, so
+    the response time does not reveal whether the account exists.
+
+    Returns:
+        tuple: (matches, replacement hash to store or None)
+    """
+    global _dummy_hash
+    if not password_hash:
+        if _dummy_hash is None:
+            _dummy_hash = await hash_password("dummy-password-for-unknown-users")
+        await _run(pwd_context.verify, password, _dummy_hash)
+        return False, None
+    try:
+        return await _run(pwd_context.verify_and_update, password, password_hash)
+    except ValueError:
+        logger.error("Stored password hash is not a recognised bcrypt hash")
+        return False, None
+
+
+def matches_plaintext(password: str, expected: str) -> bool:
+    """Constant-time comparison for credentials configured in the environment"""
+    return hmac.compare_digest(password.encode(), expected.encode())
+
+
+def shutdown_credentials():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
+
+
+class LoginRateLimiter:
+    """
+    Sliding-window count of failed logins per key
+
+    Args:
+        limit: Failures allowed per window
+        window: Window length in seconds
+        max_keys: Keys tracked at once; the least recently failed are dropped
+    """
+
+    def __init__(self, limit: int, window: float = LOGIN_FAILURE_WINDOW, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.failures = OrderedDict()  # key -> deque of failure times
+        self.lock = threading.Lock()
+        self.rejected = 0
+
+    def _recent(self, key, now):
+        times = self.failures.get(key)
+        if times is None:
+            return None
+        while times and times[0] <= now - self.window:
+            times.popleft()
+        if not times:
+            del self.failures[key]
+            return None
+        return times
+
+    def _limited(self, times, now) -> float:
+        if times is None or len(times) < self.limit:
+            return 0.0
+        self.rejected += 1
+        return times[0] + self.window - now
+
+    def _append(self, key, times, now):
+        if times is None:
+            times = self.failures[key] = deque(maxlen=self.limit)
+        times.append(now)
+        self.failures.move_to_end(key)
+        while len(self.failures) > self.max_keys:
+            self.failures.popitem(last=False)
+
+    def retry_after(self, key) -> float:
+        """Seconds until `key` may try again; 0 if it is not limited"""
+        now = time.monotonic()
+        with self.lock:
+            return self._limited(self._recent(key, now), now)
+
+    def record_failure(self, key):
+        now = time.monotonic()
+        with self.lock:
+            self._append(key, self._recent(key, now), now)
+
+    def reserve(self, key) -> float:
+        """
+        Count an attempt for `key` up front, unless it is limited
+
+        Returns:
+            float: Seconds until `key` may try again; 0 if the attempt was counted
+        """
+        now = time.monotonic()
+        with self.lock:
+            times = self._recent(key, now)
+            retry_after = self._limited(times, now)
+            if not retry_after:
+                self._append(key, times, now)
+            return retry_after
+
+    def refund(self, key):
+        """Uncount the latest attempt for `key`"""
+        with self.lock:
+            times = self.failures.get(key)
+            if times:
+                times.pop()
+                if not times:
+                    del self.failures[key]
+
+    def reset(self, key):
+        with self.lock:
+            self.failures.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"tracked_keys": len(self.failures), "rejected": self.rejected, "limit": self.limit, "window_seconds": self.window}
+
+
+account_limiter = LoginRateLimiter(LOGIN_MAX_FAILURES)
+ip_limiter = LoginRateLimiter(LOGIN_MAX_IP_FAILURES)
+
+
+def reserve_login_attempt(client: str, email: str, system: str) -> float:
+    """
+    Count a login attempt as failed before its password is checked
+
+    Returns:
+        float: Seconds the client must wait (0 = counted, go ahead)
+    """
+    account = (client, system, email.lower())
+    retry_after = account_limiter.reserve(account)
+    if retry_after:
+        return retry_after
+    retry_after = ip_limiter.reserve(client)
+    if retry_after:
+        account_limiter.refund(account)
+    return retry_after
+
+
+def record_login_success(client: str, email: str, system: str):
+    """Refund the attempt reserved by reserve_login_attempt and clear the account's failures"""
+    account_limiter.reset((client, system, email.lower()))
+    ip_limiter.refund(client)
+
@@ -0,0 +1,183 @@
+"""
+Materialized Dashboard KPIs for the CRM
+Keeps a single `dashboard_stats` document up to date from the write
+handlers so GET /api/dashboard/kpi is one read by _id.
+
+Margin summary: every proforma invoice with at least one linked purchase
+order contributes (invoice total - linked PO totals). Each invoice stores its
+current contribution in `margin_contribution`, so a change only needs to
+apply the difference to the running total.
+
+The counters are maintained with separate writes and can drift under
+concurrent edits; `reconcile_dashboard_stats` rebuilds them from scratch:
+    python dashboard_stats.py --reconcile
+
+Deltas only apply to a reconciled document (one with `reconciled_at`);
+until startup has rebuilt it, writes leave the counters alone rather than
+creating a document that holds just their own delta.
+"""
+
+import logging
+import sys
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STATS_COLLECTION = "dashboard_stats"
+STATS_ID = "global"
+
+STAT_FIELDS = ["total_customers", "active_leads", "total_proforma_invoices", "total_purchase_orders", "margin_summary"]
+
+# Per-invoice margin contribution, matching the original KPI $lookup
+CONTRIBUTION_PIPELINE = [
+    {"$lookup": {
+        "from": "purchase_orders",
+        "localField": "id",
+        "foreignField": "proforma_invoice_id",
+        "as": "linked_orders"
+    }},
+    {"$match": {"linked_orders.0": {"$exists": True}}},
+    {"$project": {
+        "_id": 0,
+        "id": 1,
+        "margin_contribution": {"$subtract": [
+            {"$ifNull": ["$total_amount", 0]},
+            {"$sum": {"$map": {
+                "input": "$linked_orders",
+                "as": "po",
+                "in": {"$ifNull": ["$$po.total_amount", {"$ifNull": ["$$po.amount", 0]}]}
+            }}}
+        ]}
+    }}
+]
+
+
+def po_amount(po: dict) -> float:
+    return po.get("total_amount", po.get("amount", 0)) or 0
+
+
+async def bump_stats(database, **deltas):
+    """
+    Apply counter deltas to the stats document, e.g. bump_stats(db, total_customers=1)
+
+    Skipped until the document has been reconciled; the rebuild counts
+    the change anyway.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+    await database[STATS_COLLECTION].update_one(
+        {"_id": STATS_ID, "reconciled_at": {"$exists": True}},
+        {"$inc": deltas, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
+
+async def refresh_proforma_margin(database, proforma_id: str, deleted_invoice: dict = None):
+    """
+    Recompute one invoice's margin contribution and apply the change
+
+    Call after any write that changes an invoice total or its linked
+    purchase orders. For a deleted invoice pass the removed document so its
+    last contribution can be subtracted.
+    """
+    if not proforma_id:
+        return
+
+    if deleted_invoice is not None:
+        await bump_stats(database, margin_summary=-deleted_invoice.get("margin_contribution", 0))
+        return
+
+    invoice = await database.proforma_invoices.find_one(
+        {"id": proforma_id}, {"_id": 0, "total_amount": 1, "margin_contribution": 1}
+    )
+    if not invoice:
+        return
+
+    orders = await database.purchase_orders.find(
+        {"proforma_invoice_id": proforma_id}, {"_id": 0, "total_amount": 1, "amount": 1}
+    ).to_list(None)
+    contribution = invoice.get("total_amount", 0) - sum(po_amount(po) for po in orders) if orders else 0
+
+    delta = contribution - invoice.get("margin_contribution", 0)
+    if delta:
+        await database.proforma_invoices.update_one(
+            {"id": proforma_id}, {"$set": {"margin_contribution": contribution}}
+        )
+        await bump_stats(database, margin_summary=delta)
+
+
+async def get_dashboard_stats(database):
+    """
+    Read the KPI document, rebuilding it first if it was never reconciled
+
+    Returns:
+        dict: KPI counters with the margin summary rounded to 2 places
+    """
+    stats = await database[STATS_COLLECTION].find_one({"_id": STATS_ID})
+    if not stats or "reconciled_at" not in stats:
+        stats = await reconcile_dashboard_stats(database)
+
+    return {
+        "total_customers": stats.get("total_customers", 0),
+        "active_leads": stats.get("active_leads", 0),
+        "total_proforma_invoices": stats.get("total_proforma_invoices", 0),
+        "total_purchase_orders": stats.get("total_purchase_orders", 0),
+        "margin_summary": round(stats.get("margin_summary", 0), 2)
+    }
+
+
+async def ensure_dashboard_stats(database):
+    """
+    Rebuild the KPI document at startup unless it has been reconciled before
+
+    Returns:
+        bool: Whether a rebuild ran
+    """
+    stats = await database[STATS_COLLECTION].find_one({"_id": STATS_ID}, {"reconciled_at": 1})
+    if stats and "reconciled_at" in stats:
+        return False
+    await reconcile_dashboard_stats(database)
+    return True
+
+
+async def reconcile_dashboard_stats(database):
+    """
+    Rebuild the KPI document and every invoice's margin contribution from scratch
+
+    Returns:
+        dict: The rebuilt stats document
+    """
+    contributions = await database.proforma_invoices.aggregate(CONTRIBUTION_PIPELINE).to_list(None)
+
+    await database.proforma_invoices.update_many({}, {"$set": {"margin_contribution": 0}})
+    if contributions:
+        await database.proforma_invoices.bulk_write([
+            UpdateOne({"id": c["id"]}, {"$set": {"margin_contribution": c["margin_contribution"]}})
+            for c in contributions
+        ], ordered=False)
+
+    stats = {
+        "total_customers": await database.customers.count_documents({}),
+        "active_leads": await database.leads.count_documents({"is_converted": False}),
+        "total_proforma_invoices": await database.proforma_invoices.count_documents({}),
+        "total_purchase_orders": await database.purchase_orders.count_documents({}),
+        "margin_summary": sum(c["margin_contribution"] for c in contributions),
+        "updated_at": datetime.now(timezone.utc).isoformat(),
+        "reconciled_at": datetime.now(timezone.utc).isoformat()
+    }
+    await database[STATS_COLLECTION].update_one({"_id": STATS_ID}, {"$set": stats}, upsert=True)
+    logger.info(f"Dashboard stats reconciled: {[stats[k] for k in STAT_FIELDS]}")
+    return stats
+
+
+async def _main(database, argv):
+    stats = await reconcile_dashboard_stats(database)
+    for field in STAT_FIELDS:
+        print(f"{field:<24} {stats[field]}")
+    return 0
+
+
+if __name__ == "__main__":
+    from database import run_script
+    sys.exit(run_script(_main, usage="python dashboard_stats.py --reconcile", flags=("--reconcile",)))
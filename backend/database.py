@@ -0,0 +1,300 @@
+"""
+MongoDB Client for the CRM backend
+Owns the connection string and the Motor client settings: connection pool
+size, idle time, wire compression and TLS. Every client registers the shared
+PoolMetrics listener, which tracks open / in-use connections and how long
+operations waited to check a connection out of the pool, so the pool can be
+sized from numbers measured under load (GET /api/db/pool-stats).
+
+Settings (environment):
+    MONGO_URI / MONGO_URL         connection string
+    DB_NAME                       database name
+    MONGO_MAX_POOL_SIZE           connections per client / worker (default 50)
+    MONGO_MIN_POOL_SIZE           connections kept open when idle (default 0)
+    MONGO_MAX_IDLE_TIME_MS        close connections idle this long (default 300000)
+    MONGO_WAIT_QUEUE_TIMEOUT_MS   fail a checkout after waiting this long (default: wait)
+    MONGO_COMPRESSORS             preference list of zstd, snappy, zlib (default "zstd,snappy");
+                                  entries whose library is not installed are skipped
+    MONGO_ZLIB_LEVEL              zlib level when zlib is used (default -1)
+"""
+
+import asyncio
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, deque
+from pathlib import Path
+from typing import List, Optional
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# (module, pip package) each wire compressor needs; zlib is in the standard library
+COMPRESSOR_MODULES = {"zstd": ("zstandard", "zstandard"), "snappy": ("snappy", "python-snappy"), "zlib": (None, None)}
+DEFAULT_COMPRESSORS = "zstd,snappy"
+
+# Checkout waits kept for the percentile estimates
+WAIT_SAMPLES = 2048
+
+
+def get_mongo_uri() -> Optional[str]:
+    """
+    Connection string from the environment, with the password URL-encoded
+
+    Returns:
+        str or None: MONGO_URI (or MONGO_URL), None when unset
+    """
+    raw_uri = os.getenv("MONGO_URI") or os.getenv("MONGO_URL")
+    if raw_uri and "mongodb" in raw_uri and "@" in raw_uri:
+        try:
+            prefix = "mongodb+srv://" if "mongodb+srv://" in raw_uri else "mongodb://"
+            creds, host = raw_uri.replace(prefix, "").rsplit("@", 1)
+            if ":" in creds:
+                user, pwd = creds.split(":", 1)
+                encoded_pwd = urllib.parse.quote_plus(urllib.parse.unquote(pwd))
+                return f"{prefix}{user}:{encoded_pwd}@{host}"
+        except Exception as e:
+            logger.error(f"Error parsing MONGO_URI: {e}")
+    return raw_uri
+
+
+def get_db_name() -> Optional[str]:
+    return os.getenv("DB_NAME")
+
+
+def available_compressors(preference: str, warn: bool = True) -> List[str]:
+    """
+    Compressors from a comma-separated preference list that can be loaded
+
+    Args:
+        preference: e.g. "zstd,snappy,zlib"
+        warn: Log entries that are unknown or not installed
+
+    Returns:
+        list: Compressor names in preference order
+    """
+    compressors = []
+    for name in (part.strip().lower() for part in preference.split(",")):
+        if not name:
+            continue
+        if name not in COMPRESSOR_MODULES:
+            if warn:
+                logger.warning(f"Unknown MongoDB compressor '{name}' ignored")
+            continue
+        module, package = COMPRESSOR_MODULES[name]
+        if module and importlib.util.find_spec(module) is None:
+            if warn:
+                logger.warning(f"MongoDB compressor '{name}' skipped: install '{package}' to enable it")
+            continue
+        compressors.append(name)
+    return compressors
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Connection pool counters fed by pymongo's CMAP events
+
+    pymongo checks connections out on the thread running the operation (Motor's
+    executor threads), so the start of a checkout is kept per thread and
+    matched with its checked-out / failed event.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.open = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.checkout_failures = Counter()
+        self.pool_clears = 0
+        self.max_wait = 0.0
+        self.total_wait = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def _checkout_finished(self):
+        started = getattr(self.local, "started", None)
+        self.local.started = None
+        self.waiting -= 1
+        return time.perf_counter() - started if started is not None else None
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self.lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self.lock:
+            self.open += 1
+            self.created += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self.lock:
+            self.open -= 1
+            self.closed += 1
+
+    def connection_check_out_started(self, event):
+        self.local.started = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self.lock:
+            self._checkout_finished()
+            self.checkout_failures[event.reason] += 1
+
+    def connection_checked_out(self, event):
+        with self.lock:
+            wait = self._checkout_finished()
+            self.in_use += 1
+            self.checkouts += 1
+            if wait is not None:
+                self.waits.append(wait)
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def connection_checked_in(self, event):
+        with self.lock:
+            self.in_use -= 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            waits = sorted(self.waits)
+            checkouts = self.checkouts
+
+            def percentile(pct):
+                return waits[min(len(waits) - 1, int(len(waits) * pct / 100))] * 1000 if waits else 0.0
+
+            return {
+                "connections_open": self.open,
+                "connections_in_use": self.in_use,
+                "checkouts_waiting": self.waiting,
+                "connections_created": self.created,
+                "connections_closed": self.closed,
+                "checkouts": checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "pool_clears": self.pool_clears,
+                "checkout_wait_ms": {
+                    "avg": round(self.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+                    "p50": round(percentile(50), 3),
+                    "p99": round(percentile(99), 3),
+                    "max": round(self.max_wait * 1000, 3),
+                },
+            }
+
+
+# Shared by every client this process opens
+pool_metrics = PoolMetrics()
+
+
+def client_options(**overrides) -> dict:
+    """
+    Keyword arguments for MongoClient / AsyncIOMotorClient
+
+    Args:
+        overrides: Options replacing the environment-derived ones
+
+    Returns:
+        dict: Pool, compression, TLS and monitoring options
+    """
+    import certifi
+
+    options = {
+        "serverSelectionTimeoutMS": 5000,
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "tlsCAFile": certifi.where(),
+        "event_listeners": [pool_metrics],
+    }
+    wait_queue_timeout = os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    if wait_queue_timeout:
+        options["waitQueueTimeoutMS"] = int(wait_queue_timeout)
+    # Only complain about missing libraries the operator asked for explicitly
+    preference = os.getenv("MONGO_COMPRESSORS")
+    compressors = available_compressors(preference if preference is not None else DEFAULT_COMPRESSORS, warn=preference is not None)
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = int(os.getenv("MONGO_ZLIB_LEVEL", "-1"))
+    options.update(overrides)
+    return options
+
+
+def create_client(uri: Optional[str] = None, **overrides):
+    """
+    Open a Motor client with the configured pool settings
+
+    Args:
+        uri: Connection string; defaults to MONGO_URI
+        overrides: Options replacing the environment-derived ones
+
+    Returns:
+        AsyncIOMotorClient
+    """
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    options = client_options(**overrides)
+    logger.info(
+        f"MongoDB pool: maxPoolSize={options['maxPoolSize']} minPoolSize={options['minPoolSize']} "
+        f"maxIdleTimeMS={options['maxIdleTimeMS']} compressors={options.get('compressors', 'none')}"
+    )
+    return AsyncIOMotorClient(uri or get_mongo_uri(), **options)
+
+
+def get_pool_stats() -> dict:
+    return pool_metrics.stats()
+
+
+def run_script(command, usage: Optional[str] = None, flags=()) -> int:
+    """
+    Entry point shared by the maintenance scripts (python db_migrations.py etc.)
+
+    Loads backend/.env, opens a client on MONGO_URI / DB_NAME and runs
+    `command(database, argv)` with the command-line arguments.
+
+    Args:
+        command: async fn(database, argv) -> exit code
+        usage: Printed when none of `flags` is given
+        flags: Options of which at least one is required (none: any)
+
+    Returns:
+        int: Process exit code
+    """
+    from dotenv import load_dotenv
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    argv = sys.argv[1:]
+    if not get_mongo_uri() or not get_db_name():
+        print("MONGO_URI and DB_NAME must be set")
+        return 1
+    if flags and not any(flag in argv for flag in flags):
+        print(f"Usage: {usage}")
+        return 1
+
+    async def main():
+        client = create_client(minPoolSize=0)
+        try:
+            return await command(client[get_db_name()], argv)
+        finally:
+            client.close()
+
+    return asyncio.run(main())
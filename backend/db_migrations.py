@@ -0,0 +1,317 @@
+"""
+Index Migrations for CRM / GEM BID collections
+Declares the MongoDB indexes each collection needs as an ordered list of
+versioned migrations and records the applied versions in `_migrations`.
+
+Runs automatically from `startup_event`, or manually:
+    python db_migrations.py                # apply pending migrations
+    python db_migrations.py --status       # list applied versions
+    python db_migrations.py --duplicates   # documents blocking pending unique indexes
+    python db_migrations.py --usage        # print per-index access counters
+
+Versions are applied independently: one that fails (e.g. a unique index over
+existing duplicates, which are checked for first) does not hold back the
+others, and run_migrations raises MigrationError once the rest are applied.
+"""
+
+import logging
+import sys
+from datetime import datetime, timezone
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "_migrations"
+
+# Duplicate groups reported per unique index
+DUPLICATE_REPORT_LIMIT = 20
+
+# Collections served by the keyset-paginated list endpoints
+PAGINATED_COLLECTIONS = ["customers", "leads", "proforma_invoices", "purchase_orders", "gem_bids", "gem_orders"]
+
+
+def _unique_id_index():
+    return IndexModel([("id", ASCENDING)], unique=True, name="id_unique")
+
+
+def _page_index():
+    return IndexModel([("created_date", DESCENDING), ("id", DESCENDING)], name="created_date_id_page")
+
+
+# Append new migrations at the end; never edit or reorder an applied version.
+MIGRATIONS = [
+    {
+        "version": 1,
+        "description": "Unique id and foreign-key lookup indexes",
+        "indexes": {
+            "customers": [_unique_id_index()],
+            "leads": [
+                _unique_id_index(),
+                IndexModel([("customer_id", ASCENDING)], name="customer_id"),
+            ],
+            "proforma_invoices": [
+                _unique_id_index(),
+                IndexModel([("lead_id", ASCENDING)], name="lead_id"),
+                IndexModel([("proforma_invoice_number", ASCENDING)], name="proforma_invoice_number"),
+            ],
+            "purchase_orders": [
+                _unique_id_index(),
+                IndexModel([("proforma_invoice_id", ASCENDING)], name="proforma_invoice_id"),
+            ],
+            # Margin pipeline joins on purchase_order_id, freight upserts on the pair
+            "margins": [
+                IndexModel(
+                    [("purchase_order_id", ASCENDING), ("proforma_invoice_id", ASCENDING)],
+                    unique=True,
+                    name="purchase_order_proforma_unique",
+                ),
+            ],
+            "gem_bids": [
+                _unique_id_index(),
+                IndexModel([("gem_bid_no", ASCENDING)], name="gem_bid_no"),
+            ],
+            "gem_orders": [
+                _unique_id_index(),
+                IndexModel([("gem_bid_no", ASCENDING)], name="gem_bid_no"),
+            ],
+            "users": [
+                IndexModel([("email", ASCENDING), ("system", ASCENDING)], unique=True, name="email_system_unique"),
+            ],
+        },
+    },
+    {
+        "version": 2,
+        "description": "Keyset pagination indexes on (created_date, id)",
+        "indexes": {name: [_page_index()] for name in PAGINATED_COLLECTIONS},
+    },
+    {
+        "version": 3,
+        "description": "GEM bid status listing and reminder scan indexes",
+        "indexes": {
+            "gem_bids": [
+                IndexModel(
+                    [("status", ASCENDING), ("created_date", DESCENDING), ("id", DESCENDING)],
+                    name="status_created_date_id",
+                ),
+                IndexModel([("end_date", ASCENDING)], name="end_date"),
+            ],
+            "leads": [
+                IndexModel([("is_converted", ASCENDING)], name="is_converted"),
+            ],
+        },
+    },
+    {
+        "version": 4,
+        "description": "Case-insensitive customer name index for lead bulk upload",
+        "indexes": {
+            "customers": [
+                IndexModel(
+                    [("customer_name", ASCENDING)],
+                    collation={"locale": "en", "strength": 2},
+                    name="customer_name_ci",
+                ),
+            ],
+        },
+    },
+    {
+        "version": 5,
+        "description": "Reminder scan index on (end_date, reminder_sent)",
+        "indexes": {
+            # Range queries on end_date imply $exists, so the scheduler's
+            # query can use it; bids without an end date are never reminded
+            "gem_bids": [
+                IndexModel(
+                    [("end_date", ASCENDING), ("reminder_sent", ASCENDING)],
+                    partialFilterExpression={"end_date": {"$exists": True}},
+                    name="end_date_reminder_sent",
+                ),
+            ],
+        },
+    },
+    {
+        "version": 6,
+        "description": "Refresh token and revoked session collections with TTL expiry",
+        "indexes": {
+            # expireAfterSeconds=0: MongoDB deletes each document once its expires_at passes
+            "refresh_tokens": [
+                IndexModel([("token_hash", ASCENDING)], unique=True, name="token_hash_unique"),
+                IndexModel([("sid", ASCENDING)], name="sid"),
+                IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+            ],
+            "revoked_sessions": [
+                IndexModel([("sid", ASCENDING)], unique=True, name="sid_unique"),
+                IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+            ],
+        },
+    },
+]
+
+
+class MigrationError(Exception):
+    """Raised by run_migrations when some versions could not be applied"""
+
+    def __init__(self, failed: dict):
+        self.failed = failed
+        super().__init__("Index migrations failed: " + "; ".join(f"v{v}: {e}" for v, e in failed.items()))
+
+
+async def find_duplicates(database, migration: dict) -> list:
+    """
+    Find existing documents that would violate the migration's unique indexes
+
+    Returns:
+        list: [{"collection", "index", "key", "count", "ids"}], ids being the
+        `_id`s of the clashing documents; empty if the indexes can be built
+    """
+    duplicates = []
+    for collection_name, indexes in migration["indexes"].items():
+        for index in indexes:
+            spec = index.document
+            if not spec.get("unique"):
+                continue
+            fields = list(spec["key"])
+            groups = await database[collection_name].aggregate([
+                {"$group": {
+                    "_id": {field: f"${field}" for field in fields},
+                    "ids": {"$push": "$_id"},
+                    "count": {"$sum": 1},
+                }},
+                {"$match": {"count": {"$gt": 1}}},
+                {"$limit": DUPLICATE_REPORT_LIMIT},
+            ], allowDiskUse=True).to_list(None)
+            duplicates += [
+                {"collection": collection_name, "index": spec["name"], "key": group["_id"],
+                 "count": group["count"], "ids": group["ids"]}
+                for group in groups
+            ]
+    return duplicates
+
+
+async def get_applied_versions(database):
+    """
+    Get the migration versions already applied to this database
+
+    Returns:
+        set: Applied version numbers
+    """
+    docs = await database[MIGRATIONS_COLLECTION].find({}, {"_id": 0, "version": 1}).to_list(None)
+    return {doc["version"] for doc in docs}
+
+
+async def run_migrations(database):
+    """
+    Apply every pending migration in version order
+
+    Creating an existing index is a no-op in MongoDB, so concurrent runs from
+    several workers are safe.
+
+    Args:
+        database: MongoDB database instance
+
+    Returns:
+        list: Versions applied by this run
+
+    Raises:
+        MigrationError: Some versions failed; every other one was applied
+    """
+    applied = await get_applied_versions(database)
+    newly_applied = []
+    failed = {}
+
+    for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+        version = migration["version"]
+        if version in applied:
+            continue
+        try:
+            await _apply_migration(database, migration)
+        except Exception as e:
+            logger.error(f"Index migration v{version} failed: {e}")
+            failed[version] = str(e)
+            continue
+        newly_applied.append(version)
+
+    if newly_applied:
+        logger.info(f"Index migrations applied: {newly_applied}")
+    elif not failed:
+        logger.info("Index migrations up to date")
+    if failed:
+        raise MigrationError(failed)
+    return newly_applied
+
+
+async def _apply_migration(database, migration: dict):
+    version = migration["version"]
+    logger.info(f"Applying index migration v{version}: {migration['description']}")
+    duplicates = await find_duplicates(database, migration)
+    if duplicates:
+        for dup in duplicates:
+            logger.error(f"   {dup['collection']}.{dup['index']}: {dup['count']} documents with {dup['key']}: {dup['ids']}")
+        raise ValueError(f"{len(duplicates)} duplicate key(s) block its unique indexes; see python db_migrations.py --duplicates")
+
+    for collection_name, indexes in migration["indexes"].items():
+        names = await database[collection_name].create_indexes(indexes)
+        logger.info(f"   {collection_name}: {', '.join(names)}")
+
+    await database[MIGRATIONS_COLLECTION].update_one(
+        {"version": version},
+        {"$set": {
+            "version": version,
+            "description": migration["description"],
+            "applied_at": datetime.now(timezone.utc).isoformat(),
+        }},
+        upsert=True,
+    )
+
+
+async def get_index_usage(database):
+    """
+    Collect `$indexStats` access counters for every managed collection
+
+    Returns:
+        dict: {collection: [{"name", "key", "ops", "since"}]}
+    """
+    collection_names = sorted({name for m in MIGRATIONS for name in m["indexes"]})
+    usage = {}
+    for collection_name in collection_names:
+        stats = await database[collection_name].aggregate([{"$indexStats": {}}]).to_list(None)
+        usage[collection_name] = [
+            {
+                "name": stat["name"],
+                "key": dict(stat["key"]),
+                "ops": stat["accesses"]["ops"],
+                "since": stat["accesses"]["since"].isoformat(),
+            }
+            for stat in sorted(stats, key=lambda s: s["name"])
+        ]
+    return usage
+
+
+async def _main(database, argv):
+    if "--status" in argv:
+        for doc in await database[MIGRATIONS_COLLECTION].find({}, {"_id": 0}).sort("version", 1).to_list(None):
+            print(f"v{doc['version']}  {doc['applied_at']}  {doc['description']}")
+    elif "--usage" in argv:
+        for collection_name, indexes in (await get_index_usage(database)).items():
+            print(collection_name)
+            for index in indexes:
+                print(f"   {index['name']:<36} ops={index['ops']}")
+    elif "--duplicates" in argv:
+        applied = await get_applied_versions(database)
+        for migration in MIGRATIONS:
+            if migration["version"] in applied:
+                continue
+            for dup in await find_duplicates(database, migration):
+                print(f"v{migration['version']}  {dup['collection']}.{dup['index']}  {dup['key']}  x{dup['count']}  _id: {dup['ids']}")
+    else:
+        try:
+            applied = await run_migrations(database)
+        except MigrationError as e:
+            print(e)
+            return 1
+        print(f"Applied: {applied}" if applied else "Nothing to apply")
+    return 0
+
+
+if __name__ == "__main__":
+    from database import run_script
+    sys.exit(run_script(_main))
@@ -1,15 +1,24 @@
 """
 Email Service for GEM BID CRM
 Handles sending automated email reminders for bids ending soon
+
+Email bodies come from email_templates/, compiled once at import. Fields
+rendered into .html templates are HTML-escaped unless passed as Markup.
 """
 
 import os
 import logging
+import uuid
+from html import escape
+from string import Formatter
+from pathlib import Path
+from email.charset import Charset
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import aiosmtplib
 from datetime import datetime
+from typing import List
 from dotenv import load_dotenv
+from mail_dispatcher import MailDispatcher
 
 # Load environment variables
 load_dotenv()
@@ -23,6 +32,126 @@ SMTP_USER = os.getenv("SMTP_USER", "yash.b@bora.tech")
 SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 EMAIL_FROM = os.getenv("EMAIL_FROM", "yash.b@bora.tech")
 EMAIL_TO = os.getenv("EMAIL_TO", "yash.b@bora.tech")
+SMTP_START_TLS = os.getenv("SMTP_START_TLS", "true").lower() == "true"
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_MAX_RETRIES = int(os.getenv("SMTP_MAX_RETRIES", "3"))
+
+# Shared dispatcher, created on first send and closed after each reminder run
+dispatcher = None
+
+
+def is_smtp_configured() -> bool:
+    return bool(SMTP_PASSWORD) and SMTP_PASSWORD != "your-app-specific-password-here"
+
+
+def get_mail_dispatcher() -> MailDispatcher:
+    """
+    Get the shared pooled SMTP dispatcher, creating it on first use
+    """
+    global dispatcher
+    if dispatcher is None:
+        dispatcher = MailDispatcher(
+            hostname=SMTP_HOST,
+            port=SMTP_PORT,
+            username=SMTP_USER,
+            password=SMTP_PASSWORD,
+            start_tls=SMTP_START_TLS,
+            pool_size=SMTP_POOL_SIZE,
+            max_retries=SMTP_MAX_RETRIES,
+        )
+    return dispatcher
+
+
+async def close_mail_dispatcher():
+    """
+    Close the pooled SMTP connections
+    """
+    global dispatcher
+    if dispatcher is not None:
+        await dispatcher.close()
+        dispatcher = None
+
+
+class Markup(str):
+    """A string that is already safe HTML and is rendered without escaping"""
+
+
+class EmailTemplate:
+    """
+    A template compiled once into literal chunks and `{field}` slots
+    
+    Args:
+        source: Template text using str.format-style `{field}` placeholders
+        autoescape: HTML-escape field values (for .html templates)
+    """
+    
+    def __init__(self, source: str, autoescape: bool):
+        self.autoescape = autoescape
+        self.parts = [(literal, field) for literal, field, _, _ in Formatter().parse(source)]
+    
+    def render(self, **context) -> str:
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                value = context[field]
+                if self.autoescape and not isinstance(value, Markup):
+                    value = escape(str(value))
+                out.append(str(value))
+        rendered = "".join(out)
+        return Markup(rendered) if self.autoescape else rendered
+
+
+TEMPLATE_DIR = Path(__file__).parent / "email_templates"
+
+
+def load_templates(directory: Path = TEMPLATE_DIR) -> dict:
+    """
+    Compile every template in `directory`, keyed by file name
+    """
+    return {
+        path.name: EmailTemplate(path.read_text(encoding="utf-8"), autoescape=path.suffix == ".html")
+        for path in sorted(directory.iterdir())
+        if path.suffix in (".html", ".txt")
+    }
+
+
+TEMPLATES = load_templates()
+
+# Built once and shared by every part instead of a charset lookup per MIMEText
+BODY_CHARSET = Charset("utf-8")
+
+
+def new_message(subject: str, text_body: str, html_body: str) -> MIMEMultipart:
+    """
+    Build a multipart/alternative message from rendered bodies
+    """
+    # A random boundary up front spares the generator from picking one and
+    # scanning both bodies for collisions on every send
+    message = MIMEMultipart("alternative", boundary=f"===============_{uuid.uuid4().hex}==")
+    message["From"] = EMAIL_FROM
+    message["To"] = EMAIL_TO
+    message["Subject"] = subject
+    message.attach(MIMEText(text_body, "plain", BODY_CHARSET))
+    message.attach(MIMEText(html_body, "html", BODY_CHARSET))
+    return message
+
+
+def build_bid_reminder_message(gem_bid_no: str, bid_details: str, end_date: str) -> MIMEMultipart:
+    """
+    Build the reminder email for a bid ending tomorrow
+    
+    Args:
+        gem_bid_no: The GEM bid number
+        bid_details: Details about the bid
+        end_date: The end date of the bid
+    """
+    context = {"gem_bid_no": gem_bid_no, "bid_details": bid_details, "end_date": end_date}
+    return new_message(
+        f"This {gem_bid_no} has been end on {end_date}",
+        TEMPLATES["bid_reminder.txt"].render(**context),
+        TEMPLATES["bid_reminder.html"].render(**context)
+    )
 
 
 async def send_bid_reminder_email(gem_bid_no: str, bid_details: str, end_date: str):
@@ -34,87 +163,118 @@ async def send_bid_reminder_email(gem_bid_no: str, bid_details: str, end_date: s
         bid_details: Details about the bid
         end_date: The end date of the bid
     """
-    try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["From"] = EMAIL_FROM
-        message["To"] = EMAIL_TO
-        message["Subject"] = f"This {gem_bid_no} has been end on {end_date}"
-        
-        # Email body
-        text_content = f"""
-Please check this {gem_bid_no}.
-The bid end date is on tomorrow {end_date}.
+    results = await send_bid_reminders([
+        {"gem_bid_no": gem_bid_no, "bid_details": bid_details, "end_date": end_date}
+    ])
+    return results[0]
 
-Bid Details:
-- Bid Number: {gem_bid_no}
-- Bid Details: {bid_details}
-- End Date: {end_date}
 
-This is an automated reminder from GEM BID CRM.
-"""
-        
-        # HTML version for better formatting
-        html_content = f"""
-<html>
-  <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-    <div style="max-width: 600px; margin: 0 auto; padding: 20px; border: 1px solid #ddd; border-radius: 8px;">
-      <h2 style="color: #059669; border-bottom: 2px solid #059669; padding-bottom: 10px;">
-        GEM BID Reminder
-      </h2>
-      
-      <p style="font-size: 16px;">
-        Please check this <strong>{gem_bid_no}</strong>.
-      </p>
-      
-      <p style="font-size: 16px; color: #dc2626;">
-        ⚠️ The bid end date is <strong>tomorrow {end_date}</strong>.
-      </p>
-      
-      <div style="background-color: #f3f4f6; padding: 15px; border-radius: 6px; margin: 20px 0;">
-        <h3 style="margin-top: 0; color: #059669;">Bid Details:</h3>
-        <ul style="list-style: none; padding: 0;">
-          <li style="padding: 5px 0;"><strong>Bid Number:</strong> {gem_bid_no}</li>
-          <li style="padding: 5px 0;"><strong>Bid Details:</strong> {bid_details}</li>
-          <li style="padding: 5px 0;"><strong>End Date:</strong> {end_date}</li>
-        </ul>
-      </div>
-      
-      <p style="font-size: 14px; color: #6b7280; margin-top: 30px; padding-top: 20px; border-top: 1px solid #e5e7eb;">
-        This is an automated reminder from GEM BID CRM.
-      </p>
-    </div>
-  </body>
-</html>
-"""
-        
-        # Attach both text and HTML versions
-        part1 = MIMEText(text_content, "plain")
-        part2 = MIMEText(html_content, "html")
-        message.attach(part1)
-        message.attach(part2)
-        
-        # Send email
-        if not SMTP_PASSWORD or SMTP_PASSWORD == "your-app-specific-password-here":
-            logger.warning(f"SMTP password not configured. Email reminder for {gem_bid_no} not sent.")
-            logger.info(f"Would have sent email reminder for bid {gem_bid_no} ending on {end_date}")
-            return False
-        
-        await aiosmtplib.send(
-            message,
-            hostname=SMTP_HOST,
-            port=SMTP_PORT,
-            username=SMTP_USER,
-            password=SMTP_PASSWORD,
-            start_tls=True,
-        )
+async def send_bid_reminders(reminders: List[dict]) -> List[bool]:
+    """
+    Send several bid reminders over the pooled SMTP dispatcher
+    
+    Args:
+        reminders: [{"gem_bid_no", "bid_details", "end_date"}]
         
-        logger.info(f"✅ Email reminder sent successfully for bid {gem_bid_no}")
-        return True
+    Returns:
+        list: Per-reminder success flags, in input order
+    """
+    if not is_smtp_configured():
+        for reminder in reminders:
+            logger.warning(f"SMTP password not configured. Email reminder for {reminder['gem_bid_no']} not sent.")
+            logger.info(f"Would have sent email reminder for bid {reminder['gem_bid_no']} ending on {reminder['end_date']}")
+        return [False] * len(reminders)
+    
+    messages = []
+    for reminder in reminders:
+        try:
+            messages.append(build_bid_reminder_message(**reminder))
+        except Exception as e:
+            logger.error(f"❌ Failed to build email reminder for bid {reminder['gem_bid_no']}: {str(e)}")
+            messages.append(None)
+    
+    built = [(i, message) for i, message in enumerate(messages) if message is not None]
+    dispatcher = get_mail_dispatcher()
+    sent = await dispatcher.send_many([message for _, message in built])
+    
+    results = [False] * len(reminders)
+    for (i, _), success in zip(built, sent):
+        results[i] = success
+        if success:
+            logger.info(f"✅ Email reminder sent successfully for bid {reminders[i]['gem_bid_no']}")
+        else:
+            logger.error(f"❌ Failed to send email reminder for bid {reminders[i]['gem_bid_no']}")
+    return results
+
+
+def group_bids_for_digest(bids: List[dict]) -> List[tuple]:
+    """
+    Group bids by department, then city, for the digest email
+    
+    Returns:
+        list: [((department, city), [bid, ...])] sorted by department and city
+    """
+    groups = {}
+    for bid in bids:
+        key = (bid.get("department") or "Unspecified department", bid.get("city") or "Unspecified city")
+        groups.setdefault(key, []).append(bid)
+    return sorted(groups.items(), key=lambda item: (item[0][0].lower(), item[0][1].lower()))
+
+
+def build_bid_digest_message(bids: List[dict], end_date: str) -> MIMEMultipart:
+    """
+    Build one email listing every bid ending tomorrow
+    
+    Args:
+        bids: [{"gem_bid_no", "bid_details", "department", "city"}]
+        end_date: The (display formatted) end date shared by the bids
+    """
+    text_groups = []
+    html_groups = []
+    for (department, city), group in group_bids_for_digest(bids):
+        header = {"department": department, "city": city, "count": len(group)}
+        text_groups.append(TEMPLATES["bid_digest_group.txt"].render(
+            rows="".join(TEMPLATES["bid_digest_row.txt"].render(**bid) for bid in group), **header
+        ))
+        html_groups.append(TEMPLATES["bid_digest_group.html"].render(
+            rows=Markup("".join(TEMPLATES["bid_digest_row.html"].render(**bid) for bid in group)), **header
+        ))
+    
+    context = {"count": len(bids), "end_date": end_date}
+    return new_message(
+        f"{len(bids)} GEM bid(s) end on {end_date}",
+        TEMPLATES["bid_digest.txt"].render(groups="".join(text_groups), **context),
+        TEMPLATES["bid_digest.html"].render(groups=Markup("".join(html_groups)), **context)
+    )
+
+
+async def send_bid_digest(bids: List[dict], end_date: str) -> bool:
+    """
+    Send a single digest email for all bids ending tomorrow
+    
+    Args:
+        bids: [{"gem_bid_no", "bid_details", "department", "city"}]
+        end_date: The (display formatted) end date shared by the bids
         
+    Returns:
+        bool: True if the digest was sent
+    """
+    if not is_smtp_configured():
+        logger.warning(f"SMTP password not configured. Reminder digest for {len(bids)} bid(s) not sent.")
+        return False
+    
+    try:
+        message = build_bid_digest_message(bids, end_date)
     except Exception as e:
-        logger.error(f"❌ Failed to send email reminder for bid {gem_bid_no}: {str(e)}")
+        logger.error(f"❌ Failed to build reminder digest: {str(e)}")
         return False
+    
+    success = await get_mail_dispatcher().send(message)
+    if success:
+        logger.info(f"✅ Reminder digest sent for {len(bids)} bid(s)")
+    else:
+        logger.error(f"❌ Failed to send reminder digest for {len(bids)} bid(s)")
+    return success
 
 
 def format_date_for_display(date_str: str) -> str:
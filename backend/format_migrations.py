@@ -0,0 +1,237 @@
+"""
+Document Format Migrations for legacy purchase orders and GEM orders
+Older purchase orders stored a single product in root fields
+(product/category/quantity/price/amount) and older GEM orders a single SKU
+(sku/vendor/price/...). The API used to rebuild `products` / `items` on every
+read; these migrations rewrite the stored documents once instead.
+
+Each migration walks the legacy documents in `_id` order in bounded batches,
+writes them with bulk_write and checkpoints the last `_id` in
+`_format_migrations`, so an interrupted run resumes where it stopped. The
+read endpoints keep upgrading documents on the fly until the migration for
+their collection is marked complete.
+
+Runs in the background from `startup_event`, or manually:
+    python format_migrations.py            # run pending migrations
+    python format_migrations.py --status   # show checkpoints
+"""
+
+import asyncio
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+STATE_COLLECTION = "_format_migrations"
+BATCH_SIZE = int(os.getenv("FORMAT_MIGRATION_BATCH_SIZE", "500"))
+
+# Global migration state
+completed = set()
+migration_task = None
+
+
+def purchase_order_upgrade(order: dict) -> Optional[dict]:
+    """
+    Fields that convert a legacy single-product purchase order
+
+    Returns:
+        dict or None: Fields to set, or None if already in the new format
+    """
+    if order.get("products"):
+        return None
+    update = {"products": []}
+    if order.get("product"):
+        update["products"] = [{
+            "product": order.get("product", ""),
+            "category": order.get("category", ""),
+            "quantity": order.get("quantity", 0),
+            "price": order.get("price", 0),
+            "amount": order.get("amount", 0)
+        }]
+    # A stored total is kept; margins fall back to `amount` when it is missing
+    if order.get("total_amount") is None and order.get("amount") is not None:
+        update["total_amount"] = order["amount"]
+    return update
+
+
+def gem_order_upgrade(order: dict) -> Optional[dict]:
+    """
+    Fields that convert a legacy single-SKU GEM order
+
+    Returns:
+        dict or None: Fields to set, or None if already in the new format
+    """
+    if order.get("items"):
+        return None
+    return {
+        "items": [{
+            "sku": order.get("sku", "-"),
+            "vendor": order.get("vendor", "-"),
+            "price": order.get("price", 0),
+            "quantity": order.get("quantity", 0),
+            "invoice_value": order.get("invoice_value", 0),
+            "advance_paid": order.get("advance_paid", 0),
+            "remaining_amount": order.get("remaining_amount", 0),
+            "date": order.get("date", ""),
+            "delivery_date": order.get("delivery_date", "")
+        }]
+    }
+
+
+def _missing_or_empty(field: str) -> dict:
+    return {"$or": [{field: {"$exists": False}}, {field: None}, {field: {"$size": 0}}]}
+
+
+MIGRATIONS = {
+    "purchase_orders": {
+        "name": "purchase_orders_products_array",
+        "query": _missing_or_empty("products"),
+        "upgrade": purchase_order_upgrade,
+    },
+    "gem_orders": {
+        "name": "gem_orders_items_array",
+        "query": _missing_or_empty("items"),
+        "upgrade": gem_order_upgrade,
+    },
+}
+
+
+def is_migrated(collection_name: str) -> bool:
+    """True once every document in `collection_name` is in the new format"""
+    return collection_name in completed
+
+
+def upgrade_legacy(collection_name: str, doc: dict) -> dict:
+    """
+    Upgrade a document read before its collection's migration completed
+
+    Returns:
+        dict: The same document, converted in place
+    """
+    update = MIGRATIONS[collection_name]["upgrade"](doc)
+    if update:
+        doc.update(update)
+    return doc
+
+
+async def load_migration_state(database):
+    """
+    Read which migrations have completed
+
+    Returns:
+        set: Collection names whose documents are fully migrated
+    """
+    docs = await database[STATE_COLLECTION].find({"completed_at": {"$ne": None}}, {"collection": 1}).to_list(None)
+    completed.update(doc["collection"] for doc in docs)
+    return set(completed)
+
+
+async def run_format_migration(database, collection_name: str, batch_size: int = BATCH_SIZE):
+    """
+    Migrate one collection, resuming from its last checkpoint
+
+    Args:
+        database: MongoDB database instance
+        collection_name: Key of MIGRATIONS
+        batch_size: Documents rewritten per bulk_write
+
+    Returns:
+        int: Documents rewritten by this run
+    """
+    migration = MIGRATIONS[collection_name]
+    state_collection = database[STATE_COLLECTION]
+    state = await state_collection.find_one({"_id": migration["name"]}) or {}
+    if state.get("completed_at"):
+        completed.add(collection_name)
+        return 0
+
+    last_id = state.get("last_id")
+    migrated = state.get("migrated", 0)
+    rewritten = 0
+    logger.info(f"Format migration {migration['name']} started (resuming after {last_id})")
+
+    while True:
+        query = migration["query"]
+        if last_id is not None:
+            query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+        batch = await database[collection_name].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+
+        operations = []
+        for doc in batch:
+            update = migration["upgrade"](doc)
+            if update and any(doc.get(field) != value for field, value in update.items()):
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if operations:
+            await database[collection_name].bulk_write(operations, ordered=False)
+            rewritten += len(operations)
+
+        now = datetime.now(timezone.utc).isoformat()
+        checkpoint = {"collection": collection_name, "migrated": migrated + rewritten, "updated_at": now}
+        if batch:
+            last_id = batch[-1]["_id"]
+            checkpoint["last_id"] = last_id
+        if len(batch) < batch_size:
+            checkpoint["completed_at"] = now
+        await state_collection.update_one({"_id": migration["name"]}, {"$set": checkpoint}, upsert=True)
+
+        if len(batch) < batch_size:
+            break
+
+    completed.add(collection_name)
+    logger.info(f"Format migration {migration['name']} completed: {rewritten} document(s) rewritten")
+    return rewritten
+
+
+async def run_format_migrations(database, batch_size: int = BATCH_SIZE):
+    """
+    Run every pending format migration
+
+    Returns:
+        dict: {collection: documents rewritten}
+    """
+    results = {}
+    for collection_name in MIGRATIONS:
+        try:
+            results[collection_name] = await run_format_migration(database, collection_name, batch_size)
+        except Exception as e:
+            logger.error(f"Format migration for {collection_name} failed: {e}")
+    return results
+
+
+def start_format_migrations(database):
+    """
+    Run pending format migrations in a background task
+    """
+    global migration_task
+    migration_task = asyncio.create_task(run_format_migrations(database))
+
+
+async def stop_format_migrations():
+    """
+    Cancel a running migration; it resumes from its checkpoint on next start
+    """
+    global migration_task
+    if migration_task:
+        migration_task.cancel()
+        await asyncio.gather(migration_task, return_exceptions=True)
+        migration_task = None
+
+
+async def _main(database, argv):
+    if "--status" in argv:
+        for migration in MIGRATIONS.values():
+            state = await database[STATE_COLLECTION].find_one({"_id": migration["name"]}) or {}
+            print(f"{migration['name']:<36} migrated={state.get('migrated', 0)}  completed={state.get('completed_at')}")
+    else:
+        for collection_name, rewritten in (await run_format_migrations(database)).items():
+            print(f"{collection_name:<20} {rewritten} rewritten")
+    return 0
+
+
+if __name__ == "__main__":
+    from database import run_script
+    sys.exit(run_script(_main))
@@ -0,0 +1,221 @@
+"""
+Import Job Queue for CRM / GEM BID bulk uploads
+Stores uploaded spreadsheets on disk, records a job in `import_jobs` and
+processes it on a pool of background workers so the upload request returns
+immediately. Progress counters are written back to the job document.
+
+A job interrupted by shutdown goes back to `queued` with its file kept. At
+startup, jobs still `running` after IMPORT_JOB_TIMEOUT seconds (their
+process died) are queued again too.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+IMPORT_UPLOAD_DIR = Path(__file__).parent / "import_uploads"
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+IMPORT_JOB_TIMEOUT = float(os.getenv("IMPORT_JOB_TIMEOUT", "3600"))
+
+# Keep job documents small; the counters still reflect every error
+MAX_STORED_ERRORS = 1000
+
+# Global worker state
+db = None
+handlers = {}
+job_queue = None
+workers = []
+
+
+class ImportProgress:
+    """
+    Running counters for one import
+
+    When bound to a job id, `save()` persists the counters to the job
+    document; otherwise (inline imports) it is a no-op.
+    """
+
+    def __init__(self, job_id: Optional[str] = None):
+        self.job_id = job_id
+        self.rows_parsed = 0
+        self.inserted = 0
+        self.errored = 0
+
+    async def save(self):
+        if not self.job_id or db is None:
+            return
+        await db.import_jobs.update_one(
+            {"id": self.job_id},
+            {"$set": {
+                "rows_parsed": self.rows_parsed,
+                "inserted": self.inserted,
+                "errored": self.errored,
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+
+
+def init_import_workers(database, import_handlers: dict, worker_count: int = IMPORT_WORKERS):
+    """
+    Start the import worker pool
+
+    Args:
+        database: MongoDB database instance
+        import_handlers: {kind: async fn(source, progress) -> {"created", "errors"}}
+        worker_count: Number of concurrent import workers
+    """
+    global db, handlers, job_queue, workers
+    db = database
+    handlers = import_handlers
+    job_queue = asyncio.Queue()
+    IMPORT_UPLOAD_DIR.mkdir(exist_ok=True)
+
+    workers = [asyncio.create_task(_worker(i)) for i in range(worker_count)]
+    # Pick up jobs that were queued before a restart
+    workers.append(asyncio.create_task(_requeue_pending()))
+    logger.info(f"Import job workers started ({worker_count})")
+
+
+async def shutdown_import_workers():
+    """
+    Cancel the import workers; unfinished jobs stay queued for the next start
+    """
+    global workers
+    for task in workers:
+        task.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+    workers = []
+    logger.info("Import job workers stopped")
+
+
+async def enqueue_import_job(kind: str, upload, system: str, created_by: Optional[str] = None):
+    """
+    Store an uploaded spreadsheet and queue it for import
+
+    Args:
+        kind: Import handler name (e.g. "customers")
+        upload: FastAPI UploadFile
+        system: "crm" or "gem_bid"; only tokens of the same system can poll the job
+        created_by: Email of the uploading user
+
+    Returns:
+        dict: {"job_id", "status"}
+    """
+    if job_queue is None:
+        raise RuntimeError("Import workers not initialized")
+
+    job_id = str(uuid.uuid4())
+    file_path = IMPORT_UPLOAD_DIR / f"{job_id}{Path(upload.filename or '').suffix.lower() or '.xlsx'}"
+    await asyncio.to_thread(_save_upload, upload.file, file_path)
+
+    now = datetime.now(timezone.utc).isoformat()
+    await db.import_jobs.insert_one({
+        "id": job_id,
+        "kind": kind,
+        "system": system,
+        "filename": upload.filename,
+        "file_path": str(file_path),
+        "status": "queued",
+        "rows_parsed": 0,
+        "inserted": 0,
+        "errored": 0,
+        "errors": [],
+        "created_by": created_by,
+        "created_date": now,
+        "updated_at": now,
+        "started_at": None,
+        "finished_at": None
+    })
+    await job_queue.put(job_id)
+    return {"job_id": job_id, "status": "queued"}
+
+
+async def get_import_job(job_id: str):
+    """
+    Get an import job's status and counters
+
+    Returns:
+        dict or None: Job document without internal fields
+    """
+    return await db.import_jobs.find_one({"id": job_id}, {"_id": 0, "file_path": 0})
+
+
+def _save_upload(source, file_path: Path):
+    source.seek(0)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(source, f)
+
+
+async def _requeue_pending():
+    cutoff = (datetime.now(timezone.utc) - timedelta(seconds=IMPORT_JOB_TIMEOUT)).isoformat()
+    stale = await db.import_jobs.update_many(
+        {"status": "running", "started_at": {"$lt": cutoff}},
+        {"$set": {"status": "queued", "started_at": None}}
+    )
+    if stale.modified_count:
+        logger.warning(f"Reset {stale.modified_count} stalled import job(s) to queued")
+    jobs = await db.import_jobs.find({"status": "queued"}, {"_id": 0, "id": 1}).to_list(None)
+    for job in jobs:
+        await job_queue.put(job["id"])
+    if jobs:
+        logger.info(f"Re-queued {len(jobs)} pending import job(s)")
+
+
+async def _worker(worker_id: int):
+    while True:
+        job_id = await job_queue.get()
+        try:
+            await _run_job(job_id)
+        except Exception as e:
+            logger.error(f"Import worker {worker_id} crashed on job {job_id}: {e}", exc_info=True)
+        finally:
+            job_queue.task_done()
+
+
+async def _run_job(job_id: str):
+    # Claim atomically so a job is only processed once across processes
+    job = await db.import_jobs.find_one_and_update(
+        {"id": job_id, "status": "queued"},
+        {"$set": {"status": "running", "started_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not job:
+        return
+
+    logger.info(f"Import job {job_id} ({job['kind']}) started")
+    progress = ImportProgress(job_id)
+    try:
+        result = await handlers[job["kind"]](job["file_path"], progress)
+        update = {
+            "status": "completed",
+            "inserted": result["created"],
+            "errored": len(result["errors"]),
+            "errors": result["errors"][:MAX_STORED_ERRORS]
+        }
+        logger.info(f"Import job {job_id} completed: {result['created']} inserted, {len(result['errors'])} errors")
+    except asyncio.CancelledError:
+        # Shutdown: keep the file and let the next start run the job again
+        await db.import_jobs.update_one({"id": job_id}, {"$set": {
+            "status": "queued",
+            "started_at": None,
+            "updated_at": datetime.now(timezone.utc).isoformat()
+        }})
+        logger.info(f"Import job {job_id} interrupted; re-queued for the next start")
+        raise
+    except Exception as e:
+        update = {"status": "failed", "error": str(e), "inserted": progress.inserted, "errored": progress.errored}
+        logger.error(f"Import job {job_id} failed: {e}")
+
+    now = datetime.now(timezone.utc).isoformat()
+    update.update({"rows_parsed": progress.rows_parsed, "finished_at": now, "updated_at": now})
+    await db.import_jobs.update_one({"id": job_id}, {"$set": update})
+    Path(job["file_path"]).unlink(missing_ok=True)
@@ -0,0 +1,192 @@
+"""
+Lead -> Proforma Invoice Sync for the CRM
+A converted lead's products, amounts, documents and customer name are
+mirrored onto its proforma invoice(s). The copy is pushed on the write side
+so GET /api/proforma-invoices/{id} is a single read:
+
+- The lead write handlers call `sync_proforma_from_lead` directly.
+- On replica sets (Atlas included) a change-stream watcher on `leads` also
+  syncs lead updates made outside the API. Standalone servers do not support
+  change streams and run without it.
+- PUT /api/proforma-invoices/{id} edits an invoice's products by hand; such
+  an invoice is flagged `hand_edited` and owns its products and total from
+  then on, so neither the sync nor the consistency check touches them.
+- `check_proforma_consistency` reports invoices that have drifted from their
+  lead, and can repair them:
+    python lead_sync.py --check
+    python lead_sync.py --repair
+"""
+
+import asyncio
+import logging
+import sys
+from pymongo.errors import OperationFailure
+from dashboard_stats import refresh_proforma_margin
+from response_cache import invalidate_cache
+
+logger = logging.getLogger(__name__)
+
+# Lead fields copied onto the linked invoice
+SYNCED_FIELDS = ["products", "total_amount", "tender_document", "working_sheet", "customer_name"]
+
+# Only copied when the lead has them; otherwise the invoice keeps its own value
+OPTIONAL_FIELDS = {"products", "total_amount", "customer_name"}
+
+# Owned by the invoice once it has been edited by hand
+HAND_EDITED_FIELDS = {"products", "total_amount"}
+
+WATCH_RETRY_SECONDS = 5
+
+# Global watcher state
+watcher_task = None
+
+
+def synced_data(lead: dict, hand_edited: bool = False) -> dict:
+    """Invoice fields derived from `lead`, for an invoice edited by hand or not"""
+    return {
+        field: lead.get(field)
+        for field in SYNCED_FIELDS
+        if (field not in OPTIONAL_FIELDS or field in lead)
+        and not (hand_edited and field in HAND_EDITED_FIELDS)
+    }
+
+
+async def sync_proforma_from_lead(database, lead_id: str, lead: dict = None) -> int:
+    """
+    Copy a lead's synced fields onto every invoice converted from it
+
+    Args:
+        database: MongoDB database instance
+        lead_id: Lead id
+        lead: The current lead document, if the caller already has it
+
+    Returns:
+        int: Number of invoices updated
+    """
+    if lead is None:
+        lead = await database.leads.find_one({"id": lead_id}, {"_id": 0, **{f: 1 for f in SYNCED_FIELDS}})
+    if not lead:
+        return 0
+
+    invoices = await database.proforma_invoices.find({"lead_id": lead_id}, {"_id": 0, "id": 1}).to_list(None)
+    if not invoices:
+        return 0
+
+    await database.proforma_invoices.update_many(
+        {"lead_id": lead_id, "hand_edited": {"$ne": True}}, {"$set": synced_data(lead)}
+    )
+    await database.proforma_invoices.update_many(
+        {"lead_id": lead_id, "hand_edited": True}, {"$set": synced_data(lead, hand_edited=True)}
+    )
+    for invoice in invoices:
+        await refresh_proforma_margin(database, invoice["id"])
+    invalidate_cache("proforma_invoices")
+    return len(invoices)
+
+
+async def check_proforma_consistency(database, repair: bool = False):
+    """
+    Find invoices whose synced fields differ from their lead
+
+    Args:
+        database: MongoDB database instance
+        repair: Re-sync the drifted invoices
+
+    Returns:
+        dict: {"checked", "drifted": [{"id", "lead_id", "fields"}], "repaired"}
+    """
+    rows = await database.proforma_invoices.aggregate([
+        {"$match": {"lead_id": {"$nin": [None, ""]}}},
+        {"$project": {"_id": 0, "id": 1, "lead_id": 1, "hand_edited": 1, **{f: 1 for f in SYNCED_FIELDS}}},
+        {"$lookup": {"from": "leads", "localField": "lead_id", "foreignField": "id", "as": "lead"}},
+    ]).to_list(None)
+
+    drifted = []
+    for row in rows:
+        if not row["lead"]:
+            continue
+        lead = row["lead"][0]
+        expected = synced_data(lead, hand_edited=row.get("hand_edited", False))
+        fields = [field for field, value in expected.items() if row.get(field) != value]
+        if fields:
+            drifted.append({"id": row["id"], "lead_id": row["lead_id"], "fields": fields})
+
+    repaired = 0
+    if repair:
+        for lead_id in {d["lead_id"] for d in drifted}:
+            repaired += await sync_proforma_from_lead(database, lead_id)
+
+    if drifted:
+        logger.warning(f"{len(drifted)} proforma invoice(s) out of sync with their lead")
+    return {"checked": len(rows), "drifted": drifted, "repaired": repaired}
+
+
+def start_lead_sync_watcher(database):
+    """
+    Start the change-stream watcher on `leads`; the leader runs it
+
+    Args:
+        database: MongoDB database instance
+    """
+    global watcher_task
+    watcher_task = asyncio.create_task(_watch_leads(database))
+
+
+async def stop_lead_sync_watcher():
+    global watcher_task
+    if watcher_task:
+        watcher_task.cancel()
+        await asyncio.gather(watcher_task, return_exceptions=True)
+        watcher_task = None
+
+
+async def _watch_leads(database):
+    pipeline = [{"$match": {"operationType": {"$in": ["update", "replace"]}}}]
+    resume_token = None
+    while True:
+        try:
+            async with database.leads.watch(
+                pipeline, full_document="updateLookup", resume_after=resume_token
+            ) as stream:
+                logger.info("Lead sync change stream started")
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    await _handle_change(database, change)
+        except OperationFailure as e:
+            # 40573: change streams need a replica set
+            if e.code == 40573:
+                logger.info("Change streams unavailable (standalone MongoDB); lead sync runs from the write handlers only")
+                return
+            logger.error(f"Lead sync change stream failed: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Lead sync change stream failed: {e}")
+        await asyncio.sleep(WATCH_RETRY_SECONDS)
+
+
+async def _handle_change(database, change: dict):
+    lead = change.get("fullDocument")
+    if not lead or not lead.get("is_converted"):
+        return
+    if change["operationType"] == "update":
+        changed = set(change.get("updateDescription", {}).get("updatedFields", {}))
+        if not changed.intersection(SYNCED_FIELDS):
+            return
+    try:
+        await sync_proforma_from_lead(database, lead["id"], lead)
+    except Exception as e:
+        logger.error(f"Failed to sync proforma invoice for lead {lead.get('id')}: {e}")
+
+
+async def _main(database, argv):
+    result = await check_proforma_consistency(database, repair="--repair" in argv)
+    for row in result["drifted"]:
+        print(f"{row['id']}  lead={row['lead_id']}  fields={', '.join(row['fields'])}")
+    print(f"Checked {result['checked']}, drifted {len(result['drifted'])}, repaired {result['repaired']}")
+    return 0
+
+
+if __name__ == "__main__":
+    from database import run_script
+    sys.exit(run_script(_main, usage="python lead_sync.py --check | --repair", flags=("--check", "--repair")))
@@ -0,0 +1,146 @@
+"""
+Pooled SMTP Dispatcher for GEM BID CRM reminders
+Keeps up to `pool_size` authenticated aiosmtplib.SMTP sessions open and
+reuses them across messages, so a batch of reminders pays the TCP/TLS/AUTH
+handshake once per connection instead of once per message. The pool size
+also bounds how many messages are in flight at a time.
+
+Transient failures (dropped connections, timeouts, 4xx replies) are retried
+with exponential backoff on a fresh connection; 5xx replies are not retried.
+"""
+
+import asyncio
+import logging
+from typing import List, Optional
+import aiosmtplib
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (
+    aiosmtplib.SMTPServerDisconnected,
+    aiosmtplib.SMTPConnectError,
+    aiosmtplib.SMTPTimeoutError,
+    ConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def is_transient(error: Exception) -> bool:
+    """True for failures worth retrying on a new connection"""
+    if isinstance(error, aiosmtplib.SMTPResponseException):
+        return 400 <= error.code < 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class MailDispatcher:
+    """
+    Send messages over a small pool of reused SMTP connections
+
+    Args:
+        hostname: SMTP server host
+        port: SMTP server port
+        username: Login user; no AUTH when empty
+        password: Login password
+        start_tls: Upgrade with STARTTLS after connecting (port 587)
+        use_tls: Connect with implicit TLS (port 465)
+        pool_size: Maximum open connections / concurrent sends
+        max_retries: Retries per message after the first attempt
+        retry_backoff: Base delay in seconds, doubled on each retry
+        timeout: Per-command timeout in seconds
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: bool = True,
+        use_tls: bool = False,
+        pool_size: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 1.0,
+        timeout: float = 30,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+
+        self.idle = []
+        self.slots = asyncio.Semaphore(pool_size)
+        self.connections_opened = 0
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            use_tls=self.use_tls,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        await smtp.connect()
+        if self.username and self.password:
+            try:
+                await smtp.login(self.username, self.password)
+            except Exception:
+                # Not pooled yet, so nothing else would close it
+                smtp.close()
+                raise
+        self.connections_opened += 1
+        return smtp
+
+    async def _discard(self, smtp: aiosmtplib.SMTP):
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def send(self, message) -> bool:
+        """
+        Send one message, retrying transient failures
+
+        Returns:
+            bool: True if the server accepted the message
+        """
+        async with self.slots:
+            for attempt in range(self.max_retries + 1):
+                smtp = self.idle.pop() if self.idle else None
+                try:
+                    if smtp is None or not smtp.is_connected:
+                        smtp = await self._connect()
+                    await smtp.send_message(message)
+                    self.idle.append(smtp)
+                    return True
+                except Exception as e:
+                    if smtp is not None:
+                        await self._discard(smtp)
+                    if not is_transient(e) or attempt == self.max_retries:
+                        logger.error(f"Failed to send '{message.get('Subject')}': {e}")
+                        return False
+                    delay = self.retry_backoff * 2 ** attempt
+                    logger.warning(f"Transient SMTP error ({e}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return False
+
+    async def send_many(self, messages) -> List[bool]:
+        """
+        Send messages concurrently, at most `pool_size` at a time
+
+        Returns:
+            list: Per-message success flags, in input order
+        """
+        return await asyncio.gather(*(self.send(message) for message in messages))
+
+    async def close(self):
+        """Close every pooled connection"""
+        idle, self.idle = self.idle, []
+        for smtp in idle:
+            await self._discard(smtp)
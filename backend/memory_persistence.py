@@ -0,0 +1,364 @@
+"""
+Durable Storage for the in-memory demo database
+Keeps a MemoryDatabase across restarts with a write-ahead operation log and
+periodic snapshots in a local directory, so demo / offline deployments keep
+their data when the process restarts.
+
+Data directory:
+    snapshot.bson     State as of a log segment: a header, create_index
+                      records, then documents in "load" chunks
+    log.<n>.bson      Change records written after the snapshot; compaction
+                      starts a new segment
+    LOCK              Held by the process that owns the directory
+
+Records are BSON documents written back to back, so values come back with
+the types MongoDB would have stored (ObjectId, datetimes truncated to ms),
+and decoding uses pymongo's C extension.
+
+Compaction runs in the background once the log outgrows the snapshot: the
+log rolls over to a new segment, the documents as of that moment are
+written to a new snapshot on a worker thread (stored documents are replaced,
+never modified in place, so no copy is taken), and the segments the
+snapshot covers are deleted. A crash at any point leaves a snapshot plus
+the segments after it; replaying a record twice is harmless.
+
+Settings (environment):
+    MEMORY_STORE_FSYNC            "always" fsyncs every record; by default the
+                                  log is flushed per record and fsynced once a second
+    MEMORY_STORE_COMPACT_BYTES    smallest log worth compacting (default 8 MB)
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: lock the directory with msvcrt instead
+    fcntl = None
+    import msvcrt
+
+import bson
+from bson.errors import InvalidBSON
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+SNAPSHOT_FILE = "snapshot.bson"
+LOCK_FILE = "LOCK"
+SEGMENT_FILE = re.compile(r"^log\.(\d+)\.bson$")
+# Documents per snapshot "load" record
+SNAPSHOT_CHUNK = 1000
+MAINTENANCE_INTERVAL = 1.0
+
+FSYNC_ALWAYS = os.getenv("MEMORY_STORE_FSYNC", "interval").lower() == "always"
+COMPACT_BYTES = int(os.getenv("MEMORY_STORE_COMPACT_BYTES", str(8 * 1024 * 1024)))
+
+
+def segment_name(number: int) -> str:
+    return f"log.{number:08d}.bson"
+
+
+def read_records(path: Path):
+    """
+    Decode the records in a snapshot or log file
+
+    A crash can leave a partly written record at the end of a log; reading
+    stops there.
+
+    Returns:
+        tuple: (records, bytes holding complete records, file size)
+    """
+    data = path.read_bytes()
+    end, size = 0, len(data)
+    while end + 4 <= size:
+        length = int.from_bytes(data[end:end + 4], "little")
+        if length < 5 or end + length > size:
+            break
+        end += length
+    try:
+        return bson.decode_all(data[:end]), end, size
+    except InvalidBSON:
+        # A torn record with a plausible length prefix: keep what precedes it
+        records, offset = [], 0
+        while offset < end:
+            length = int.from_bytes(data[offset:offset + 4], "little")
+            try:
+                records.append(bson.decode(data[offset:offset + length]))
+            except InvalidBSON:
+                break
+            offset += length
+        return records, offset, size
+
+
+def _fsync_directory(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class MemoryJournal:
+    """
+    Operation log and snapshots for one MemoryDatabase
+
+    Args:
+        db: The MemoryDatabase to persist
+        path: Data directory (created if missing)
+        fsync_always: fsync after every record instead of once a second
+        compact_bytes: Log size below which compaction is not worth it
+    """
+
+    def __init__(self, db, path, fsync_always: bool = FSYNC_ALWAYS, compact_bytes: int = COMPACT_BYTES):
+        self.db = db
+        self.path = Path(path)
+        self.fsync_always = fsync_always
+        self.compact_bytes = compact_bytes
+        self.segment = 0
+        self.file = None
+        self.lock_file = None
+        self.dirty = False
+        self.log_bytes = 0
+        self.snapshot_bytes = 0
+        self.compacting = False
+        self.task = None
+        self.replayed_records = 0
+        self.replay_ms = 0.0
+        self.compactions = 0
+        self.last_compaction_ms = 0.0
+
+    # ---- ownership ---------------------------------------------------------
+
+    def lock(self) -> bool:
+        """Take the directory lock; False if another process holds it"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.lock_file = open(self.path / LOCK_FILE, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.lock_file.seek(0)
+                msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+        return True
+
+    def _segments(self) -> list:
+        numbers = []
+        for entry in self.path.iterdir():
+            match = SEGMENT_FILE.match(entry.name)
+            if match:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    # ---- recovery ----------------------------------------------------------
+
+    def load(self) -> int:
+        """
+        Rebuild the database from the snapshot and the log segments after it
+
+        Returns:
+            int: Records replayed
+        """
+        # The cyclic collector would rescan the growing heap many times over
+        # while a large store is rebuilt; documents hold no reference cycles
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self._load()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _load(self) -> int:
+        started = time.perf_counter()
+        replayed, covered = 0, 0
+        snapshot = self.path / SNAPSHOT_FILE
+        if snapshot.exists():
+            records, _, self.snapshot_bytes = read_records(snapshot)
+            header = records[0] if records else {}
+            if header.get("op") != "snapshot" or header.get("version") != FORMAT_VERSION:
+                raise RuntimeError(f"{snapshot} is not a version {FORMAT_VERSION} snapshot")
+            covered = header["segment"]
+            for record in records[1:]:
+                self.db.replay(record)
+            replayed += len(records) - 1
+
+        self.segment = covered
+        for number in self._segments():
+            segment = self.path / segment_name(number)
+            if number <= covered:
+                # Left behind by a compaction that stopped after its snapshot
+                segment.unlink()
+                continue
+            records, valid, size = read_records(segment)
+            for record in records:
+                self.db.replay(record)
+            replayed += len(records)
+            if valid < size:
+                logger.warning(f"Discarding {size - valid} bytes of incomplete records at the end of {segment.name}")
+                os.truncate(segment, valid)
+            self.log_bytes += valid
+            self.segment = number
+
+        self.replayed_records = replayed
+        self.replay_ms = (time.perf_counter() - started) * 1000
+        return replayed
+
+    # ---- logging -----------------------------------------------------------
+
+    def start(self):
+        """Open a new log segment, attach to the database and start maintenance"""
+        self._open_segment(self.segment + 1)
+        self.db.journal = self
+        self.task = asyncio.create_task(self._maintain())
+
+    def _open_segment(self, number: int):
+        self.segment = number
+        self.file = open(self.path / segment_name(number), "ab")
+        _fsync_directory(self.path)
+
+    def _sync(self):
+        if self.dirty and self.file is not None:
+            os.fsync(self.file.fileno())
+            self.dirty = False
+
+    def append(self, record: dict):
+        """Write one change record; raises (and the change is not applied) if it cannot be stored"""
+        data = bson.encode(record)
+        self.file.write(data)
+        self.file.flush()
+        self.log_bytes += len(data)
+        if self.fsync_always:
+            os.fsync(self.file.fileno())
+        else:
+            self.dirty = True
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(MAINTENANCE_INTERVAL)
+            try:
+                self._sync()
+                if self.log_bytes >= self.compact_bytes and self.log_bytes > self.snapshot_bytes:
+                    await self.compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Demo data maintenance failed: {e}")
+
+    # ---- compaction --------------------------------------------------------
+
+    async def compact(self):
+        """Write a snapshot of the current state and drop the log it replaces"""
+        if self.compacting:
+            return
+        self.compacting = True
+        started = time.perf_counter()
+        try:
+            covered = self.segment
+            self._sync()
+            self.file.close()
+            self._open_segment(covered + 1)
+            self.log_bytes = 0
+            state = [
+                (name, [index.info() for index in collection.indexes.values()], list(collection.docs.values()))
+                for name, collection in self.db.collections.items()
+            ]
+            self.snapshot_bytes = await asyncio.to_thread(self._write_snapshot, state, covered)
+            for number in self._segments():
+                if number <= covered:
+                    (self.path / segment_name(number)).unlink()
+            self.compactions += 1
+            self.last_compaction_ms = (time.perf_counter() - started) * 1000
+            logger.info(
+                f"Compacted demo data: {self.snapshot_bytes} byte snapshot in {self.last_compaction_ms:.0f} ms"
+            )
+        finally:
+            self.compacting = False
+
+    def _write_snapshot(self, state: list, covered: int) -> int:
+        temporary = self.path / (SNAPSHOT_FILE + ".tmp")
+        with open(temporary, "wb") as out:
+            out.write(bson.encode({"op": "snapshot", "version": FORMAT_VERSION, "segment": covered}))
+            for name, specs, docs in state:
+                for spec in specs:
+                    out.write(bson.encode({"op": "create_index", "c": name, "spec": spec}))
+                for start in range(0, len(docs), SNAPSHOT_CHUNK):
+                    out.write(bson.encode({"op": "load", "c": name, "d": docs[start:start + SNAPSHOT_CHUNK]}))
+            out.flush()
+            os.fsync(out.fileno())
+            size = out.tell()
+        os.replace(temporary, self.path / SNAPSHOT_FILE)
+        _fsync_directory(self.path)
+        return size
+
+    # ---- shutdown ----------------------------------------------------------
+
+    async def close(self):
+        """Stop maintenance, flush the log and release the directory"""
+        while self.compacting:
+            await asyncio.sleep(0.05)
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        if self.db.journal is self:
+            self.db.journal = None
+        if self.file is not None:
+            self._sync()
+            self.file.close()
+            self.file = None
+        if self.lock_file is not None:
+            if fcntl:
+                fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+            else:
+                self.lock_file.seek(0)
+                msvcrt.locking(self.lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            self.lock_file.close()
+            self.lock_file = None
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "segment": self.segment,
+            "log_bytes": self.log_bytes,
+            "snapshot_bytes": self.snapshot_bytes,
+            "replayed_records": self.replayed_records,
+            "replay_ms": round(self.replay_ms, 1),
+            "compactions": self.compactions,
+            "last_compaction_ms": round(self.last_compaction_ms, 1),
+        }
+
+
+async def open_journal(db, path, **options) -> Optional[MemoryJournal]:
+    """
+    Load `db` from `path` and log its changes there from now on
+
+    Args:
+        db: An empty MemoryDatabase
+        path: Data directory
+        options: MemoryJournal settings
+
+    Returns:
+        MemoryJournal, or None when another process owns the directory
+    """
+    journal = MemoryJournal(db, path, **options)
+    if not journal.lock():
+        logger.warning(f"{path} is in use by another process; demo data in this worker will not be saved")
+        return None
+    try:
+        journal.load()
+    except Exception:
+        await journal.close()
+        raise
+    journal.start()
+    logger.info(f"Demo data loaded from {path}: {journal.replayed_records} records in {journal.replay_ms:.0f} ms")
+    return journal
@@ -0,0 +1,1723 @@
+"""
+In-Memory Storage Engine for demo mode and tests
+A small MongoDB stand-in with the async Motor interface the backend uses, so
+the API keeps working (and stays fast) when no MongoDB is reachable.
+
+- Documents live in a dict keyed by `_id`, in insertion order
+- `create_indexes` (run by db_migrations, as against MongoDB) builds hash
+  indexes on the leading field of each declared index; equality and `$in`
+  queries on an indexed field only visit the matching documents. Unique
+  indexes are enforced with DuplicateKeyError / BulkWriteError, and
+  case-insensitive collations are honoured
+- Each index also keeps its entries in key order, so find().sort() on an
+  index prefix walks the index instead of sorting when that visits fewer
+  documents
+- Queries support field paths through arrays, $eq/$ne/$gt/$gte/$lt/$lte,
+  $in/$nin, $exists, $regex, $size, $all, $elemMatch, $not, $and/$or/$nor
+- Cursors sort (by index walk, or top-k with a heap when limited), skip,
+  limit and project
+- Updates support $set/$unset/$inc/$mul/$min/$max/$setOnInsert/$push/
+  $addToSet/$pull, upserts and bulk_write
+- aggregate supports $match/$project/$addFields/$unset/$lookup/$unwind/
+  $sort/$skip/$limit/$count/$group/$indexStats and the common expression
+  operators
+
+Anything outside this subset raises OperationFailure rather than silently
+returning wrong results.
+
+Writes can be made durable by attaching a MemoryJournal
+(memory_persistence.py): every change is appended to its log before it is
+applied.
+"""
+
+import bisect
+import heapq
+import logging
+import re
+from datetime import datetime, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+)
+
+logger = logging.getLogger(__name__)
+
+
+class _Missing:
+    """Marker for an absent field (distinct from an explicit None)"""
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+
+# ============== VALUES AND ORDERING ==============
+
+def _copy(value):
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    return value
+
+
+def _type_rank(value) -> int:
+    # MongoDB's BSON comparison order
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, bytes):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _order_key(value):
+    """Total-order key for any value (used by sort, $min/$max and $gt in expressions)"""
+    cls = type(value)
+    if cls is str:
+        return (3, value)
+    if cls is int or cls is float:
+        return (2, value)
+    rank = _type_rank(value)
+    if rank == 1:
+        return (1, 0)
+    if rank == 4:
+        return (4, tuple((k, _order_key(v)) for k, v in value.items()))
+    if rank == 5:
+        return (5, tuple(_order_key(v) for v in value))
+    if rank == 10:
+        return (10, repr(value))
+    return (rank, value)
+
+
+def _sort_key(value, descending: bool):
+    # Arrays sort by their smallest element ascending and largest descending
+    if isinstance(value, list):
+        if not value:
+            return (1, 0)
+        keys = [_order_key(v) for v in value]
+        return max(keys) if descending else min(keys)
+    return _order_key(value)
+
+
+def _equal(a, b) -> bool:
+    if isinstance(a, bool) != isinstance(b, bool):
+        return False
+    return a == b
+
+
+def _comparable(a, b) -> bool:
+    rank = _type_rank(a)
+    return rank == _type_rank(b) and rank in (2, 3, 6, 7, 9)
+
+
+def _truthy(value) -> bool:
+    if value is None or value is MISSING or value is False:
+        return False
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value != 0
+    return True
+
+
+def _hashable(value):
+    if isinstance(value, dict):
+        return ("__doc__", tuple((k, _hashable(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return ("__array__", tuple(_hashable(v) for v in value))
+    return value
+
+
+# ============== FIELD PATHS ==============
+
+def _walk(value, parts, i, out):
+    if i == len(parts):
+        out.append(value)
+        return
+    key = parts[i]
+    if isinstance(value, dict):
+        if key in value:
+            _walk(value[key], parts, i + 1, out)
+    elif isinstance(value, list):
+        if key.isdigit():
+            index = int(key)
+            if index < len(value):
+                _walk(value[index], parts, i + 1, out)
+        for item in value:
+            if isinstance(item, dict):
+                _walk(item, parts, i, out)
+
+
+def _path_values(doc, path: str) -> list:
+    """Every value at a dotted path; arrays along the path fan out"""
+    if "." not in path:
+        value = doc.get(path, MISSING) if isinstance(doc, dict) else MISSING
+        return [] if value is MISSING else [value]
+    out = []
+    _walk(doc, path.split("."), 0, out)
+    return out
+
+
+def _candidates(doc, path: str) -> list:
+    """Values a query condition is tested against: each value and, for arrays, their elements"""
+    out = []
+    for value in _path_values(doc, path):
+        out.append(value)
+        if isinstance(value, list):
+            out.extend(value)
+    return out
+
+
+def _get_path(doc, path: str):
+    """Single value at a dotted path without array fan-out, or MISSING"""
+    if "." not in path:
+        return doc.get(path, MISSING) if isinstance(doc, dict) else MISSING
+    value = doc
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list) and part.isdigit() and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def _set_path(doc, path: str, value):
+    parts = path.split(".")
+    target = doc
+    for i, part in enumerate(parts[:-1]):
+        if isinstance(target, list) and part.isdigit():
+            index = int(part)
+            while len(target) <= index:
+                target.append(None)
+            if not isinstance(target[index], (dict, list)):
+                target[index] = {}
+            target = target[index]
+        elif isinstance(target, dict):
+            if not isinstance(target.get(part), (dict, list)):
+                target[part] = {}
+            target = target[part]
+        else:
+            raise OperationFailure(f"Cannot create field '{part}' in element {target!r}")
+    last = parts[-1]
+    if isinstance(target, list) and last.isdigit():
+        index = int(last)
+        while len(target) <= index:
+            target.append(None)
+        target[index] = value
+    elif isinstance(target, dict):
+        target[last] = value
+    else:
+        raise OperationFailure(f"Cannot create field '{last}' in element {target!r}")
+
+
+def _unset_path(doc, path: str):
+    parts = path.split(".")
+    parent = _get_path(doc, ".".join(parts[:-1])) if len(parts) > 1 else doc
+    if isinstance(parent, dict):
+        parent.pop(parts[-1], None)
+    elif isinstance(parent, list) and parts[-1].isdigit() and int(parts[-1]) < len(parent):
+        parent[int(parts[-1])] = None
+
+
+# ============== QUERY MATCHING ==============
+
+@lru_cache(maxsize=512)
+def _regex(pattern: str, options: str):
+    flags = 0
+    for option in options:
+        flags |= {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}.get(option, 0)
+    return re.compile(pattern, flags)
+
+
+def _fold(value, case_insensitive: bool):
+    return value.casefold() if case_insensitive and isinstance(value, str) else value
+
+
+def _is_operator_dict(value) -> bool:
+    return isinstance(value, dict) and bool(value) and all(k.startswith("$") for k in value)
+
+
+def _match_all(doc) -> bool:
+    return True
+
+
+def compile_filter(query: Optional[dict], collation: Optional[dict] = None):
+    """
+    Build a predicate for a MongoDB query document
+
+    Args:
+        query: Filter document
+        collation: Collation; strength 1-2 compares strings case-insensitively
+
+    Returns:
+        callable: doc -> bool
+    """
+    if not query:
+        return _match_all
+    case_insensitive = bool(collation) and collation.get("strength", 3) <= 2
+    tests = [_compile_clause(key, value, case_insensitive) for key, value in query.items()]
+    if len(tests) == 1:
+        return tests[0]
+    return lambda doc: all(test(doc) for test in tests)
+
+
+def _compile_clause(key, value, ci):
+    if key in ("$and", "$or", "$nor"):
+        subs = [compile_filter(sub, {"strength": 2} if ci else None) for sub in value]
+        if key == "$and":
+            return lambda doc: all(sub(doc) for sub in subs)
+        if key == "$or":
+            return lambda doc: any(sub(doc) for sub in subs)
+        return lambda doc: not any(sub(doc) for sub in subs)
+    if key.startswith("$"):
+        raise OperationFailure(f"unknown top level operator: {key}")
+    if _is_operator_dict(value):
+        value_test = _compile_operators(value, ci)
+    else:
+        value_test = _compile_equality(value, ci)
+    return lambda doc: value_test(_candidates(doc, key))
+
+
+def _compile_equality(expected, ci):
+    if expected is None:
+        return lambda values: not values or any(v is None for v in values)
+    if isinstance(expected, re.Pattern):
+        return lambda values: any(isinstance(v, str) and expected.search(v) for v in values)
+    if ci and isinstance(expected, str):
+        folded = expected.casefold()
+        return lambda values: any(isinstance(v, str) and v.casefold() == folded for v in values)
+    return lambda values: any(_equal(v, expected) for v in values)
+
+
+def _compile_in(options, ci):
+    tests = [_compile_equality(option, ci) for option in options]
+    return lambda values: any(test(values) for test in tests)
+
+
+def _compile_comparison(op, bound):
+    compare = {
+        "$gt": lambda a: a > bound,
+        "$gte": lambda a: a >= bound,
+        "$lt": lambda a: a < bound,
+        "$lte": lambda a: a <= bound,
+    }[op]
+    return lambda values: any(_comparable(v, bound) and compare(v) for v in values)
+
+
+def _compile_operators(spec: dict, ci):
+    tests = []
+    for op, arg in spec.items():
+        if op == "$options":
+            continue
+        if op == "$eq":
+            tests.append(_compile_equality(arg, ci))
+        elif op == "$ne":
+            test = _compile_equality(arg, ci)
+            tests.append(lambda values, test=test: not test(values))
+        elif op == "$in":
+            tests.append(_compile_in(arg, ci))
+        elif op == "$nin":
+            test = _compile_in(arg, ci)
+            tests.append(lambda values, test=test: not test(values))
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            tests.append(_compile_comparison(op, arg))
+        elif op == "$exists":
+            tests.append(lambda values, want=bool(arg): bool(values) == want)
+        elif op == "$regex":
+            pattern = arg if isinstance(arg, re.Pattern) else _regex(arg, spec.get("$options", ""))
+            tests.append(lambda values, rx=pattern: any(isinstance(v, str) and rx.search(v) for v in values))
+        elif op == "$size":
+            tests.append(lambda values, n=arg: any(isinstance(v, list) and len(v) == n for v in values))
+        elif op == "$all":
+            subs = [_compile_equality(item, ci) for item in arg]
+            tests.append(lambda values, subs=subs: bool(subs) and all(sub(values) for sub in subs))
+        elif op == "$not":
+            sub = _compile_operators(arg, ci) if _is_operator_dict(arg) else _compile_equality(arg, ci)
+            tests.append(lambda values, sub=sub: not sub(values))
+        elif op == "$elemMatch":
+            if _is_operator_dict(arg):
+                sub = _compile_operators(arg, ci)
+                element_test = lambda element, sub=sub: sub([element])
+            else:
+                sub = compile_filter(arg, {"strength": 2} if ci else None)
+                element_test = lambda element, sub=sub: isinstance(element, dict) and sub(element)
+            tests.append(lambda values, test=element_test: any(
+                isinstance(v, list) and any(test(element) for element in v) for v in values
+            ))
+        else:
+            raise OperationFailure(f"unknown operator: {op}")
+    if len(tests) == 1:
+        return tests[0]
+    return lambda values: all(test(values) for test in tests)
+
+
+# ============== PROJECTION AND SORTING ==============
+
+def _project(doc: dict, projection: Optional[dict]) -> dict:
+    """Copy of `doc` shaped by a find() projection"""
+    if not projection:
+        return _copy(doc)
+    include_id = projection.get("_id", 1)
+    fields = {k: v for k, v in projection.items() if k != "_id"}
+    if fields and all(v in (1, True) for v in fields.values()):
+        out = {}
+        if include_id and "_id" in doc:
+            out["_id"] = _copy(doc["_id"])
+        for path in fields:
+            if "." not in path:
+                if path in doc:
+                    out[path] = _copy(doc[path])
+            else:
+                value = _get_path(doc, path)
+                if value is not MISSING:
+                    _set_path(out, path, _copy(value))
+        return out
+    if fields and not all(v in (0, False) for v in fields.values()):
+        raise OperationFailure("Cannot do inclusion and exclusion in the same projection")
+    out = _copy(doc)
+    for path in fields:
+        _unset_path(out, path)
+    if not include_id:
+        out.pop("_id", None)
+    return out
+
+
+def _normalize_sort(key_or_list, direction=None) -> list:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return [(key, int(order)) for key, order in key_or_list]
+
+
+def _sort_docs(docs: list, spec: list, limit: Optional[int] = None) -> list:
+    """Sort by a [(path, 1 | -1)] spec; only the first `limit` are ordered when given"""
+    if not spec:
+        return docs[:limit] if limit else docs
+
+    def field_key(path, descending):
+        if "." in path:
+            return lambda doc: _sort_key(_get_path(doc, path), descending)
+        return lambda doc: _sort_key(doc.get(path, MISSING), descending)
+
+    # Keys are plain tuples so every comparison stays in C
+    directions = {order < 0 for _, order in spec}
+    if len(directions) == 1:
+        descending = directions.pop()
+        keys = [field_key(path, descending) for path, _ in spec]
+        key = keys[0] if len(keys) == 1 else (lambda doc: tuple(k(doc) for k in keys))
+        if limit and limit < len(docs) // 4:
+            return (heapq.nlargest if descending else heapq.nsmallest)(limit, docs, key=key)
+        ordered = sorted(docs, key=key, reverse=descending)
+        return ordered[:limit] if limit else ordered
+
+    # Mixed directions: stable sort on each field, last field first
+    ordered = list(docs)
+    for path, order in reversed(spec):
+        ordered.sort(key=field_key(path, order < 0), reverse=order < 0)
+    return ordered[:limit] if limit else ordered
+
+
+# ============== UPDATES ==============
+
+def _numeric(value, op, path):
+    if value is MISSING or value is None:
+        return None
+    if not isinstance(value, (int, float)) or isinstance(value, bool):
+        raise OperationFailure(f"Cannot apply {op} to a value of non-numeric type at '{path}'")
+    return value
+
+
+def _each(arg):
+    return list(arg["$each"]) if isinstance(arg, dict) and "$each" in arg else [arg]
+
+
+def apply_update(doc: dict, update: dict, inserting: bool = False) -> dict:
+    """
+    Apply update operators to `doc` in place
+
+    Args:
+        doc: Document to modify
+        update: Update document ($set, $inc, ...)
+        inserting: True for the document created by an upsert ($setOnInsert applies)
+
+    Returns:
+        dict: The same document
+    """
+    if not update or not all(op.startswith("$") for op in update):
+        raise ValueError("update only works with $ operators")
+    for op, fields in update.items():
+        for path, arg in fields.items():
+            if path == "_id" or path.startswith("_id."):
+                if op != "$setOnInsert" and not (op == "$set" and _get_path(doc, path) == arg):
+                    raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+            current = _get_path(doc, path)
+            if op == "$set":
+                _set_path(doc, path, _copy(arg))
+            elif op == "$setOnInsert":
+                if inserting:
+                    _set_path(doc, path, _copy(arg))
+            elif op == "$unset":
+                _unset_path(doc, path)
+            elif op == "$inc":
+                base = _numeric(current, op, path)
+                _set_path(doc, path, arg if base is None else base + arg)
+            elif op == "$mul":
+                base = _numeric(current, op, path)
+                _set_path(doc, path, 0 if base is None else base * arg)
+            elif op in ("$min", "$max"):
+                if current is MISSING:
+                    _set_path(doc, path, _copy(arg))
+                else:
+                    smaller = _order_key(arg) < _order_key(current)
+                    if smaller == (op == "$min") and _order_key(arg) != _order_key(current):
+                        _set_path(doc, path, _copy(arg))
+            elif op in ("$push", "$addToSet"):
+                if current is MISSING:
+                    current = []
+                    _set_path(doc, path, current)
+                elif not isinstance(current, list):
+                    raise OperationFailure(f"The field '{path}' must be an array")
+                for item in _each(arg):
+                    if op == "$push" or not any(_equal(item, existing) for existing in current):
+                        current.append(_copy(item))
+            elif op == "$pull":
+                if isinstance(current, list):
+                    if isinstance(arg, dict) and not _is_operator_dict(arg):
+                        test = compile_filter(arg)
+                        keep = [item for item in current if not (isinstance(item, dict) and test(item))]
+                    else:
+                        test = _compile_operators(arg, False) if _is_operator_dict(arg) else _compile_equality(arg, False)
+                        keep = [item for item in current if not test([item])]
+                    current[:] = keep
+            else:
+                raise OperationFailure(f"Unknown modifier: {op}")
+    return doc
+
+
+def _upsert_seed(query: dict) -> dict:
+    """Fields an upsert copies from the equality conditions of its filter"""
+    doc = {}
+    for key, value in (query or {}).items():
+        if key == "$and":
+            for sub in value:
+                for sub_key, sub_value in _upsert_seed(sub).items():
+                    doc.setdefault(sub_key, sub_value)
+        elif key.startswith("$"):
+            continue
+        elif _is_operator_dict(value):
+            if "$eq" in value:
+                _set_path(doc, key, _copy(value["$eq"]))
+        else:
+            _set_path(doc, key, _copy(value))
+    return doc
+
+
+# ============== AGGREGATION EXPRESSIONS ==============
+
+def _field_value(value, parts):
+    """Expression-style field path: arrays along the path map to arrays"""
+    for i, part in enumerate(parts):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list):
+            rest = parts[i:]
+            mapped = [_field_value(item, rest) for item in value if isinstance(item, (dict, list))]
+            return [item for item in mapped if item is not MISSING]
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def _null(value):
+    return None if value is MISSING else value
+
+
+def evaluate(expr, doc, variables: Optional[dict] = None):
+    """
+    Evaluate an aggregation expression against `doc`
+
+    Returns:
+        The value, or MISSING for a path that does not exist
+    """
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            name, _, rest = expr[2:].partition(".")
+            if name in ("ROOT", "CURRENT"):
+                base = doc
+            elif variables and name in variables:
+                base = variables[name]
+            else:
+                raise OperationFailure(f"Use of undefined variable: {name}")
+            return _field_value(base, rest.split(".")) if rest else base
+        if expr.startswith("$"):
+            return _field_value(doc, expr[1:].split("."))
+        return expr
+    if isinstance(expr, list):
+        return [_null(evaluate(item, doc, variables)) for item in expr]
+    if isinstance(expr, dict):
+        if len(expr) == 1:
+            op = next(iter(expr))
+            if op.startswith("$"):
+                return _evaluate_operator(op, expr[op], doc, variables)
+        return {k: _null(evaluate(v, doc, variables)) for k, v in expr.items()}
+    return expr
+
+
+def _args(arg, doc, variables) -> list:
+    if isinstance(arg, list):
+        return [evaluate(item, doc, variables) for item in arg]
+    return [evaluate(arg, doc, variables)]
+
+
+def _numbers(values) -> list:
+    out = []
+    for value in values:
+        if isinstance(value, list):
+            out.extend(v for v in value if isinstance(v, (int, float)) and not isinstance(v, bool))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out.append(value)
+    return out
+
+
+def _evaluate_operator(op, arg, doc, variables):
+    if op == "$literal":
+        return arg
+    if op == "$ifNull":
+        values = _args(arg, doc, variables)
+        for value in values[:-1]:
+            if value is not None and value is not MISSING:
+                return value
+        return values[-1]
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$cmp"):
+        a, b = (_order_key(_null(v)) for v in _args(arg, doc, variables))
+        return {
+            "$eq": a == b, "$ne": a != b, "$gt": a > b, "$gte": a >= b,
+            "$lt": a < b, "$lte": a <= b, "$cmp": (a > b) - (a < b),
+        }[op]
+    if op in ("$add", "$subtract", "$multiply", "$divide", "$mod"):
+        values = [_null(v) for v in _args(arg, doc, variables)]
+        if any(v is None for v in values):
+            return None
+        if op == "$add":
+            return sum(values)
+        if op == "$multiply":
+            result = 1
+            for value in values:
+                result *= value
+            return result
+        a, b = values
+        if op == "$subtract":
+            return a - b
+        if op == "$divide":
+            return a / b
+        return a % b
+    if op in ("$sum", "$avg", "$min", "$max"):
+        values = _args(arg, doc, variables)
+        if op in ("$sum", "$avg"):
+            numbers = _numbers(values)
+            if op == "$sum":
+                return sum(numbers)
+            return sum(numbers) / len(numbers) if numbers else None
+        flat = []
+        for value in values:
+            flat.extend(value if isinstance(value, list) and len(values) == 1 else [value])
+        flat = [v for v in flat if v is not None and v is not MISSING]
+        if not flat:
+            return None
+        return (min if op == "$min" else max)(flat, key=_order_key)
+    if op == "$size":
+        value = evaluate(arg[0] if isinstance(arg, list) else arg, doc, variables)
+        if not isinstance(value, list):
+            raise OperationFailure("The argument to $size must be an array")
+        return len(value)
+    if op == "$arrayElemAt":
+        array, index = _args(arg, doc, variables)
+        if not isinstance(array, list):
+            return None
+        if -len(array) <= index < len(array):
+            return array[index]
+        return MISSING
+    if op in ("$first", "$last"):
+        array = evaluate(arg, doc, variables)
+        if not isinstance(array, list) or not array:
+            return MISSING
+        return array[0] if op == "$first" else array[-1]
+    if op in ("$filter", "$map"):
+        array = evaluate(arg["input"], doc, variables)
+        if array is None or array is MISSING:
+            return None
+        name = arg.get("as", "this")
+        out = []
+        for item in array:
+            scope = {**(variables or {}), name: item}
+            if op == "$filter":
+                if _truthy(evaluate(arg["cond"], doc, scope)):
+                    out.append(item)
+            else:
+                out.append(_null(evaluate(arg["in"], doc, scope)))
+        return out
+    if op == "$cond":
+        if isinstance(arg, list):
+            condition, then, otherwise = arg
+        else:
+            condition, then, otherwise = arg["if"], arg["then"], arg["else"]
+        return evaluate(then if _truthy(evaluate(condition, doc, variables)) else otherwise, doc, variables)
+    if op == "$and":
+        return all(_truthy(v) for v in _args(arg, doc, variables))
+    if op == "$or":
+        return any(_truthy(v) for v in _args(arg, doc, variables))
+    if op == "$not":
+        return not _truthy(_args(arg, doc, variables)[0])
+    if op == "$in":
+        value, array = _args(arg, doc, variables)
+        if not isinstance(array, list):
+            raise OperationFailure("$in requires an array as a second argument")
+        return any(_order_key(_null(value)) == _order_key(item) for item in array)
+    if op == "$concat":
+        values = [_null(v) for v in _args(arg, doc, variables)]
+        return None if any(v is None for v in values) else "".join(values)
+    if op in ("$toLower", "$toUpper"):
+        value = _null(evaluate(arg, doc, variables))
+        text = "" if value is None else str(value)
+        return text.lower() if op == "$toLower" else text.upper()
+    raise OperationFailure(f"Unrecognized expression '{op}'")
+
+
+def _accumulate(op, values):
+    present = [v for v in values if v is not MISSING]
+    if op == "$sum":
+        return sum(_numbers(present))
+    if op == "$avg":
+        numbers = _numbers(present)
+        return sum(numbers) / len(numbers) if numbers else None
+    if op in ("$min", "$max"):
+        present = [v for v in present if v is not None]
+        return (min if op == "$min" else max)(present, key=_order_key) if present else None
+    if op == "$first":
+        return _null(values[0]) if values else None
+    if op == "$last":
+        return _null(values[-1]) if values else None
+    if op == "$push":
+        return present
+    if op == "$addToSet":
+        out = []
+        for value in present:
+            if not any(_equal(value, existing) for existing in out):
+                out.append(value)
+        return out
+    if op == "$count":
+        return len(values)
+    raise OperationFailure(f"unknown group operator '{op}'")
+
+
+# ============== INDEXES ==============
+
+class MemoryIndex:
+    """
+    Hash index on the leading field of a declared index, plus its entries in
+    key order
+
+    Equality lookups on that field go straight to the matching `_id`s (with
+    their insertion sequence, so hits can be returned in natural order); a
+    unique index also maps the full key to its document. Ordered entries are
+    (sort key, sequence, `_id` key) tuples; writes are appended and merged
+    in on the next ordered read, and removed entries are dropped lazily.
+    """
+
+    def __init__(self, name: str, keys: list, unique: bool = False,
+                 collation: Optional[dict] = None, partial_filter: Optional[dict] = None):
+        self.name = name
+        self.keys = keys
+        self.fields = [field for field, _ in keys]
+        self.field = self.fields[0]
+        self.dotted = "." in self.field
+        self.unique = unique
+        self.collation = collation
+        self.case_insensitive = bool(collation) and collation.get("strength", 3) <= 2
+        self.partial_filter = partial_filter
+        self.partial = compile_filter(partial_filter) if partial_filter else None
+        self.postings = {}
+        self.unique_keys = {}
+        self.entries = []
+        self.pending = []
+        self.current = {}
+        self.stale = 0
+        # Array values or incomparable keys make key order differ from sort order
+        self.sortable = self.partial is None
+        self.ops = 0
+        self.since = datetime.now(timezone.utc)
+
+    def _lookup_keys(self, doc):
+        if not self.dotted:
+            value = doc.get(self.field, MISSING)
+            if value is MISSING:
+                return (None,)
+            if not isinstance(value, (list, dict)):
+                return (_fold(value, self.case_insensitive),)
+        values = _path_values(doc, self.field)
+        if not values:
+            return {None}
+        keys = set()
+        for value in values:
+            for item in (value if isinstance(value, list) and value else [value]):
+                keys.add(_hashable(_fold(item, self.case_insensitive)))
+        return keys
+
+    def unique_key(self, doc):
+        if not self.unique or (self.partial and not self.partial(doc)):
+            return None
+        return self._unique_key([_get_path(doc, field) for field in self.fields])
+
+    def _unique_key(self, values: list) -> tuple:
+        return tuple(
+            _hashable(_fold(None if value is MISSING else value, self.case_insensitive)) for value in values
+        )
+
+    def covers(self, doc) -> bool:
+        return self.partial is None or self.partial(doc)
+
+    def changed(self, old, new) -> bool:
+        """Whether replacing `old` with `new` touches this index"""
+        return self.covers(old) != self.covers(new) or any(
+            _path_values(old, field) != _path_values(new, field) for field in self.fields
+        )
+
+    def add(self, doc, sequence: int, id_key=MISSING):
+        if not self.covers(doc):
+            return
+        doc_id = doc["_id"]
+        if id_key is MISSING:
+            id_key = _hashable(doc_id)
+        postings = self.postings
+        for key in self._lookup_keys(doc):
+            ids = postings.get(key)
+            if ids is None:
+                postings[key] = {id_key: sequence}
+            else:
+                ids[id_key] = sequence
+        values = [_get_path(doc, field) for field in self.fields]
+        if self.unique:
+            self.unique_keys[self._unique_key(values)] = doc_id
+        if self.sortable:
+            if any(isinstance(value, list) for value in values):
+                self.sortable = False
+            else:
+                entry = (tuple(_order_key(value) for value in values), sequence, id_key)
+                self.current[id_key] = entry
+                self.pending.append(entry)
+
+    def remove(self, doc):
+        if not self.covers(doc):
+            return
+        doc_id = doc["_id"]
+        id_key = _hashable(doc_id)
+        for key in self._lookup_keys(doc):
+            ids = self.postings.get(key)
+            if ids is not None:
+                ids.pop(id_key, None)
+                if not ids:
+                    del self.postings[key]
+        unique_key = self.unique_key(doc)
+        if unique_key is not None and self.unique_keys.get(unique_key) == doc_id:
+            del self.unique_keys[unique_key]
+        if self.current.pop(id_key, None) is not None:
+            self.stale += 1
+
+    def ordered(self):
+        """
+        Live entries in ascending key order
+
+        Returns:
+            list or None: Entries (check `current` for each), None if the
+            index cannot serve sorts
+        """
+        if not self.sortable:
+            return None
+        try:
+            if len(self.pending) <= 64:
+                for entry in self.pending:
+                    bisect.insort(self.entries, entry)
+            else:
+                self.entries.extend(self.pending)
+                self.entries.sort()
+        except TypeError:
+            # e.g. naive and aware datetimes in the same field
+            self.sortable = False
+            return None
+        self.pending = []
+        if self.stale > len(self.current):
+            current = self.current
+            self.entries = [entry for entry in self.entries if current.get(entry[2]) is entry]
+            self.stale = 0
+        self.ops += 1
+        return self.entries
+
+    def lookup(self, values) -> dict:
+        """{`_id` key: insertion sequence} of documents whose field may equal one of `values`"""
+        self.ops += 1
+        if len(values) == 1:
+            return self.postings.get(_hashable(_fold(values[0], self.case_insensitive)), {})
+        ids = {}
+        for value in values:
+            ids.update(self.postings.get(_hashable(_fold(value, self.case_insensitive)), {}))
+        return ids
+
+    def exact(self, values, case_insensitive: bool) -> bool:
+        """Whether lookup(values) holds only matches, so the condition need not be re-tested"""
+        # Numbers and booleans share hash keys (1 == True), and folded keys
+        # over-match a case-sensitive query
+        return case_insensitive == self.case_insensitive and all(
+            isinstance(value, (str, ObjectId, datetime)) for value in values
+        )
+
+    def info(self) -> dict:
+        spec = {"key": dict(self.keys), "name": self.name}
+        if self.unique:
+            spec["unique"] = True
+        if self.collation:
+            spec["collation"] = self.collation
+        if self.partial_filter:
+            spec["partialFilterExpression"] = self.partial_filter
+        return spec
+
+
+def _equality_values(condition):
+    """Values an equality / $in condition can match, or None if it is not one"""
+    if isinstance(condition, (dict, list, re.Pattern)):
+        if isinstance(condition, dict) and _is_operator_dict(condition):
+            if set(condition) == {"$eq"} and not isinstance(condition["$eq"], (dict, list)):
+                return [condition["$eq"]]
+            if set(condition) == {"$in"} and not any(isinstance(v, (dict, list, re.Pattern)) for v in condition["$in"]):
+                return list(condition["$in"])
+        return None
+    return [condition]
+
+
+# ============== CURSORS ==============
+
+class MemoryCursor:
+    """find() cursor: sort / skip / limit / collation chain, then to_list or async for"""
+
+    def __init__(self, collection, query=None, projection=None, sort=None, skip=0, limit=0, collation=None):
+        self.collection = collection
+        self.query = query or {}
+        self.projection = projection
+        self.sort_spec = _normalize_sort(sort) if sort else []
+        self.skip_count = skip
+        self.limit_count = limit
+        self.collation_spec = collation
+
+    def sort(self, key_or_list, direction=None):
+        self.sort_spec = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, n: int):
+        self.skip_count = n
+        return self
+
+    def limit(self, n: int):
+        self.limit_count = abs(n)
+        return self
+
+    def collation(self, collation):
+        self.collation_spec = collation
+        return self
+
+    def batch_size(self, n: int):
+        return self
+
+    def hint(self, index):
+        return self
+
+    def max_time_ms(self, ms: int):
+        return self
+
+    def _documents(self) -> list:
+        end = self.skip_count + self.limit_count if self.limit_count else None
+        if self.sort_spec:
+            docs = self.collection._select_sorted(self.query, self.sort_spec, end, self.collation_spec)
+        else:
+            docs = self.collection._select(self.query, self.collation_spec)
+            docs = list(docs) if end is None else _take(docs, end)
+        return docs[self.skip_count:end]
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        docs = self._documents()
+        if length:
+            docs = docs[:length]
+        return [_project(doc, self.projection) for doc in docs]
+
+    async def __aiter__(self):
+        for doc in self._documents():
+            yield _project(doc, self.projection)
+
+
+class MemoryCommandCursor:
+    """aggregate() cursor over precomputed results"""
+
+    def __init__(self, run):
+        self.run = run
+
+    def batch_size(self, n: int):
+        return self
+
+    async def to_list(self, length: Optional[int] = None) -> list:
+        docs = self.run()
+        return docs[:length] if length else docs
+
+    async def __aiter__(self):
+        for doc in self.run():
+            yield doc
+
+
+def _take(iterable, n: int) -> list:
+    out = []
+    if n <= 0:
+        return out
+    for item in iterable:
+        out.append(item)
+        if len(out) >= n:
+            break
+    return out
+
+
+# ============== COLLECTIONS AND DATABASE ==============
+
+class MemoryCollection:
+    """
+    One collection: documents by `_id` plus hash indexes
+
+    Methods mirror Motor's AsyncIOMotorCollection; documents are copied in
+    and out so callers never alias stored state.
+    """
+
+    def __init__(self, name: str, database=None):
+        self.name = name
+        self.database = database
+        self.docs = {}
+        self.order = {}
+        self.sequence = 0
+        self.indexes = {}
+        self.id_ops = 0
+        self.created_at = datetime.now(timezone.utc)
+
+    @property
+    def data(self) -> list:
+        """Stored documents in insertion order"""
+        return list(self.docs.values())
+
+    # ---- planning ----------------------------------------------------------
+
+    def _plan(self, query: dict, collation: Optional[dict] = None):
+        """
+        Pick the indexed equality condition with the fewest hits
+
+        Returns:
+            tuple: ({`_id` key: insertion sequence} or None for a scan,
+                    the part of `query` still to be tested per document)
+        """
+        case_insensitive = bool(collation) and collation.get("strength", 3) <= 2
+        best, answered = None, None
+        conditions = [(field, condition, True) for field, condition in (query or {}).items()]
+        while conditions:
+            field, condition, top_level = conditions.pop()
+            if field == "$and":
+                for sub in condition:
+                    conditions.extend((f, c, False) for f, c in sub.items())
+                continue
+            if field.startswith("$"):
+                continue
+            values = _equality_values(condition)
+            if values is None:
+                continue
+            if field == "_id":
+                # _id keys are exact-case, so they cannot answer a case-insensitive string match
+                if case_insensitive and any(isinstance(v, str) for v in values):
+                    continue
+                self.id_ops += 1
+                order = self.order
+                ids = {key: order[key] for key in map(_hashable, values) if key in order}
+                exact = not case_insensitive and all(isinstance(v, (str, ObjectId, datetime)) for v in values)
+            else:
+                # A case-sensitive index would miss other-case matches of a
+                # case-insensitive query; a case-insensitive one over-matches,
+                # which the residual filter corrects. Prefer the same collation.
+                usable = [
+                    ix for ix in self.indexes.values()
+                    if ix.field == field and ix.partial is None and (ix.case_insensitive or not case_insensitive)
+                ]
+                index = min(usable, key=lambda ix: ix.case_insensitive != case_insensitive, default=None)
+                if index is None:
+                    continue
+                ids = index.lookup(values)
+                exact = index.exact(values, case_insensitive)
+            if best is None or len(ids) < len(best):
+                best = ids
+                answered = field if top_level and exact else None
+                if not best:
+                    break
+        if answered is None:
+            return best, query
+        return best, {field: condition for field, condition in query.items() if field != answered}
+
+    def _select(self, query: Optional[dict], collation: Optional[dict] = None):
+        """Iterate stored documents matching `query` (not copied)"""
+        candidate_ids, residual = self._plan(query, collation)
+        test = compile_filter(residual, collation)
+        if candidate_ids is None:
+            return (doc for doc in self.docs.values() if test(doc))
+        # Visit index hits in natural (insertion) order, as a collection scan would
+        keys = candidate_ids
+        if len(candidate_ids) > 1:
+            keys = [key for key, _ in sorted(candidate_ids.items(), key=itemgetter(1))]
+        docs = self.docs
+        if test is _match_all:
+            return (docs[key] for key in keys)
+        return (doc for doc in map(docs.__getitem__, keys) if test(doc))
+
+    def _sort_index(self, spec: list):
+        """An index whose key order serves `spec`, and whether to walk it backwards"""
+        directions = {order < 0 for _, order in spec}
+        if len(directions) != 1:
+            return None, False
+        fields = [path for path, _ in spec]
+        for index in self.indexes.values():
+            if index.sortable and index.fields[:len(fields)] == fields:
+                return index, directions.pop()
+        return None, False
+
+    def _select_sorted(self, query: Optional[dict], spec: list, end: Optional[int] = None,
+                       collation: Optional[dict] = None) -> list:
+        """The first `end` (all when None) documents matching `query` in `spec` order"""
+        index, descending = self._sort_index(spec)
+        if index is not None:
+            candidate_ids, _ = self._plan(query, collation)
+            hits = len(self.docs) if candidate_ids is None else len(candidate_ids)
+            # Walking the index visits about end * total / hits documents;
+            # sorting the hash hits costs about hits
+            if hits and (candidate_ids is None or (end or hits) * len(self.docs) < hits * hits):
+                entries = index.ordered()
+                if entries is not None:
+                    test = compile_filter(query, collation)
+                    current, docs, out = index.current, self.docs, []
+                    for entry in (reversed(entries) if descending else entries):
+                        if current.get(entry[2]) is entry:
+                            doc = docs[entry[2]]
+                            if test(doc):
+                                out.append(doc)
+                                if end and len(out) >= end:
+                                    break
+                    return out
+        return _sort_docs(list(self._select(query, collation)), spec, end)
+
+    def _first(self, query, sort=None, collation=None):
+        if sort:
+            docs = self._select_sorted(query, _normalize_sort(sort), 1, collation)
+            return docs[0] if docs else None
+        return next(iter(self._select(query, collation)), None)
+
+    # ---- writes ------------------------------------------------------------
+
+    def _check_unique(self, doc, ignore_id=MISSING):
+        doc_id = doc["_id"]
+        key = _hashable(doc_id)
+        if ignore_id is MISSING and key in self.docs:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error collection: {self.name} index: _id_ dup key: {{ _id: {doc_id!r} }}",
+                11000, {"keyPattern": {"_id": 1}, "keyValue": {"_id": doc_id}}
+            )
+        for index in self.indexes.values():
+            unique_key = index.unique_key(doc)
+            if unique_key is None:
+                continue
+            owner = index.unique_keys.get(unique_key, MISSING)
+            if owner is not MISSING and owner != ignore_id:
+                key_value = {field: _get_path(doc, field) for field in index.fields}
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.name} index: {index.name} dup key: {key_value}",
+                    11000, {"keyPattern": dict(index.keys), "keyValue": key_value}
+                )
+
+    def _log(self, record: dict):
+        # Write-ahead: a change that cannot be logged is not applied
+        journal = self.database.journal if self.database is not None else None
+        if journal is not None:
+            record["c"] = self.name
+            journal.append(record)
+
+    def _store(self, doc):
+        self._check_unique(doc)
+        self._log({"op": "put", "d": doc})
+        key = _hashable(doc["_id"])
+        self.docs[key] = doc
+        self.order[key] = sequence = self.sequence
+        self.sequence += 1
+        for index in self.indexes.values():
+            index.add(doc, sequence)
+
+    def _insert(self, doc: dict):
+        if "_id" not in doc:
+            # pymongo adds the generated _id to the caller's document
+            doc["_id"] = ObjectId()
+        self._store(_copy(doc))
+        return doc["_id"]
+
+    def _replace_stored(self, old: dict, new: dict):
+        if new.get("_id", MISSING) != old["_id"]:
+            raise OperationFailure("Performing an update on the path '_id' would modify the immutable field '_id'")
+        self._check_unique(new, ignore_id=old["_id"])
+        self._log({"op": "put", "d": new})
+        changed = [index for index in self.indexes.values() if index.changed(old, new)]
+        for index in changed:
+            index.remove(old)
+        key = _hashable(old["_id"])
+        self.docs[key] = new
+        for index in changed:
+            index.add(new, self.order[key])
+
+    def _update_doc(self, old: dict, update: dict) -> bool:
+        new = apply_update(_copy(old), update)
+        if new == old:
+            return False
+        self._replace_stored(old, new)
+        return True
+
+    def _upsert(self, query: dict, update: dict, replacement: Optional[dict] = None):
+        if replacement is not None:
+            doc = _copy(replacement)
+            seed = _upsert_seed(query)
+            if "_id" in seed and "_id" not in doc:
+                doc["_id"] = seed["_id"]
+        else:
+            doc = apply_update(_upsert_seed(query), update, inserting=True)
+        doc.setdefault("_id", ObjectId())
+        self._store(doc)
+        return doc["_id"]
+
+    def _delete(self, doc: dict):
+        self._log({"op": "delete", "id": doc["_id"]})
+        for index in self.indexes.values():
+            index.remove(doc)
+        key = _hashable(doc["_id"])
+        del self.docs[key]
+        del self.order[key]
+
+    # ---- journal replay ----------------------------------------------------
+
+    def _put(self, doc: dict):
+        old = self.docs.get(_hashable(doc["_id"]))
+        if old is None:
+            self._store(doc)
+        else:
+            self._replace_stored(old, doc)
+
+    def _load(self, docs: list):
+        """Bulk-load snapshot documents (trusted: not copied or checked for duplicates)"""
+        indexes = list(self.indexes.values())
+        for doc in docs:
+            key = _hashable(doc["_id"])
+            self.docs[key] = doc
+            self.order[key] = sequence = self.sequence
+            self.sequence += 1
+            for index in indexes:
+                index.add(doc, sequence, key)
+
+    def _delete_id(self, doc_id):
+        doc = self.docs.get(_hashable(doc_id))
+        if doc is not None:
+            self._delete(doc)
+
+    # ---- Motor API: reads --------------------------------------------------
+
+    def find(self, filter=None, projection=None, sort=None, skip=0, limit=0, collation=None, **kwargs):
+        return MemoryCursor(self, filter, projection, sort, skip, limit, collation)
+
+    async def find_one(self, filter=None, projection=None, sort=None, collation=None, **kwargs):
+        if filter is not None and not isinstance(filter, dict):
+            filter = {"_id": filter}
+        doc = self._first(filter, sort, collation)
+        return _project(doc, projection) if doc is not None else None
+
+    async def count_documents(self, filter=None, collation=None, **kwargs) -> int:
+        if not filter:
+            return len(self.docs)
+        candidate_ids, residual = self._plan(filter, collation)
+        test = compile_filter(residual, collation)
+        if candidate_ids is None:
+            return sum(1 for doc in self.docs.values() if test(doc))
+        if test is _match_all:
+            return len(candidate_ids)
+        docs = self.docs
+        return sum(1 for key in candidate_ids if test(docs[key]))
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self.docs)
+
+    async def distinct(self, key: str, filter=None, **kwargs) -> list:
+        values = []
+        for doc in self._select(filter):
+            for value in _path_values(doc, key):
+                for item in (value if isinstance(value, list) else [value]):
+                    if not any(_equal(item, seen) for seen in values):
+                        values.append(_copy(item))
+        return values
+
+    # ---- Motor API: writes -------------------------------------------------
+
+    async def insert_one(self, document: dict, **kwargs):
+        return InsertOneResult(self._insert(document), True)
+
+    async def insert_many(self, documents, ordered: bool = True, **kwargs):
+        inserted_ids, write_errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                inserted_ids.append(self._insert(document))
+            except DuplicateKeyError as e:
+                write_errors.append({"index": i, "code": 11000, "errmsg": str(e), "keyValue": e.details.get("keyValue"), "op": document})
+                if ordered:
+                    break
+        if write_errors:
+            raise BulkWriteError({
+                "writeErrors": write_errors, "writeConcernErrors": [], "nInserted": len(inserted_ids),
+                "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [],
+            })
+        return InsertManyResult(inserted_ids, True)
+
+    async def update_one(self, filter, update, upsert: bool = False, collation=None, **kwargs):
+        doc = self._first(filter, collation=collation)
+        if doc is not None:
+            modified = self._update_doc(doc, update)
+            return UpdateResult({"n": 1, "nModified": int(modified), "ok": 1.0, "updatedExisting": True}, True)
+        if upsert:
+            upserted_id = self._upsert(filter, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted_id, "ok": 1.0, "updatedExisting": False}, True)
+        return UpdateResult({"n": 0, "nModified": 0, "ok": 1.0, "updatedExisting": False}, True)
+
+    async def update_many(self, filter, update, upsert: bool = False, collation=None, **kwargs):
+        matched = list(self._select(filter, collation))
+        modified = sum(self._update_doc(doc, update) for doc in matched)
+        if not matched and upsert:
+            upserted_id = self._upsert(filter, update)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted_id, "ok": 1.0}, True)
+        return UpdateResult({"n": len(matched), "nModified": modified, "ok": 1.0}, True)
+
+    async def replace_one(self, filter, replacement: dict, upsert: bool = False, **kwargs):
+        if any(key.startswith("$") for key in replacement):
+            raise ValueError("replacement can not include $ operators")
+        doc = self._first(filter)
+        if doc is not None:
+            new = _copy(replacement)
+            new["_id"] = doc["_id"]
+            modified = new != doc
+            if modified:
+                self._replace_stored(doc, new)
+            return UpdateResult({"n": 1, "nModified": int(modified), "ok": 1.0}, True)
+        if upsert:
+            upserted_id = self._upsert(filter, None, replacement)
+            return UpdateResult({"n": 1, "nModified": 0, "upserted": upserted_id, "ok": 1.0}, True)
+        return UpdateResult({"n": 0, "nModified": 0, "ok": 1.0}, True)
+
+    async def delete_one(self, filter, **kwargs):
+        doc = self._first(filter)
+        if doc is None:
+            return DeleteResult({"n": 0, "ok": 1.0}, True)
+        self._delete(doc)
+        return DeleteResult({"n": 1, "ok": 1.0}, True)
+
+    async def delete_many(self, filter, **kwargs):
+        matched = list(self._select(filter))
+        for doc in matched:
+            self._delete(doc)
+        return DeleteResult({"n": len(matched), "ok": 1.0}, True)
+
+    async def find_one_and_update(self, filter, update, projection=None, sort=None, upsert: bool = False,
+                                  return_document=ReturnDocument.BEFORE, **kwargs):
+        doc = self._first(filter, sort)
+        if doc is not None:
+            before = _copy(doc)
+            self._update_doc(doc, update)
+            after = self.docs[_hashable(doc["_id"])]
+            return _project(after if return_document else before, projection)
+        if upsert:
+            upserted_id = self._upsert(filter, update)
+            if return_document:
+                return _project(self.docs[_hashable(upserted_id)], projection)
+        return None
+
+    async def find_one_and_replace(self, filter, replacement, projection=None, sort=None, upsert: bool = False,
+                                   return_document=ReturnDocument.BEFORE, **kwargs):
+        doc = self._first(filter, sort)
+        if doc is not None:
+            new = _copy(replacement)
+            new["_id"] = doc["_id"]
+            self._replace_stored(doc, new)
+            return _project(new if return_document else doc, projection)
+        if upsert:
+            upserted_id = self._upsert(filter, None, replacement)
+            if return_document:
+                return _project(self.docs[_hashable(upserted_id)], projection)
+        return None
+
+    async def find_one_and_delete(self, filter, projection=None, sort=None, **kwargs):
+        doc = self._first(filter, sort)
+        if doc is None:
+            return None
+        self._delete(doc)
+        return _project(doc, projection)
+
+    async def bulk_write(self, requests, ordered: bool = True, **kwargs):
+        counts = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0}
+        upserted, write_errors = [], []
+        for i, request in enumerate(requests):
+            kind = type(request).__name__
+            try:
+                if kind == "InsertOne":
+                    self._insert(request._doc)
+                    counts["nInserted"] += 1
+                    continue
+                if kind in ("DeleteOne", "DeleteMany"):
+                    method = self.delete_one if kind == "DeleteOne" else self.delete_many
+                    result = await method(request._filter)
+                    counts["nRemoved"] += result.deleted_count
+                    continue
+                if kind == "ReplaceOne":
+                    result = await self.replace_one(request._filter, request._doc, upsert=request._upsert)
+                elif kind in ("UpdateOne", "UpdateMany"):
+                    method = self.update_one if kind == "UpdateOne" else self.update_many
+                    result = await method(request._filter, request._doc, upsert=request._upsert)
+                else:
+                    raise OperationFailure(f"Unsupported bulk write operation: {kind}")
+                if result.upserted_id is not None:
+                    counts["nUpserted"] += 1
+                    upserted.append({"index": i, "_id": result.upserted_id})
+                else:
+                    counts["nMatched"] += result.matched_count
+                    counts["nModified"] += result.modified_count
+            except DuplicateKeyError as e:
+                write_errors.append({"index": i, "code": 11000, "errmsg": str(e), "op": request})
+                if ordered:
+                    break
+        result = {**counts, "upserted": upserted, "writeErrors": write_errors, "writeConcernErrors": []}
+        if write_errors:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # ---- Motor API: indexes ------------------------------------------------
+
+    async def create_index(self, keys, **kwargs) -> str:
+        from pymongo import IndexModel
+
+        return (await self.create_indexes([IndexModel(keys, **kwargs)]))[0]
+
+    async def create_indexes(self, indexes, **kwargs) -> List[str]:
+        """
+        Build hash indexes from pymongo IndexModel declarations
+
+        Returns:
+            list: Index names
+        """
+        return [self._build_index(model.document) for model in indexes]
+
+    def _build_index(self, spec: dict) -> str:
+        keys = list(spec["key"].items())
+        name = spec.get("name") or "_".join(f"{field}_{order}" for field, order in keys)
+        if name in self.indexes:
+            return name
+        index = MemoryIndex(
+            name, keys, unique=spec.get("unique", False),
+            collation=spec.get("collation"), partial_filter=spec.get("partialFilterExpression"),
+        )
+        for key, doc in self.docs.items():
+            if index.unique:
+                unique_key = index.unique_key(doc)
+                owner = index.unique_keys.get(unique_key, MISSING) if unique_key is not None else MISSING
+                if owner is not MISSING:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}", 11000)
+            index.add(doc, self.order[key])
+        self._log({"op": "create_index", "spec": index.info()})
+        self.indexes[name] = index
+        return name
+
+    async def drop_index(self, name: str):
+        if name not in self.indexes:
+            raise OperationFailure(f"index not found with name [{name}]", 27)
+        self._log({"op": "drop_index", "name": name})
+        del self.indexes[name]
+
+    async def index_information(self) -> dict:
+        info = {"_id_": {"key": [("_id", 1)]}}
+        for name, index in self.indexes.items():
+            info[name] = {"key": index.keys, **({"unique": True} if index.unique else {})}
+        return info
+
+    async def drop(self):
+        self._log({"op": "drop"})
+        self.docs.clear()
+        self.order.clear()
+        self.indexes.clear()
+
+    def watch(self, *args, **kwargs):
+        # Same answer a standalone mongod gives; lead_sync falls back on it
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", 40573)
+
+    # ---- aggregation -------------------------------------------------------
+
+    def aggregate(self, pipeline: list, **kwargs):
+        return MemoryCommandCursor(lambda: self._run_pipeline(pipeline))
+
+    def _run_pipeline(self, pipeline: list) -> list:
+        stages = list(pipeline)
+        if stages and "$indexStats" in stages[0]:
+            return self._index_stats()
+        if stages and "$match" in stages[0]:
+            docs = [_copy(doc) for doc in self._select(stages.pop(0)["$match"])]
+        else:
+            docs = [_copy(doc) for doc in self.docs.values()]
+        for stage in stages:
+            (name, spec), = stage.items()
+            docs = self._run_stage(name, spec, docs)
+        return docs
+
+    def _index_stats(self) -> list:
+        stats = [{"name": "_id_", "key": {"_id": 1}, "accesses": {"ops": self.id_ops, "since": self.created_at}}]
+        for index in self.indexes.values():
+            stats.append({**index.info(), "accesses": {"ops": index.ops, "since": index.since}})
+        return stats
+
+    def _run_stage(self, name: str, spec, docs: list) -> list:
+        if name == "$match":
+            test = compile_filter(spec)
+            return [doc for doc in docs if test(doc)]
+        if name == "$project":
+            return [_project_stage(doc, spec) for doc in docs]
+        if name in ("$addFields", "$set"):
+            out = []
+            for doc in docs:
+                new = dict(doc)
+                for path, expr in spec.items():
+                    value = evaluate(expr, doc)
+                    if value is not MISSING:
+                        _set_path(new, path, value)
+                out.append(new)
+            return out
+        if name == "$unset":
+            fields = [spec] if isinstance(spec, str) else spec
+            return [_project(doc, {field: 0 for field in fields}) for doc in docs]
+        if name == "$lookup":
+            return self._lookup(spec, docs)
+        if name == "$unwind":
+            return _unwind(spec, docs)
+        if name == "$sort":
+            return _sort_docs(docs, _normalize_sort(spec))
+        if name == "$skip":
+            return docs[spec:]
+        if name == "$limit":
+            return docs[:spec]
+        if name == "$count":
+            return [{spec: len(docs)}] if docs else []
+        if name == "$group":
+            return _group(spec, docs)
+        if name == "$replaceRoot":
+            return [evaluate(spec["newRoot"], doc) for doc in docs]
+        raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'")
+
+    def _lookup(self, spec: dict, docs: list) -> list:
+        if "pipeline" in spec or "localField" not in spec:
+            raise OperationFailure("Only localField/foreignField $lookup is supported")
+        foreign = self.database[spec["from"]] if self.database is not None else MemoryCollection(spec["from"])
+        foreign_field, local_field, target = spec["foreignField"], spec["localField"], spec["as"]
+
+        # One hash join per stage: bucket the foreign collection by join key
+        buckets = {}
+        for foreign_doc in foreign.docs.values():
+            values = _path_values(foreign_doc, foreign_field)
+            keys = set()
+            for value in values or [None]:
+                for item in (value if isinstance(value, list) and value else [value]):
+                    keys.add(_hashable(item))
+            for key in keys:
+                buckets.setdefault(key, []).append(foreign_doc)
+
+        out = []
+        for doc in docs:
+            values = _path_values(doc, local_field)
+            keys = []
+            for value in values or [None]:
+                for item in (value if isinstance(value, list) and value else [value]):
+                    key = _hashable(item)
+                    if key not in keys:
+                        keys.append(key)
+            matches, seen = [], set()
+            for key in keys:
+                for foreign_doc in buckets.get(key, ()):
+                    if id(foreign_doc) not in seen:
+                        seen.add(id(foreign_doc))
+                        matches.append(_copy(foreign_doc))
+            new = dict(doc)
+            _set_path(new, target, matches)
+            out.append(new)
+        return out
+
+
+def _project_stage(doc: dict, spec: dict) -> dict:
+    """$project: inclusion / exclusion of paths plus computed fields"""
+    fields = {k: v for k, v in spec.items() if k != "_id"}
+    computed = {k: v for k, v in fields.items() if v not in (0, 1, True, False)}
+    if not computed and fields and all(v in (0, False) for v in fields.values()):
+        return _project(doc, spec)
+    if "_id" in spec and spec["_id"] not in (0, 1, True, False):
+        computed["_id"] = spec["_id"]
+    out = {}
+    if spec.get("_id", 1) in (1, True) and "_id" in doc:
+        out["_id"] = doc["_id"]
+    for path, value in fields.items():
+        if value in (1, True) and path not in computed:
+            found = _get_path(doc, path)
+            if found is not MISSING:
+                _set_path(out, path, found)
+    for path, expr in computed.items():
+        value = evaluate(expr, doc)
+        if value is not MISSING:
+            _set_path(out, path, value)
+    return out
+
+
+def _unwind(spec, docs: list) -> list:
+    if isinstance(spec, str):
+        spec = {"path": spec}
+    path = spec["path"][1:]
+    preserve = spec.get("preserveNullAndEmptyArrays", False)
+    index_field = spec.get("includeArrayIndex")
+    out = []
+    for doc in docs:
+        value = _get_path(doc, path)
+        if isinstance(value, list) and value:
+            for i, item in enumerate(value):
+                new = dict(doc)
+                _set_path(new, path, item)
+                if index_field:
+                    new[index_field] = i
+                out.append(new)
+        elif isinstance(value, list) or value is MISSING or value is None:
+            if preserve:
+                new = dict(doc)
+                if index_field:
+                    new[index_field] = None
+                out.append(new)
+        else:
+            new = dict(doc)
+            if index_field:
+                new[index_field] = None
+            out.append(new)
+    return out
+
+
+def _group(spec: dict, docs: list) -> list:
+    key_expr = spec["_id"]
+    accumulators = {field: next(iter(acc.items())) for field, acc in spec.items() if field != "_id"}
+    groups = {}
+    for doc in docs:
+        key = _null(evaluate(key_expr, doc))
+        entry = groups.setdefault(_hashable(key), {"_id": key, "values": {field: [] for field in accumulators}})
+        for field, (op, expr) in accumulators.items():
+            entry["values"][field].append(1 if op == "$count" else evaluate(expr, doc))
+    out = []
+    for entry in groups.values():
+        row = {"_id": entry["_id"]}
+        for field, (op, _) in accumulators.items():
+            row[field] = _accumulate(op, entry["values"][field])
+        out.append(row)
+    return out
+
+
+class MemoryDatabase:
+    """
+    Database of MemoryCollections, created on first access like Motor's
+
+    Args:
+        name: Database name reported by `name`
+    """
+
+    def __init__(self, name: str = "demo"):
+        self.name = name
+        self.collections = {}
+        self.journal = None
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        collection = self.collections.get(name)
+        if collection is None:
+            collection = self.collections[name] = MemoryCollection(name, self)
+        return collection
+
+    def get_collection(self, name: str, **kwargs) -> MemoryCollection:
+        return self[name]
+
+    async def list_collection_names(self, **kwargs) -> list:
+        return [name for name, collection in self.collections.items() if collection.docs or collection.indexes]
+
+    async def drop_collection(self, name: str):
+        if name in self.collections:
+            self.collections[name]._log({"op": "drop"})
+            del self.collections[name]
+
+    def replay(self, record: dict):
+        """
+        Apply one journal record (snapshot or log entry)
+
+        Args:
+            record: {"op": ..., "c": collection name, ...} as written by MemoryCollection._log
+        """
+        op, name = record["op"], record["c"]
+        if op == "drop":
+            self.collections.pop(name, None)
+            return
+        collection = self[name]
+        if op == "put":
+            collection._put(record["d"])
+        elif op == "load":
+            collection._load(record["d"])
+        elif op == "delete":
+            collection._delete_id(record["id"])
+        elif op == "create_index":
+            collection._build_index(record["spec"])
+        elif op == "drop_index":
+            collection.indexes.pop(record["name"], None)
+        else:
+            raise ValueError(f"Unknown journal record '{op}'")
+
+    async def command(self, command, **kwargs):
+        name = command if isinstance(command, str) else next(iter(command))
+        if name == "ping":
+            return {"ok": 1.0}
+        raise OperationFailure(f"no such command: '{name}'", 59)
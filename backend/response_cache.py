@@ -0,0 +1,163 @@
+"""
+Response Cache for read-heavy GET endpoints
+In-process TTL + LRU cache keyed by route and query parameters. Entries are
+tagged with the collections they read, and write handlers invalidate by
+collection.
+
+Each collection has a generation number, bumped on invalidation. A response
+is only stored if the generations of the collections it read did not change
+while it was being computed, so a read that raced a write is not cached.
+
+The cache is per process: with several workers, another worker's write only
+becomes visible here once the entry expires (RESPONSE_CACHE_TTL seconds).
+"""
+
+import functools
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "30"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+
+
+class CacheBackend(ABC):
+    """Interface for response cache backends"""
+
+    @abstractmethod
+    def get(self, key):
+        ...
+
+    @abstractmethod
+    def set(self, key, value, collections=()):
+        ...
+
+    @abstractmethod
+    def invalidate(self, collection: str):
+        ...
+
+    @abstractmethod
+    def clear(self):
+        ...
+
+    @abstractmethod
+    def stats(self) -> dict:
+        ...
+
+
+class TTLCache(CacheBackend):
+    """
+    LRU cache whose entries also expire `ttl` seconds after being stored
+    """
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value, collections)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, collections=()):
+        self.entries[key] = (time.monotonic() + self.ttl, value, frozenset(collections))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, collection: str):
+        stale = [key for key, (_, _, collections) in self.entries.items() if collection in collections]
+        for key in stale:
+            del self.entries[key]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+cache = TTLCache()
+
+# collection -> number of invalidations so far
+generations = {}
+
+
+def set_cache_backend(backend: CacheBackend):
+    """Swap the process-wide cache backend (e.g. for tests or a shared store)"""
+    global cache
+    cache = backend
+    logger.info(f"Response cache backend set to {type(backend).__name__}")
+
+
+def invalidate_cache(*collections: str):
+    """Drop every cached response that read any of `collections`"""
+    for collection in collections:
+        generations[collection] = generations.get(collection, 0) + 1
+        cache.invalidate(collection)
+
+
+def get_cache_stats() -> dict:
+    return cache.stats()
+
+
+def cached_response(*collections: str):
+    """
+    Cache an endpoint's return value, keyed by route and its parameters
+
+    Authentication still runs on every request (FastAPI resolves dependencies
+    before calling the endpoint); the `user` argument is left out of the key.
+
+    Args:
+        collections: Collections the endpoint reads, used for invalidation
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            params = tuple(sorted((k, repr(v)) for k, v in kwargs.items() if k != "user"))
+            key = (func.__name__, params)
+            value = cache.get(key)
+            if value is not None:
+                return value
+            started = [generations.get(collection, 0) for collection in collections]
+            value = await func(*args, **kwargs)
+            # A write invalidated during the read: the result may predate it
+            if started == [generations.get(collection, 0) for collection in collections]:
+                cache.set(key, value, collections)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,103 @@
+"""
+Production launcher for the CRM backend
+Runs `server:app` under uvicorn with one worker process per CPU core, the
+uvloop event loop (asyncio's on Windows, where uvloop is not available) and
+the httptools HTTP parser. Each worker opens its own Motor client from
+`startup_event` (pool settings: client_options in database.py).
+
+Per-worker state with several workers:
+- Demo mode (no MONGO_URI) keeps all data in the worker's own
+  MemoryDatabase, so it always runs a single worker.
+- Cached list responses (response_cache) are invalidated only in the
+  worker that handled the write; other workers can serve a stale list for
+  up to RESPONSE_CACHE_TTL seconds (default 30).
+- Import uploads are stored on local disk, so all workers must share one
+  host (or one mounted backend/import_uploads directory).
+
+Settings (environment):
+    WEB_CONCURRENCY        worker processes (default: CPU count)
+    HOST / PORT            bind address (default 0.0.0.0:8000)
+    UVICORN_BACKLOG        listen() backlog for bursts of new connections (default 2048)
+    UVICORN_KEEPALIVE      seconds an idle keep-alive connection is held (default 75,
+                           above the 60s idle timeout of common load balancers)
+    UVICORN_LIMIT_CONCURRENCY  per-worker cap on concurrent connections before 503 (optional)
+
+Usage (from backend/):
+    python serve.py
+    WEB_CONCURRENCY=4 python serve.py
+"""
+
+import importlib.util
+import logging
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+from dotenv import load_dotenv
+
+from database import get_mongo_uri
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers() -> int:
+    """One worker per usable core"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def server_options() -> dict:
+    """
+    uvicorn.run keyword arguments for the production profile
+
+    Returns:
+        dict: Options read from the environment
+    """
+    limit = os.getenv("UVICORN_LIMIT_CONCURRENCY")
+    return {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "workers": int(os.getenv("WEB_CONCURRENCY") or default_workers()),
+        # uvloop has no Windows build; "auto" picks asyncio there
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "auto",
+        "http": "httptools",
+        "backlog": int(os.getenv("UVICORN_BACKLOG", "2048")),
+        "timeout_keep_alive": int(os.getenv("UVICORN_KEEPALIVE", "75")),
+        "limit_concurrency": int(limit) if limit else None,
+        "proxy_headers": True,
+        "access_log": os.getenv("UVICORN_ACCESS_LOG", "false").lower() == "true",
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    # The same .env server.py loads, so MONGO_URI set there counts
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    options = server_options()
+    if options["workers"] > 1 and not get_mongo_uri():
+        logger.warning(
+            "MONGO_URI is not set: demo mode keeps data in each worker's memory, so running 1 worker instead of %d",
+            options["workers"]
+        )
+        options["workers"] = 1
+    if options["workers"] > 1:
+        logger.info(
+            "Cached list responses are invalidated per worker; other workers may serve them "
+            "stale for up to RESPONSE_CACHE_TTL seconds after a write"
+        )
+    if options["workers"] > 1 and os.getenv("SCHEDULER_JOBSTORE", "memory").lower() != "mongo":
+        logger.warning(
+            "Running %d workers with the in-memory scheduler: every worker sends bid reminders. "
+            "Set SCHEDULER_JOBSTORE=mongo to elect a single scheduler leader.",
+            options["workers"]
+        )
+    logger.info(f"Starting {options['workers']} worker(s) on {options['host']}:{options['port']}")
+    uvicorn.run("server:app", **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
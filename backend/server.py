@@ -1,25 +1,37 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, UploadFile, File, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.concurrency import run_in_threadpool
+from pymongo.errors import BulkWriteError
 from fastapi.responses import StreamingResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import List, Optional, Generic, TypeVar, Union
 import uuid
 from datetime import datetime, timezone, timedelta
 import jwt
 import io
-from openpyxl import Workbook, load_workbook
+import json
+import base64
 import shutil
 from dotenv import load_dotenv
-import urllib.parse
 import asyncio
-import certifi
-from bid_reminder_scheduler import init_scheduler, shutdown_scheduler, get_scheduler_status
+from bid_reminder_scheduler import init_scheduler, shutdown_scheduler, get_scheduler_status, add_leader_service
+from db_migrations import MigrationError, run_migrations, get_index_usage
+from dashboard_stats import bump_stats, refresh_proforma_margin, get_dashboard_stats, reconcile_dashboard_stats, ensure_dashboard_stats
+from import_jobs import ImportProgress, init_import_workers, shutdown_import_workers, enqueue_import_job, get_import_job
+from response_cache import cached_response, invalidate_cache, get_cache_stats
+from token_cache import decode_token, get_token_cache_stats
+from auth_sessions import ACCESS_TOKEN_EXPIRE_MINUTES, create_session, rotate_refresh_token, revoke_refresh_token, is_revoked, start_session_sync, stop_session_sync, get_session_stats
+from credentials import hash_password, verify_password, matches_plaintext, shutdown_credentials, reserve_login_attempt, record_login_success
+from lead_sync import sync_proforma_from_lead, check_proforma_consistency, start_lead_sync_watcher, stop_lead_sync_watcher
+from memory_store import MemoryDatabase
+from memory_persistence import open_journal
+from database import get_mongo_uri, get_db_name, create_client, get_pool_stats
+from format_migrations import is_migrated, upgrade_legacy, load_migration_state, start_format_migrations, stop_format_migrations
 
 # ================= SETUP & CONFIG =================
 
@@ -30,9 +42,10 @@ load_dotenv(ENV_PATH)
 
 ROOT_DIR = Path(__file__).parent
 UPLOAD_DIR = ROOT_DIR / "uploads"
-UPLOAD_DIR.mkdir(exist_ok=True)
 GEM_BID_UPLOAD_DIR = ROOT_DIR / "gem_uploads"
-GEM_BID_UPLOAD_DIR.mkdir(exist_ok=True)
+# Demo mode keeps its data here across restarts (DEMO_PERSIST=false: memory only)
+DEMO_DATA_DIR = Path(os.environ.get("DEMO_DATA_DIR", ROOT_DIR / "demo_data"))
+DEMO_PERSIST = os.environ.get("DEMO_PERSIST", "true").lower() == "true"
 
 # 1.5 Default Credentials
 CRM_USER_EMAIL = os.getenv("CRM_USER_EMAIL", "sunil@bora.tech")
@@ -40,119 +53,36 @@ CRM_USER_PASSWORD = os.getenv("CRM_USER_PASSWORD", "sunil@1202")
 GEM_BID_USER_EMAIL = os.getenv("GEM_BID_USER_EMAIL", "yash.b@bora.tech")
 GEM_BID_USER_PASSWORD = os.getenv("GEM_BID_USER_PASSWORD", "yash@123")
 
-# 2. Database Configuration
-raw_uri = os.getenv("MONGO_URI") or os.getenv("MONGO_URL")
-DB_NAME = os.getenv("DB_NAME")
+# 2. Database Configuration (client settings live in database.py)
+MONGO_URI = get_mongo_uri()
+DB_NAME = get_db_name()
 
-MONGO_URI = raw_uri
-if raw_uri and "mongodb" in raw_uri and "@" in raw_uri:
-    try:
-        prefix = "mongodb+srv://" if "mongodb+srv://" in raw_uri else "mongodb://"
-        creds_host = raw_uri.replace(prefix, "")
-        if "@" in creds_host:
-            creds, host = creds_host.rsplit("@", 1)
-            if ":" in creds:
-                user, pwd = creds.split(":", 1)
-                pwd = urllib.parse.unquote(pwd)
-                encoded_pwd = urllib.parse.quote_plus(pwd)
-                MONGO_URI = f"{prefix}{user}:{encoded_pwd}@{host}"
-    except Exception as e:
-        print(f"Error parsing MONGO_URI: {e}")
-
-# --- Mock DB for Demo Mode ---
-class MockCollection:
-    def __init__(self, name):
-        self.name = name
-        self.data = []
-    async def find_one(self, query, projection=None):
-        for item in self.data:
-            if self._match(item, query):
-                return item.copy()
-        return None
+# The Motor client is opened in startup_event, so every uvicorn worker process
+# gets its own client and pool bound to its own event loop
+mongo_client = None
+db = MemoryDatabase()
 
-    def _match(self, item, query):
-        if not query: return True
-        for k, v in query.items():
-            if k == "$ne": # Handle basic $ne for MockDB
-                continue 
-            if isinstance(v, dict):
-                if "$ne" in v:
-                    if item.get(k) == v["$ne"]: return False
-                else:
-                    if item.get(k) != v: return False
-            elif item.get(k) != v:
-                return False
-        return True
-
-    def find(self, query=None, projection=None):
-        class MockCursor:
-            def __init__(self, data): self.data = data
-            def sort(self, *args, **kwargs):
-                # Basic mock sort - doesn't actually sort but matches API
-                return self
-            async def to_list(self, length): return self.data
-        
-        res = [item.copy() for item in self.data if self._match(item, query)]
-        return MockCursor(res)
-    
-    async def insert_one(self, doc):
-        self.data.append(doc)
-        return type('obj', (), {'inserted_id': 'demo_id'})
-    
-    async def insert_many(self, docs):
-        self.data.extend(docs)
-        return True
-    
-    async def update_one(self, query, update, upsert=False):
-        for item in self.data:
-            if self._match(item, query):
-                if "$set" in update: item.update(update["$set"])
-                return True
-        if upsert: await self.insert_one({**query, **update.get("$set", {})})
-        return True
-    
-    async def delete_one(self, query):
-        for i, item in enumerate(self.data):
-            if self._match(item, query):
-                self.data.pop(i)
-                return type('obj', (), {'deleted_count': 1})
-        return type('obj', (), {'deleted_count': 0})
-    
-    async def count_documents(self, query):
-        return len([item for item in self.data if self._match(item, query)])
-
-    async def aggregate(self, pipeline): 
-        class MockCursor:
-            async def to_list(self, length): return []
-        return MockCursor()
-
-class MockDB:
-    def __init__(self):
-        self.collections = {}
-    def __getattr__(self, name):
-        if name not in self.collections: self.collections[name] = MockCollection(name)
-        return self.collections[name]
-    def __getitem__(self, name): return getattr(self, name)
-    async def command(self, cmd):
-        if cmd == 'ping': return True
-        return True
-
-# Initialize DB with fallback
-try:
+def connect_database():
+    """
+    Open this worker's Motor client
+    
+    Returns:
+        Database handle, or MemoryDatabase when no MONGO_URI is configured
+    """
+    global mongo_client
     if not MONGO_URI or not DB_NAME:
-        db = MockDB()
         logger.warning("No MONGO_URI. Using Demo Mode (In-memory)")
-    else:
-        mongo_client = AsyncIOMotorClient(MONGO_URI, serverSelectionTimeoutMS=5000, tlsCAFile=certifi.where())
-        db = mongo_client[DB_NAME]
-except Exception:
-    db = MockDB()
-    logger.warning("Database init failed. Using Demo Mode (In-memory)")
+        return MemoryDatabase()
+    try:
+        mongo_client = create_client(MONGO_URI)
+        return mongo_client[DB_NAME]
+    except Exception:
+        logger.warning("Database init failed. Using Demo Mode (In-memory)")
+        return MemoryDatabase()
 
 # 3. Security / Auth Configuration
 SECRET_KEY = os.environ.get('JWT_SECRET', 'crm-secret-key-2024')
 ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 security = HTTPBearer()
 
@@ -173,55 +103,121 @@ app.add_middleware(
 
 api_router = APIRouter(prefix="/api")
 
+deferred_startup_task = None
+
 # Startup event to ensure users exist in database
 @app.on_event("startup")
 async def startup_event():
-    global db
+    global db, deferred_startup_task
+    db = connect_database()
+    UPLOAD_DIR.mkdir(exist_ok=True)
+    GEM_BID_UPLOAD_DIR.mkdir(exist_ok=True)
     try:
         # Check connection with a longer timeout
         await asyncio.wait_for(db.command('ping'), timeout=5.0)
         logger.info("MongoDB connected successfully")
     except Exception as e:
         logger.error(f"MongoDB connection failed: {e}. Switching to Demo Mode (In-Memory).")
-        db = MockDB()
+        db = MemoryDatabase()
+    
+    # Restore demo data saved by the previous run
+    if isinstance(db, MemoryDatabase) and DEMO_PERSIST:
+        try:
+            await open_journal(db, DEMO_DATA_DIR)
+        except Exception as e:
+            logger.error(f"Failed to load demo data from {DEMO_DATA_DIR}: {e}")
     
+    # Apply pending index migrations; in demo mode they build the in-memory hash indexes
     try:
-        # Check if users collection exists and has data
-        count = await db.users.count_documents({})
-        if count == 0:
-            logger.info("Initializing users collection with default credentials")
-            default_users = [
-                {
-                    "email": CRM_USER_EMAIL,
-                    "password": CRM_USER_PASSWORD,
-                    "name": "Sunil Bora",
-                    "system": "crm"
-                },
-                {
-                    "email": GEM_BID_USER_EMAIL,
-                    "password": GEM_BID_USER_PASSWORD,
-                    "name": "Yash Bora",
-                    "system": "gem_bid"
-                }
-            ]
-            await db.users.insert_many(default_users)
-        else:
-            # Sync passwords from environment to database
-            await db.users.update_one(
-                {"email": CRM_USER_EMAIL, "system": "crm"},
-                {"$set": {"password": CRM_USER_PASSWORD}}
-            )
+        await run_migrations(db)
+    except MigrationError as e:
+        # Serving without the unique / TTL indexes corrupts data quietly
+        logger.critical(f"{e}. Resolve it (python db_migrations.py --duplicates) and restart")
+        raise
+    except Exception as e:
+        logger.error(f"Failed to apply index migrations: {e}")
+    
+    if not isinstance(db, MemoryDatabase):
+        # Rewrite legacy PO / GEM order documents; reads upgrade them until done
+        try:
+            await load_migration_state(db)
+            start_format_migrations(db)
+        except Exception as e:
+            logger.error(f"Failed to start format migrations: {e}")
+    
+    # Start background import workers
+    try:
+        init_import_workers(db, {
+            "customers": import_customers,
+            "leads": import_leads,
+            "purchase_orders": import_purchase_orders,
+            "gem_bids": import_gem_bids
+        })
+    except Exception as e:
+        logger.error(f"Failed to start import workers: {e}")
+    
+    # Revoked login sessions, shared between workers; demo mode has no TTL monitor
+    start_session_sync(db, prune_expired=isinstance(db, MemoryDatabase))
+    
+    # Seeding and the scheduler are not needed to serve the first request
+    deferred_startup_task = asyncio.create_task(deferred_startup())
+
+async def seed_users():
+    """Create the default CRM / GEM BID users and keep their password hashes in line with the environment"""
+    default_users = [
+        (CRM_USER_EMAIL, CRM_USER_PASSWORD, "Sunil Bora", "crm"),
+        (GEM_BID_USER_EMAIL, GEM_BID_USER_PASSWORD, "Yash Bora", "gem_bid"),
+    ]
+    try:
+        # Users stored before passwords were hashed
+        async for user in db.users.find({"password": {"$exists": True}}):
             await db.users.update_one(
-                {"email": GEM_BID_USER_EMAIL, "system": "gem_bid"},
-                {"$set": {"password": GEM_BID_USER_PASSWORD}}
+                {"_id": user["_id"]},
+                {"$set": {"password_hash": await hash_password(user["password"])}, "$unset": {"password": ""}}
             )
+        for email, password, name, system in default_users:
+            user = await db.users.find_one({"email": email, "system": system})
+            if user is None:
+                logger.info(f"Creating default {system} user")
+                await db.users.insert_one({
+                    "email": email,
+                    "password_hash": await hash_password(password),
+                    "name": name,
+                    "system": system
+                })
+                continue
+            # Only rehash when the password in the environment changed
+            matches, _ = await verify_password(password, user.get("password_hash"))
+            if not matches:
+                await db.users.update_one(
+                    {"_id": user["_id"]},
+                    {"$set": {"password_hash": await hash_password(password)}}
+                )
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize users in database: {e}")
+
+async def deferred_startup():
+    """Startup work that runs after the app starts accepting requests"""
+    await seed_users()
+    
+    # Counters bumped before the stats document was first built are unreliable
+    try:
+        await ensure_dashboard_stats(db)
+    except Exception as e:
+        logger.error(f"Failed to reconcile dashboard stats: {e}")
+    
+    # Sync lead updates made outside the API onto their invoices; one watcher
+    # per deployment, on the scheduler leader
+    if not isinstance(db, MemoryDatabase):
+        add_leader_service(lambda: start_lead_sync_watcher(db), stop_lead_sync_watcher)
     
     # Initialize bid reminder scheduler
     try:
-        init_scheduler(db)
+        if isinstance(db, MemoryDatabase):
+            init_scheduler(db)
+        else:
+            init_scheduler(db, mongo_uri=MONGO_URI, db_name=DB_NAME)
         logger.info("Bid reminder scheduler initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize bid reminder scheduler: {e}")
@@ -252,6 +248,11 @@ class LoginRequest(BaseModel):
 class LoginResponse(BaseModel):
     token: str
     user: dict
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class CustomerBase(BaseModel):
     customer_name: str
@@ -266,6 +267,7 @@ class Customer(CustomerBase):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    revision: int = 0  # Bumped by every update; drives the detail ETag
 
 class ProductItem(BaseModel):
     product: str
@@ -295,6 +297,7 @@ class Lead(LeadBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     total_amount: float = 0
+    revision: int = 0
 
 class ProformaInvoice(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -334,6 +337,7 @@ class PurchaseOrder(PurchaseOrderBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     total_amount: float = 0
     created_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    revision: int = 0
     # Backward compatibility fields
     product: Optional[str] = None
     category: Optional[str] = None
@@ -355,6 +359,90 @@ class MarginEntry(BaseModel):
 class MarginUpdate(BaseModel):
     freight_amount: float
 
+# ============== PAGINATION ==============
+
+# Keyset pagination on (created_date, id), newest first. The cursor is an
+# opaque base64 token of the last item's sort key, so page N costs the same
+# index seek as page 1 instead of a growing skip().
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+PAGE_SORT = [("created_date", -1), ("id", -1)]
+
+T = TypeVar("T")
+
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
+
+def encode_cursor(doc: dict) -> str:
+    raw = json.dumps([doc.get("created_date"), doc.get("id")])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        created_date, item_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return created_date, item_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def fetch_page(collection, query: dict, cursor: Optional[str], limit: int):
+    """Fetch one keyset page of `collection` matching `query`"""
+    if cursor:
+        created_date, item_id = decode_cursor(cursor)
+        # Null and missing created_date sort lowest, after every date
+        if created_date is None:
+            after_cursor = {"created_date": None, "id": {"$lt": item_id}}
+        else:
+            after_cursor = {"$or": [
+                {"created_date": {"$lt": created_date}},
+                {"created_date": created_date, "id": {"$lt": item_id}},
+                {"created_date": None}
+            ]}
+        query = {"$and": [query, after_cursor]} if query else after_cursor
+    
+    # Fetch one extra row to learn whether another page exists
+    items = await collection.find(query, {"_id": 0}).sort(PAGE_SORT).limit(limit + 1).to_list(limit + 1)
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1])
+    return {"items": items, "next_cursor": next_cursor}
+
+# ============== CONDITIONAL GET ==============
+
+# Detail endpoints send a strong ETag built from the document id and its
+# `revision` counter, which every update handler bumps with $inc. A matching
+# If-None-Match is answered with 304 after a projection read of the counter,
+# so unchanged documents are neither fetched in full nor serialized.
+
+def revision_etag(doc: dict) -> str:
+    return f'"{doc["id"]}-{doc.get("revision", 0)}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def check_not_modified(collection, doc_id: str, request: Request) -> Optional[Response]:
+    """
+    Answer a conditional GET without loading the document
+    
+    Returns:
+        Response or None: A 304 response if the client's copy is current
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    current = await collection.find_one({"id": doc_id}, {"_id": 0, "id": 1, "revision": 1})
+    if current and etag_matches(if_none_match, revision_etag(current)):
+        return Response(status_code=304, headers={"ETag": revision_etag(current), "Cache-Control": "private, no-cache"})
+    return None
+
+def set_etag(response: Response, doc: dict):
+    # no-cache: browsers may keep the body but must revalidate with If-None-Match
+    response.headers["ETag"] = revision_etag(doc)
+    response.headers["Cache-Control"] = "private, no-cache"
+
 # ============== AUTH ==============
 
 def create_access_token(data: dict):
@@ -363,81 +451,206 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def issue_tokens(user: dict, system: str, sid: str, refresh_token: str) -> dict:
+    """Login / refresh response: an access token for session `sid` plus its refresh token"""
+    claims = {"email": user["email"], "name": user["name"], "sid": sid}
+    if system == "gem_bid":
+        claims["system"] = "gem_bid"
+    return {
+        "token": create_access_token(claims),
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "user": {"email": user["email"], "name": user["name"]},
+    }
+
+async def refresh_session(request: RefreshRequest, system: str) -> dict:
+    rotated = await rotate_refresh_token(db, request.refresh_token, system)
+    if rotated is None:
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    session, refresh_token = rotated
+    return issue_tokens(session, system, session["sid"], refresh_token)
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    # async: runs on the event loop instead of a threadpool hop per request
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(credentials.credentials, SECRET_KEY, [ALGORITHM])
         email = payload.get("email")
         if not email:
             raise HTTPException(status_code=401, detail="Invalid token")
+        if is_revoked(payload.get("sid")):
+            raise HTTPException(status_code=401, detail="Token revoked")
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-@api_router.post("/auth/login", response_model=LoginResponse)
-async def login(request: LoginRequest):
-    # Hardcoded fallback from environment
-    HARDCODED_CRM = {"email": CRM_USER_EMAIL, "password": CRM_USER_PASSWORD, "name": "Sunil Bora"}
-    
+async def authenticate_user(request: LoginRequest, system: str, fallback: dict, http_request: Request) -> dict:
+    """
+    Check login credentials against the stored bcrypt hash
+
+    Attempts are rate-limited per client, counted before the password is
+    checked and refunded on success; the environment credentials
+    remain a fallback for when the database is unavailable or not yet seeded.
+
+    Returns:
+        dict: {"email", "name"} of the authenticated user
+    """
+    client = http_request.client.host if http_request.client else "unknown"
+    retry_after = reserve_login_attempt(client, request.email, system)
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many failed login attempts",
+            headers={"Retry-After": str(int(retry_after) + 1)}
+        )
+
+    user = None
     try:
-        user = await db.users.find_one({
-            "email": request.email, 
-            "password": request.password,
-            "system": "crm"
-        })
-        if user:
-            token = create_access_token({"email": user["email"], "name": user["name"]})
-            return {"token": token, "user": {"email": user["email"], "name": user["name"]}}
+        user = await db.users.find_one({"email": request.email, "system": system})
     except Exception as e:
-        logger.error(f"Database login error: {e}")
-    
-    # Check hardcoded fallback
-    if request.email == HARDCODED_CRM["email"] and request.password == HARDCODED_CRM["password"]:
-        token = create_access_token({"email": HARDCODED_CRM["email"], "name": HARDCODED_CRM["name"]})
-        return {"token": token, "user": {"email": HARDCODED_CRM["email"], "name": HARDCODED_CRM["name"]}}
-        
+        logger.error(f"Database {system} login error: {e}")
+
+    matches, new_hash = await verify_password(request.password, user.get("password_hash") if user else None)
+    if matches:
+        record_login_success(client, request.email, system)
+        if new_hash:
+            # Stored with an older cost factor
+            await db.users.update_one({"_id": user["_id"]}, {"$set": {"password_hash": new_hash}})
+        return {"email": user["email"], "name": user["name"]}
+
+    if request.email == fallback["email"] and matches_plaintext(request.password, fallback["password"]):
+        record_login_success(client, request.email, system)
+        return {"email": fallback["email"], "name": fallback["name"]}
+
     raise HTTPException(status_code=401, detail="Invalid credentials")
 
+@api_router.post("/auth/login", response_model=LoginResponse)
+async def login(request: LoginRequest, http_request: Request):
+    # Hardcoded fallback from environment
+    HARDCODED_CRM = {"email": CRM_USER_EMAIL, "password": CRM_USER_PASSWORD, "name": "Sunil Bora"}
+
+    user = await authenticate_user(request, "crm", HARDCODED_CRM, http_request)
+    sid, refresh_token = await create_session(db, user, "crm")
+    return issue_tokens(user, "crm", sid, refresh_token)
+
+@api_router.post("/auth/refresh", response_model=LoginResponse)
+async def refresh_login(request: RefreshRequest):
+    """Exchange a refresh token for a new access token and refresh token (the old one is spent)"""
+    return await refresh_session(request, "crm")
+
+@api_router.post("/auth/logout")
+async def logout(request: RefreshRequest):
+    """Revoke the session: its refresh tokens stop working and its access tokens are refused"""
+    await revoke_refresh_token(db, request.refresh_token, "crm")
+    return {"message": "Logged out"}
+
 @api_router.get("/auth/verify")
 async def verify_auth(user: dict = Depends(verify_token)):
     return {"valid": True, "user": user}
 
+@api_router.get("/auth/token-cache-stats")
+async def get_auth_token_cache_stats(user: dict = Depends(verify_token)):
+    """Hit/miss counters of the decoded-token cache used by verify_token / verify_gem_token"""
+    return get_token_cache_stats()
+
+@api_router.get("/auth/session-stats")
+async def get_auth_session_stats(user: dict = Depends(verify_token)):
+    """Token lifetimes and the size of the in-memory revoked-session set"""
+    return get_session_stats()
+
 # ============== DASHBOARD ==============
 
 @api_router.get("/dashboard/kpi")
 async def get_dashboard_kpi(user: dict = Depends(verify_token)):
-    total_customers = await db.customers.count_documents({})
-    active_leads = await db.leads.count_documents({"is_converted": False})
-    total_proforma = await db.proforma_invoices.count_documents({})
-    total_purchase_orders = await db.purchase_orders.count_documents({})
-    
-    # Calculate margin summary
-    margin_pipeline = [
-        {"$lookup": {
-            "from": "purchase_orders",
-            "localField": "id",
-            "foreignField": "proforma_invoice_id",
-            "as": "linked_orders"
-        }},
-        {"$match": {"linked_orders.0": {"$exists": True}}}
-    ]
-    proforma_with_orders = await db.proforma_invoices.aggregate(margin_pipeline).to_list(1000)
-    
-    total_margin = 0
-    for pf in proforma_with_orders:
-        po_total = sum(po.get("total_amount", po.get("amount", 0)) for po in pf.get("linked_orders", []))
-        remaining = pf.get("total_amount", 0) - po_total
-        # Margin is remaining minus freight (assume 0 freight for summary)
-        total_margin += remaining
-    
-    return {
-        "total_customers": total_customers,
-        "active_leads": active_leads,
-        "total_proforma_invoices": total_proforma,
-        "total_purchase_orders": total_purchase_orders,
-        "margin_summary": round(total_margin, 2)
-    }
+    # Served from the materialized dashboard_stats document
+    return await get_dashboard_stats(db)
+
+@api_router.post("/dashboard/reconcile")
+async def reconcile_dashboard_kpi(user: dict = Depends(verify_token)):
+    """Rebuild the dashboard_stats document from the source collections"""
+    await reconcile_dashboard_stats(db)
+    return await get_dashboard_stats(db)
+
+# ============== RESPONSE CACHE ==============
+
+@api_router.get("/cache/stats")
+async def get_response_cache_stats(user: dict = Depends(verify_token)):
+    """Hit/miss/eviction counters of the in-process GET response cache"""
+    return get_cache_stats()
+
+# ============== DATABASE POOL ==============
+
+@api_router.get("/db/pool-stats")
+async def get_db_pool_stats(user: dict = Depends(verify_token)):
+    """Connection pool occupancy and checkout wait times of this worker's Mongo client"""
+    stats = get_pool_stats()
+    if isinstance(db, MemoryDatabase) and db.journal:
+        stats["demo_journal"] = db.journal.stats()
+    return stats
+
+@api_router.get("/db/index-usage")
+async def get_db_index_usage(user: dict = Depends(verify_token)):
+    """Per-index access counters ($indexStats) of the CRM collections"""
+    try:
+        return await get_index_usage(db)
+    except Exception as e:
+        return {"status": "Index stats unavailable", "error": str(e)}
+
+# ============== BULK UPLOAD HELPERS ==============
+
+BULK_UPLOAD_CHUNK_SIZE = 1000
+
+def _next_rows(rows, count: int, width: int):
+    """Pull up to `count` (row_idx, row) pairs off a worksheet row iterator"""
+    chunk = []
+    for row_idx, row in rows:
+        if len(row) < width:
+            row = tuple(row) + (None,) * (width - len(row))
+        chunk.append((row_idx, row))
+        if len(chunk) >= count:
+            break
+    return chunk
+
+async def iter_sheet_chunks(source, width: int, chunk_size: int = BULK_UPLOAD_CHUNK_SIZE):
+    """
+    Stream the active sheet of an .xlsx upload in chunks of (row_idx, row)
+    
+    The workbook is opened read-only so rows are parsed lazily from the zip
+    stream, and each chunk is parsed in the threadpool to keep the event
+    loop free. Rows are padded to `width` columns.
+    """
+    from openpyxl import load_workbook
+    
+    wb = await run_in_threadpool(load_workbook, source, read_only=True, data_only=True)
+    try:
+        rows = enumerate(wb.active.iter_rows(min_row=2, values_only=True), start=2)
+        while True:
+            chunk = await run_in_threadpool(_next_rows, rows, chunk_size, width)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        wb.close()
+
+async def insert_chunk(collection, docs: list, labels: list, errors: list) -> int:
+    """
+    insert_many(ordered=False) one chunk, reporting failed documents by label
+    
+    `labels[i]` names the spreadsheet source of `docs[i]` (e.g. "Row 12").
+    
+    Returns:
+        int: Number of documents inserted
+    """
+    if not docs:
+        return 0
+    try:
+        await collection.insert_many(docs, ordered=False)
+        return len(docs)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            errors.append(f"{labels[write_error['index']]}: {write_error.get('errmsg')}")
+        return e.details.get("nInserted", 0)
 
 # ============== CUSTOMERS ==============
 
@@ -446,18 +659,32 @@ async def create_customer(customer: CustomerCreate, user: dict = Depends(verify_
     customer_obj = Customer(**customer.model_dump())
     doc = customer_obj.model_dump()
     await db.customers.insert_one(doc)
+    await bump_stats(db, total_customers=1)
+    invalidate_cache("customers")
     return customer_obj
 
-@api_router.get("/customers", response_model=List[Customer])
-async def get_customers(user: dict = Depends(verify_token)):
-    customers = await db.customers.find({}, {"_id": 0}).to_list(1000)
-    return customers
+@api_router.get("/customers", response_model=Union[Page[Customer], List[Customer]])
+@cached_response("customers")
+async def get_customers(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
+    user: dict = Depends(verify_token)
+):
+    # legacy=true keeps the old unpaginated list response
+    if legacy:
+        return await db.customers.find({}, {"_id": 0}).to_list(None)
+    return await fetch_page(db.customers, {}, cursor, limit)
 
 @api_router.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str, user: dict = Depends(verify_token)):
+async def get_customer(customer_id: str, request: Request, response: Response, user: dict = Depends(verify_token)):
+    not_modified = await check_not_modified(db.customers, customer_id, request)
+    if not_modified:
+        return not_modified
     customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
+    set_etag(response, customer)
     return customer
 
 @api_router.put("/customers/{customer_id}", response_model=Customer)
@@ -466,7 +693,8 @@ async def update_customer(customer_id: str, customer: CustomerCreate, user: dict
     if not existing:
         raise HTTPException(status_code=404, detail="Customer not found")
     update_data = customer.model_dump()
-    await db.customers.update_one({"id": customer_id}, {"$set": update_data})
+    await db.customers.update_one({"id": customer_id}, {"$set": update_data, "$inc": {"revision": 1}})
+    invalidate_cache("customers")
     updated = await db.customers.find_one({"id": customer_id}, {"_id": 0})
     return updated
 
@@ -475,37 +703,52 @@ async def delete_customer(customer_id: str, user: dict = Depends(verify_token)):
     result = await db.customers.delete_one({"id": customer_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Customer not found")
+    await bump_stats(db, total_customers=-1)
+    invalidate_cache("customers")
     return {"message": "Customer deleted"}
 
-@api_router.post("/customers/bulk-upload")
-async def bulk_upload_customers(file: UploadFile = File(...), user: dict = Depends(verify_token)):
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content))
-    ws = wb.active
-    
+async def import_customers(source, progress: ImportProgress):
     customers_created = 0
     errors = []
     
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if not row[0]:
-            continue
-        try:
-            customer = Customer(
-                customer_name=str(row[0]),
-                reference_name=str(row[1]) if row[1] else None,
-                contact_number=str(row[2]) if row[2] else "",
-                email=str(row[3]) if row[3] else ""
-            )
-            doc = customer.model_dump()
-            await db.customers.insert_one(doc)
-            customers_created += 1
-        except Exception as e:
-            errors.append(f"Row {row_idx}: {str(e)}")
+    async for chunk in iter_sheet_chunks(source, width=4):
+        progress.rows_parsed += len(chunk)
+        docs = []
+        labels = []
+        for row_idx, row in chunk:
+            if not row[0]:
+                continue
+            try:
+                customer = Customer(
+                    customer_name=str(row[0]),
+                    reference_name=str(row[1]) if row[1] else None,
+                    contact_number=str(row[2]) if row[2] else "",
+                    email=str(row[3]) if row[3] else ""
+                )
+                docs.append(customer.model_dump())
+                labels.append(f"Row {row_idx}")
+            except Exception as e:
+                errors.append(f"Row {row_idx}: {str(e)}")
+        inserted = await insert_chunk(db.customers, docs, labels, errors)
+        await bump_stats(db, total_customers=inserted)
+        invalidate_cache("customers")
+        customers_created += inserted
+        progress.inserted, progress.errored = customers_created, len(errors)
+        await progress.save()
     
     return {"created": customers_created, "errors": errors}
 
+@api_router.post("/customers/bulk-upload")
+async def bulk_upload_customers(file: UploadFile = File(...), wait: bool = False, user: dict = Depends(verify_token)):
+    # wait=true imports inside the request and returns {created, errors}
+    if wait:
+        return await import_customers(file.file, ImportProgress())
+    return await enqueue_import_job("customers", file, system="crm", created_by=user.get("email"))
+
 @api_router.get("/customers/template/download")
 async def download_customer_template():
+    from openpyxl import Workbook
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "Customers"
@@ -555,12 +798,19 @@ async def create_lead(lead: LeadCreate, user: dict = Depends(verify_token)):
     )
     doc = lead_obj.model_dump()
     await db.leads.insert_one(doc)
+    if not lead_obj.is_converted:
+        await bump_stats(db, active_leads=1)
+    invalidate_cache("leads")
     return lead_obj
 
-@api_router.get("/leads", response_model=List[Lead])
+@api_router.get("/leads", response_model=Union[Page[Lead], List[Lead]])
+@cached_response("leads")
 async def get_leads(
     customer_name: Optional[str] = None,
     category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
     user: dict = Depends(verify_token)
 ):
     query = {}
@@ -569,14 +819,19 @@ async def get_leads(
     if category:
         query["products.category"] = {"$regex": category, "$options": "i"}
     
-    leads = await db.leads.find(query, {"_id": 0}).to_list(1000)
-    return leads
+    if legacy:
+        return await db.leads.find(query, {"_id": 0}).to_list(None)
+    return await fetch_page(db.leads, query, cursor, limit)
 
 @api_router.get("/leads/{lead_id}", response_model=Lead)
-async def get_lead(lead_id: str, user: dict = Depends(verify_token)):
+async def get_lead(lead_id: str, request: Request, response: Response, user: dict = Depends(verify_token)):
+    not_modified = await check_not_modified(db.leads, lead_id, request)
+    if not_modified:
+        return not_modified
     lead = await db.leads.find_one({"id": lead_id}, {"_id": 0})
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
+    set_etag(response, lead)
     return lead
 
 @api_router.put("/leads/{lead_id}", response_model=Lead)
@@ -609,15 +864,22 @@ async def update_lead(lead_id: str, lead: LeadCreate, user: dict = Depends(verif
     # Preserve existing document references - don't overwrite with None
     # Documents are managed via separate upload/delete endpoints
     
-    await db.leads.update_one({"id": lead_id}, {"$set": update_data})
+    await db.leads.update_one({"id": lead_id}, {"$set": update_data, "$inc": {"revision": 1}})
+    if update_data.get("is_converted"):
+        await bump_stats(db, active_leads=-1)
+    invalidate_cache("leads")
     updated = await db.leads.find_one({"id": lead_id}, {"_id": 0})
+    await sync_proforma_from_lead(db, lead_id, updated)
     return updated
 
 @api_router.delete("/leads/{lead_id}")
 async def delete_lead(lead_id: str, user: dict = Depends(verify_token)):
-    result = await db.leads.delete_one({"id": lead_id})
-    if result.deleted_count == 0:
+    deleted = await db.leads.find_one_and_delete({"id": lead_id}, {"_id": 0, "is_converted": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Lead not found")
+    if not deleted.get("is_converted"):
+        await bump_stats(db, active_leads=-1)
+    invalidate_cache("leads")
     return {"message": "Lead deleted"}
 
 # ============== TENDER DOCUMENT UPLOAD ==============
@@ -660,8 +922,10 @@ async def upload_tender_document(lead_id: str, file: UploadFile = File(...), use
     document_url = f"/api/uploads/{unique_filename}"
     await db.leads.update_one(
         {"id": lead_id},
-        {"$set": {"tender_document": document_url}}
+        {"$set": {"tender_document": document_url}, "$inc": {"revision": 1}}
     )
+    invalidate_cache("leads")
+    await sync_proforma_from_lead(db, lead_id)
     
     return {"message": "Document uploaded successfully", "document_url": document_url, "filename": file.filename}
 
@@ -676,7 +940,9 @@ async def delete_tender_document(lead_id: str, user: dict = Depends(verify_token
         if old_file.exists():
             old_file.unlink()
     
-    await db.leads.update_one({"id": lead_id}, {"$set": {"tender_document": None}})
+    await db.leads.update_one({"id": lead_id}, {"$set": {"tender_document": None}, "$inc": {"revision": 1}})
+    invalidate_cache("leads")
+    await sync_proforma_from_lead(db, lead_id)
     return {"message": "Document deleted"}
 
 # ============== WORKING SHEET UPLOAD ==============
@@ -719,8 +985,10 @@ async def upload_working_sheet(lead_id: str, file: UploadFile = File(...), user:
     document_url = f"/api/uploads/{unique_filename}"
     await db.leads.update_one(
         {"id": lead_id},
-        {"$set": {"working_sheet": document_url}}
+        {"$set": {"working_sheet": document_url}, "$inc": {"revision": 1}}
     )
+    invalidate_cache("leads")
+    await sync_proforma_from_lead(db, lead_id)
     
     return {"message": "Working sheet uploaded successfully", "document_url": document_url, "filename": file.filename}
 
@@ -735,7 +1003,9 @@ async def delete_working_sheet(lead_id: str, user: dict = Depends(verify_token))
         if old_file.exists():
             old_file.unlink()
     
-    await db.leads.update_one({"id": lead_id}, {"$set": {"working_sheet": None}})
+    await db.leads.update_one({"id": lead_id}, {"$set": {"working_sheet": None}, "$inc": {"revision": 1}})
+    invalidate_cache("leads")
+    await sync_proforma_from_lead(db, lead_id)
     return {"message": "Working sheet deleted"}
 
 @api_router.get("/uploads/{filename}")
@@ -778,34 +1048,65 @@ async def convert_lead(lead_id: str, request: ConvertLeadRequest, user: dict = D
     # Mark lead as converted
     await db.leads.update_one(
         {"id": lead_id},
-        {"$set": {"is_converted": True, "proforma_invoice_number": proforma_number}}
+        {"$set": {"is_converted": True, "proforma_invoice_number": proforma_number}, "$inc": {"revision": 1}}
     )
+    await bump_stats(db, active_leads=-1, total_proforma_invoices=1)
+    invalidate_cache("leads", "proforma_invoices")
     
     return proforma
 
-@api_router.post("/leads/bulk-upload")
-async def bulk_upload_leads(file: UploadFile = File(...), user: dict = Depends(verify_token)):
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content))
-    ws = wb.active
-    
+# Case-insensitive match for customer names, backed by the collated
+# customers.customer_name index (see db_migrations v4)
+CUSTOMER_NAME_COLLATION = {"locale": "en", "strength": 2}
+
+async def resolve_customers_by_name(names) -> dict:
+    """
+    Resolve customer names to customers in one query
+    
+    Returns:
+        dict: {case-folded customer name: customer}; the first match wins
+    """
+    if not names:
+        return {}
+    customers = await db.customers.find(
+        {"customer_name": {"$in": list(names)}}, {"_id": 0, "id": 1, "customer_name": 1}
+    ).collation(CUSTOMER_NAME_COLLATION).to_list(None)
+    
+    customers_by_name = {}
+    for customer in customers:
+        customers_by_name.setdefault(customer["customer_name"].casefold(), customer)
+    return customers_by_name
+
+async def import_leads(source, progress: ImportProgress):
     leads_created = 0
     errors = []
     
-    # Group rows by Customer Name + Proforma Invoice Number
+    # First pass: collect rows and the distinct customer names they reference
     # New column order: Customer Name, PI No, Date, Product, Part Number, Category, Qty, Price, Follow-up, Remark
+    rows = []
+    customer_names = set()
+    async for chunk in iter_sheet_chunks(source, width=10):
+        progress.rows_parsed += len(chunk)
+        for row_idx, row in chunk:
+            if not row[0]:
+                continue
+            customer_name = str(row[0]).strip()
+            customer_names.add(customer_name)
+            rows.append((row_idx, customer_name, row))
+        await progress.save()
+    
+    customers_by_name = await resolve_customers_by_name(customer_names)
+    
+    # Group rows by Customer Name + Proforma Invoice Number
     lead_data = {}
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if not row[0]:
-            continue
+    for row_idx, customer_name, row in rows:
         try:
-            customer_name = str(row[0]).strip()
             proforma_number = str(row[1]).strip() if row[1] else ""
             
             # Create grouping key: prioritize PI number if exists, otherwise use customer name
             group_key = proforma_number if proforma_number else customer_name
             
-            customer = await db.customers.find_one({"customer_name": {"$regex": f"^{customer_name}$", "$options": "i"}}, {"_id": 0})
+            customer = customers_by_name.get(customer_name.casefold())
             if not customer:
                 errors.append(f"Row {row_idx}: Customer '{customer_name}' not found")
                 continue
@@ -816,19 +1117,19 @@ async def bulk_upload_leads(file: UploadFile = File(...), user: dict = Depends(v
                     "customer_name": customer["customer_name"],
                     "proforma_invoice_number": proforma_number if proforma_number else None,
                     "date": str(row[2]) if row[2] else datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-                    "follow_up_date": str(row[8]) if len(row) > 8 and row[8] else None,
-                    "remark": str(row[9]) if len(row) > 9 and row[9] else None,
+                    "follow_up_date": str(row[8]) if row[8] else None,
+                    "remark": str(row[9]) if row[9] else None,
                     "products": []
                 }
             
             # Add product to the lead with part_number
             # Columns: Product(3), Part Number(4), Category(5), Quantity(6), Price(7)
-            quantity = float(row[6]) if len(row) > 6 and row[6] else 0
-            price = float(row[7]) if len(row) > 7 and row[7] else 0
+            quantity = float(row[6]) if row[6] else 0
+            price = float(row[7]) if row[7] else 0
             lead_data[group_key]["products"].append({
-                "product": str(row[3]) if len(row) > 3 and row[3] else "",
-                "part_number": str(row[4]) if len(row) > 4 and row[4] else None,
-                "category": str(row[5]) if len(row) > 5 and row[5] else "",
+                "product": str(row[3]) if row[3] else "",
+                "part_number": str(row[4]) if row[4] else None,
+                "category": str(row[5]) if row[5] else "",
                 "quantity": quantity,
                 "price": price,
                 "amount": round(quantity * price, 2)
@@ -836,7 +1137,9 @@ async def bulk_upload_leads(file: UploadFile = File(...), user: dict = Depends(v
         except Exception as e:
             errors.append(f"Row {row_idx}: {str(e)}")
     
-    # Create leads with grouped products
+    # Build leads with grouped products and insert them in chunks
+    docs = []
+    labels = []
     for group_key, data in lead_data.items():
         try:
             total_amount = sum(p["amount"] for p in data["products"])
@@ -850,15 +1153,36 @@ async def bulk_upload_leads(file: UploadFile = File(...), user: dict = Depends(v
                 remark=data["remark"],
                 total_amount=round(total_amount, 2)
             )
-            await db.leads.insert_one(lead.model_dump())
-            leads_created += 1
+            docs.append(lead.model_dump())
+            labels.append(f"Lead '{group_key}'")
         except Exception as e:
             errors.append(f"Lead '{group_key}': {str(e)}")
+        if len(docs) >= BULK_UPLOAD_CHUNK_SIZE:
+            inserted = await insert_chunk(db.leads, docs, labels, errors)
+            await bump_stats(db, active_leads=inserted)
+            invalidate_cache("leads")
+            leads_created += inserted
+            docs, labels = [], []
+            progress.inserted, progress.errored = leads_created, len(errors)
+            await progress.save()
+    inserted = await insert_chunk(db.leads, docs, labels, errors)
+    await bump_stats(db, active_leads=inserted)
+    invalidate_cache("leads")
+    leads_created += inserted
     
     return {"created": leads_created, "errors": errors}
 
+@api_router.post("/leads/bulk-upload")
+async def bulk_upload_leads(file: UploadFile = File(...), wait: bool = False, user: dict = Depends(verify_token)):
+    # wait=true imports inside the request and returns {created, errors}
+    if wait:
+        return await import_leads(file.file, ImportProgress())
+    return await enqueue_import_job("leads", file, system="crm", created_by=user.get("email"))
+
 @api_router.get("/leads/template/download")
 async def download_lead_template():
+    from openpyxl import Workbook
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "Leads"
@@ -882,10 +1206,14 @@ async def download_lead_template():
 
 # ============== PROFORMA INVOICES ==============
 
-@api_router.get("/proforma-invoices", response_model=List[ProformaInvoice])
+@api_router.get("/proforma-invoices", response_model=Union[Page[ProformaInvoice], List[ProformaInvoice]])
+@cached_response("proforma_invoices")
 async def get_proforma_invoices(
     customer_name: Optional[str] = None,
     category: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
     user: dict = Depends(verify_token)
 ):
     query = {}
@@ -894,8 +1222,19 @@ async def get_proforma_invoices(
     if category:
         query["products.category"] = {"$regex": category, "$options": "i"}
     
-    invoices = await db.proforma_invoices.find(query, {"_id": 0}).to_list(1000)
-    return invoices
+    if legacy:
+        return await db.proforma_invoices.find(query, {"_id": 0}).to_list(None)
+    return await fetch_page(db.proforma_invoices, query, cursor, limit)
+
+@api_router.get("/proforma-invoices/consistency")
+async def get_proforma_consistency(user: dict = Depends(verify_token)):
+    """List invoices whose synced fields have drifted from their lead"""
+    return await check_proforma_consistency(db)
+
+@api_router.post("/proforma-invoices/consistency/repair")
+async def repair_proforma_consistency(user: dict = Depends(verify_token)):
+    """Re-sync every drifted invoice from its lead"""
+    return await check_proforma_consistency(db, repair=True)
 
 @api_router.get("/proforma-invoices/{invoice_id}", response_model=ProformaInvoice)
 async def get_proforma_invoice(invoice_id: str, user: dict = Depends(verify_token)):
@@ -903,26 +1242,7 @@ async def get_proforma_invoice(invoice_id: str, user: dict = Depends(verify_toke
     if not invoice:
         raise HTTPException(status_code=404, detail="Proforma Invoice not found")
     
-    # Real-time sync: Fetch latest data from linked lead
-    if invoice.get("lead_id"):
-        lead = await db.leads.find_one({"id": invoice["lead_id"]}, {"_id": 0})
-        if lead:
-            # Sync products, documents, and amounts from lead
-            synced_data = {
-                "products": lead.get("products", invoice.get("products")),
-                "total_amount": lead.get("total_amount", invoice.get("total_amount")),
-                "tender_document": lead.get("tender_document"),
-                "working_sheet": lead.get("working_sheet"),
-                "customer_name": lead.get("customer_name", invoice.get("customer_name"))
-            }
-            # Update invoice in database with synced data
-            await db.proforma_invoices.update_one(
-                {"id": invoice_id},
-                {"$set": synced_data}
-            )
-            # Return updated invoice
-            invoice = await db.proforma_invoices.find_one({"id": invoice_id}, {"_id": 0})
-    
+    # Lead changes are pushed onto the invoice by the lead write handlers (see lead_sync)
     return invoice
 
 @api_router.put("/proforma-invoices/{invoice_id}", response_model=ProformaInvoice)
@@ -943,18 +1263,24 @@ async def update_proforma_invoice(invoice_id: str, products: List[ProductItem],
             amount=round(p.quantity * p.price, 2)
         ).model_dump())
     
+    # From now on the invoice, not its lead, owns these fields (see lead_sync)
     await db.proforma_invoices.update_one(
         {"id": invoice_id},
-        {"$set": {"products": updated_products, "total_amount": round(total_amount, 2)}}
+        {"$set": {"products": updated_products, "total_amount": round(total_amount, 2), "hand_edited": True}}
     )
+    await refresh_proforma_margin(db, invoice_id)
+    invalidate_cache("proforma_invoices")
     updated = await db.proforma_invoices.find_one({"id": invoice_id}, {"_id": 0})
     return updated
 
 @api_router.delete("/proforma-invoices/{invoice_id}")
 async def delete_proforma_invoice(invoice_id: str, user: dict = Depends(verify_token)):
-    result = await db.proforma_invoices.delete_one({"id": invoice_id})
-    if result.deleted_count == 0:
+    deleted = await db.proforma_invoices.find_one_and_delete({"id": invoice_id}, {"_id": 0, "margin_contribution": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Proforma Invoice not found")
+    await bump_stats(db, total_proforma_invoices=-1)
+    await refresh_proforma_margin(db, invoice_id, deleted_invoice=deleted)
+    invalidate_cache("proforma_invoices")
     return {"message": "Proforma Invoice deleted"}
 
 # ============== PURCHASE ORDERS ==============
@@ -993,14 +1319,19 @@ async def create_purchase_order(po: PurchaseOrderCreate, user: dict = Depends(ve
     )
     
     await db.purchase_orders.insert_one(po_obj.model_dump())
+    await bump_stats(db, total_purchase_orders=1)
+    await refresh_proforma_margin(db, po_obj.proforma_invoice_id)
     return po_obj
 
-@api_router.get("/purchase-orders", response_model=List[PurchaseOrder])
+@api_router.get("/purchase-orders", response_model=Union[Page[PurchaseOrder], List[PurchaseOrder]])
 async def get_purchase_orders(
     vendor_name: Optional[str] = None,
     category: Optional[str] = None,
     date: Optional[str] = None,
     purpose: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
     user: dict = Depends(verify_token)
 ):
     query = {}
@@ -1016,50 +1347,32 @@ async def get_purchase_orders(
     if purpose:
         query["purpose"] = purpose
     
-    orders = await db.purchase_orders.find(query, {"_id": 0}).to_list(1000)
-    
-    # Transform old format to new format for backward compatibility
-    transformed_orders = []
-    for order in orders:
-        if "products" not in order or not order["products"]:
-            # Old format - convert single product to products array
-            if order.get("product"):
-                order["products"] = [{
-                    "product": order.get("product", ""),
-                    "category": order.get("category", ""),
-                    "quantity": order.get("quantity", 0),
-                    "price": order.get("price", 0),
-                    "amount": order.get("amount", 0)
-                }]
-                order["total_amount"] = order.get("amount", 0)
-            else:
-                order["products"] = []
-                order["total_amount"] = 0
-        transformed_orders.append(order)
-    
-    return transformed_orders
+    if legacy:
+        orders = await db.purchase_orders.find(query, {"_id": 0}).to_list(None)
+    else:
+        page = await fetch_page(db.purchase_orders, query, cursor, limit)
+        orders = page["items"]
+    
+    # Old single-product orders are upgraded on read until format_migrations completes
+    if not is_migrated("purchase_orders"):
+        orders = [upgrade_legacy("purchase_orders", order) for order in orders]
+    
+    if legacy:
+        return orders
+    return {"items": orders, "next_cursor": page["next_cursor"]}
 
 @api_router.get("/purchase-orders/{order_id}", response_model=PurchaseOrder)
-async def get_purchase_order(order_id: str, user: dict = Depends(verify_token)):
+async def get_purchase_order(order_id: str, request: Request, response: Response, user: dict = Depends(verify_token)):
+    not_modified = await check_not_modified(db.purchase_orders, order_id, request)
+    if not_modified:
+        return not_modified
     order = await db.purchase_orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Purchase Order not found")
+    set_etag(response, order)
     
-    # Transform old format to new format for backward compatibility
-    if "products" not in order or not order["products"]:
-        if order.get("product"):
-            order["products"] = [{
-                "product": order.get("product", ""),
-                "category": order.get("category", ""),
-                "quantity": order.get("quantity", 0),
-                "price": order.get("price", 0),
-                "amount": order.get("amount", 0)
-            }]
-            order["total_amount"] = order.get("amount", 0)
-        else:
-            order["products"] = []
-            order["total_amount"] = 0
-    
+    if not is_migrated("purchase_orders"):
+        upgrade_legacy("purchase_orders", order)
     return order
 
 @api_router.put("/purchase-orders/{order_id}", response_model=PurchaseOrder)
@@ -1086,70 +1399,89 @@ async def update_purchase_order(order_id: str, po: PurchaseOrderCreate, user: di
     update_data["products"] = [p.model_dump() for p in products]
     update_data["total_amount"] = round(total_amount, 2)
     
-    await db.purchase_orders.update_one({"id": order_id}, {"$set": update_data})
+    await db.purchase_orders.update_one({"id": order_id}, {"$set": update_data, "$inc": {"revision": 1}})
+    # Refresh both invoices if the PO was re-linked
+    for proforma_id in {existing.get("proforma_invoice_id"), po.proforma_invoice_id}:
+        await refresh_proforma_margin(db, proforma_id)
     updated = await db.purchase_orders.find_one({"id": order_id}, {"_id": 0})
     return updated
 
 @api_router.delete("/purchase-orders/{order_id}")
 async def delete_purchase_order(order_id: str, user: dict = Depends(verify_token)):
-    result = await db.purchase_orders.delete_one({"id": order_id})
-    if result.deleted_count == 0:
+    deleted = await db.purchase_orders.find_one_and_delete({"id": order_id}, {"_id": 0, "proforma_invoice_id": 1})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Purchase Order not found")
+    await bump_stats(db, total_purchase_orders=-1)
+    await refresh_proforma_margin(db, deleted.get("proforma_invoice_id"))
     return {"message": "Purchase Order deleted"}
 
-@api_router.post("/purchase-orders/bulk-upload")
-async def bulk_upload_purchase_orders(file: UploadFile = File(...), user: dict = Depends(verify_token)):
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content))
-    ws = wb.active
+async def parse_purchase_orders(source, progress: ImportProgress):
+    """
+    Parse and group a PO sheet and resolve its linked proforma invoices
     
-    orders_created = 0
+    Returns:
+        tuple: (PO documents, error labels per document, row errors)
+    """
     errors = []
     
-    # Group rows by PO Number to support multiple products per PO
+    # Phase 1: parse and group rows by PO Number (multiple products per PO),
+    # collecting the proforma invoice numbers referenced by linked POs
     po_data = {}
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if not row[0]:
-            continue
-        try:
-            po_number = str(row[0])
-            if po_number not in po_data:
-                proforma_id = None
-                proforma_number = None
-                purpose = str(row[3]).lower() if row[3] else "stock_in_sale"
-                
-                if purpose == "linked" and row[4]:
-                    proforma = await db.proforma_invoices.find_one(
-                        {"proforma_invoice_number": str(row[4])}, {"_id": 0}
-                    )
-                    if proforma:
-                        proforma_id = proforma["id"]
-                        proforma_number = proforma["proforma_invoice_number"]
+    proforma_refs = {}
+    async for chunk in iter_sheet_chunks(source, width=9):
+        progress.rows_parsed += len(chunk)
+        for row_idx, row in chunk:
+            if not row[0]:
+                continue
+            try:
+                po_number = str(row[0])
+                if po_number not in po_data:
+                    purpose = str(row[3]).lower() if row[3] else "stock_in_sale"
+                    if purpose == "linked" and row[4]:
+                        proforma_refs[po_number] = str(row[4])
+                    
+                    po_data[po_number] = {
+                        "purchase_order_number": po_number,
+                        "date": str(row[1]) if row[1] else datetime.now(timezone.utc).strftime("%Y-%m-%d"),
+                        "vendor_name": str(row[2]) if row[2] else "",
+                        "purpose": purpose,
+                        "proforma_invoice_id": None,
+                        "proforma_invoice_number": None,
+                        "products": []
+                    }
                 
-                po_data[po_number] = {
-                    "purchase_order_number": po_number,
-                    "date": str(row[1]) if row[1] else datetime.now(timezone.utc).strftime("%Y-%m-%d"),
-                    "vendor_name": str(row[2]) if row[2] else "",
-                    "purpose": purpose,
-                    "proforma_invoice_id": proforma_id,
-                    "proforma_invoice_number": proforma_number,
-                    "products": []
-                }
-            
-            # Add product to PO
-            quantity = float(row[7]) if row[7] else 0
-            price = float(row[8]) if row[8] else 0
-            po_data[po_number]["products"].append({
-                "product": str(row[5]) if row[5] else "",
-                "category": str(row[6]) if row[6] else "",
-                "quantity": quantity,
-                "price": price,
-                "amount": round(quantity * price, 2)
-            })
-        except Exception as e:
-            errors.append(f"Row {row_idx}: {str(e)}")
-    
-    # Create POs with their products
+                # Add product to PO
+                quantity = float(row[7]) if row[7] else 0
+                price = float(row[8]) if row[8] else 0
+                po_data[po_number]["products"].append({
+                    "product": str(row[5]) if row[5] else "",
+                    "category": str(row[6]) if row[6] else "",
+                    "quantity": quantity,
+                    "price": price,
+                    "amount": round(quantity * price, 2)
+                })
+            except Exception as e:
+                errors.append(f"Row {row_idx}: {str(e)}")
+    
+    # Phase 2: resolve every referenced proforma invoice in one query
+    proformas_by_number = {}
+    if proforma_refs:
+        proformas = await db.proforma_invoices.find(
+            {"proforma_invoice_number": {"$in": list(set(proforma_refs.values()))}},
+            {"_id": 0, "id": 1, "proforma_invoice_number": 1}
+        ).to_list(None)
+        for proforma in proformas:
+            proformas_by_number.setdefault(proforma["proforma_invoice_number"], proforma)
+    
+    for po_number, proforma_number in proforma_refs.items():
+        proforma = proformas_by_number.get(proforma_number)
+        if proforma:
+            po_data[po_number]["proforma_invoice_id"] = proforma["id"]
+            po_data[po_number]["proforma_invoice_number"] = proforma["proforma_invoice_number"]
+    
+    # Build POs with their products
+    docs = []
+    labels = []
     for po_number, data in po_data.items():
         try:
             total_amount = sum(p["amount"] for p in data["products"])
@@ -1158,15 +1490,41 @@ async def bulk_upload_purchase_orders(file: UploadFile = File(...), user: dict =
                 products=data["products"],
                 total_amount=round(total_amount, 2)
             )
-            await db.purchase_orders.insert_one(po.model_dump())
-            orders_created += 1
+            docs.append(po.model_dump())
+            labels.append(f"PO {po_number}")
         except Exception as e:
             errors.append(f"PO {po_number}: {str(e)}")
     
+    return docs, labels, errors
+
+async def import_purchase_orders(source, progress: ImportProgress):
+    docs, labels, errors = await parse_purchase_orders(source, progress)
+    orders_created = await insert_chunk(db.purchase_orders, docs, labels, errors)
+    await bump_stats(db, total_purchase_orders=orders_created)
+    for proforma_id in {doc["proforma_invoice_id"] for doc in docs if doc["proforma_invoice_id"]}:
+        await refresh_proforma_margin(db, proforma_id)
     return {"created": orders_created, "errors": errors}
 
+@api_router.post("/purchase-orders/bulk-upload")
+async def bulk_upload_purchase_orders(
+    file: UploadFile = File(...),
+    dry_run: bool = False,
+    wait: bool = False,
+    user: dict = Depends(verify_token)
+):
+    # dry_run previews the grouped POs without writing
+    if dry_run:
+        docs, _, errors = await parse_purchase_orders(file.file, ImportProgress())
+        return {"dry_run": True, "purchase_orders": docs, "errors": errors}
+    # wait=true imports inside the request and returns {created, errors}
+    if wait:
+        return await import_purchase_orders(file.file, ImportProgress())
+    return await enqueue_import_job("purchase_orders", file, system="crm", created_by=user.get("email"))
+
 @api_router.get("/purchase-orders/template/download")
 async def download_po_template():
+    from openpyxl import Workbook
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "Purchase Orders"
@@ -1189,46 +1547,63 @@ async def download_po_template():
 
 # ============== MARGIN CALCULATOR ==============
 
-@api_router.get("/margin-calculator")
-async def get_margin_data(user: dict = Depends(verify_token)):
-    # Get proforma invoices with linked purchase orders
-    proforma_list = await db.proforma_invoices.find({}, {"_id": 0}).to_list(1000)
+# Single server-side join: proforma_invoices -> purchase_orders -> margins.
+# Replaces the per-invoice / per-order find loop so the number of round-trips
+# no longer grows with the number of invoices.
+MARGIN_PIPELINE = [
+    {"$project": {"_id": 0, "id": 1, "proforma_invoice_number": 1, "total_amount": 1}},
+    {"$lookup": {
+        "from": "purchase_orders",
+        "localField": "id",
+        "foreignField": "proforma_invoice_id",
+        "as": "linked_orders"
+    }},
+    {"$unwind": "$linked_orders"},
+    {"$lookup": {
+        "from": "margins",
+        "localField": "linked_orders.id",
+        "foreignField": "purchase_order_id",
+        "as": "margin"
+    }},
+    {"$project": {
+        "proforma_invoice_number": 1,
+        "proforma_invoice_id": "$id",
+        "proforma_total_amount": "$total_amount",
+        "purchase_order_number": "$linked_orders.purchase_order_number",
+        "purchase_order_id": "$linked_orders.id",
+        "purchase_order_amount": {"$ifNull": ["$linked_orders.total_amount", {"$ifNull": ["$linked_orders.amount", 0]}]},
+        "margin": {"$arrayElemAt": [
+            {"$filter": {"input": "$margin", "cond": {"$eq": ["$$this.proforma_invoice_id", "$id"]}}}, 0
+        ]}
+    }}
+]
+
+async def fetch_margin_rows(database):
+    """Run the margin join and compute remaining/margin amounts for each PI/PO pair"""
+    rows = await database.proforma_invoices.aggregate(MARGIN_PIPELINE).to_list(None)
     
     margin_data = []
-    for pf in proforma_list:
-        linked_orders = await db.purchase_orders.find(
-            {"proforma_invoice_id": pf["id"]}, {"_id": 0}
-        ).to_list(100)
-        
-        if not linked_orders:
-            continue
-        
-        for po in linked_orders:
-            # Use total_amount for POs with multiple products
-            po_amount = po.get("total_amount", po.get("amount", 0))
-            remaining = pf["total_amount"] - po_amount
-            # Get saved freight from margin collection
-            margin_doc = await db.margins.find_one(
-                {"proforma_invoice_id": pf["id"], "purchase_order_id": po["id"]},
-                {"_id": 0}
-            )
-            freight = margin_doc.get("freight_amount", 0) if margin_doc else 0
-            margin_amount = remaining - freight
-            
-            margin_data.append({
-                "proforma_invoice_number": pf["proforma_invoice_number"],
-                "proforma_invoice_id": pf["id"],
-                "proforma_total_amount": pf["total_amount"],
-                "purchase_order_number": po["purchase_order_number"],
-                "purchase_order_id": po["id"],
-                "purchase_order_amount": po_amount,
-                "remaining_amount": round(remaining, 2),
-                "freight_amount": freight,
-                "margin_amount": round(margin_amount, 2)
-            })
-    
+    for row in rows:
+        remaining = row["proforma_total_amount"] - row["purchase_order_amount"]
+        freight = row.get("margin", {}).get("freight_amount", 0)
+        margin_amount = remaining - freight
+        margin_data.append({
+            "proforma_invoice_number": row["proforma_invoice_number"],
+            "proforma_invoice_id": row["proforma_invoice_id"],
+            "proforma_total_amount": row["proforma_total_amount"],
+            "purchase_order_number": row["purchase_order_number"],
+            "purchase_order_id": row["purchase_order_id"],
+            "purchase_order_amount": row["purchase_order_amount"],
+            "remaining_amount": round(remaining, 2),
+            "freight_amount": freight,
+            "margin_amount": round(margin_amount, 2)
+        })
     return margin_data
 
+@api_router.get("/margin-calculator")
+async def get_margin_data(user: dict = Depends(verify_token)):
+    return await fetch_margin_rows(db)
+
 @api_router.put("/margin-calculator/{proforma_id}/{po_id}")
 async def update_margin_freight(
     proforma_id: str,
@@ -1277,6 +1652,7 @@ class GemBid(GemBidBase):
     status_history: List[GemBidStatusUpdate] = []
     documents: List[dict] = []  # List of {filename, url, uploaded_at}
     created_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    revision: int = 0
 
 # GEM BID Valid Statuses
 GEM_BID_STATUSES = [
@@ -1314,15 +1690,18 @@ class GemOrder(GemOrderBase):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_date: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    revision: int = 0
 
 # GEM BID Authentication
-def verify_gem_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def verify_gem_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Verify JWT token for GEM BID CRM (separate from main CRM)"""
     try:
         token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token, SECRET_KEY, [ALGORITHM])
         if payload.get("system") != "gem_bid":
             raise HTTPException(status_code=401, detail="Invalid token for GEM BID CRM")
+        if is_revoked(payload.get("sid")):
+            raise HTTPException(status_code=401, detail="Token revoked")
         return payload
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
@@ -1330,40 +1709,22 @@ def verify_gem_token(credentials: HTTPAuthorizationCredentials = Depends(securit
         raise HTTPException(status_code=401, detail="Invalid token")
 
 @api_router.post("/gem-bid/auth/login")
-async def gem_bid_login(request: LoginRequest):
+async def gem_bid_login(request: LoginRequest, http_request: Request):
     # Hardcoded fallback from environment
     HARDCODED_GEM = {"email": GEM_BID_USER_EMAIL, "password": GEM_BID_USER_PASSWORD, "name": "Yash Bora"}
-    
-    try:
-        user = await db.users.find_one({
-            "email": request.email,
-            "password": request.password,
-            "system": "gem_bid"
-        })
-        if user:
-            token_data = {
-                "email": user["email"],
-                "name": user["name"],
-                "system": "gem_bid",
-                "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-            }
-            token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
-            return LoginResponse(token=token, user={"email": user["email"], "name": user["name"]})
-    except Exception as e:
-        logger.error(f"Database gem-bid login error: {e}")
-
-    # Check hardcoded fallback
-    if request.email == HARDCODED_GEM["email"] and request.password == HARDCODED_GEM["password"]:
-        token_data = {
-            "email": HARDCODED_GEM["email"],
-            "name": HARDCODED_GEM["name"],
-            "system": "gem_bid",
-            "exp": datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        }
-        token = jwt.encode(token_data, SECRET_KEY, algorithm=ALGORITHM)
-        return LoginResponse(token=token, user={"email": HARDCODED_GEM["email"], "name": HARDCODED_GEM["name"]})
-    
-    raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    user = await authenticate_user(request, "gem_bid", HARDCODED_GEM, http_request)
+    sid, refresh_token = await create_session(db, user, "gem_bid")
+    return LoginResponse(**issue_tokens(user, "gem_bid", sid, refresh_token))
+
+@api_router.post("/gem-bid/auth/refresh", response_model=LoginResponse)
+async def gem_bid_refresh(request: RefreshRequest):
+    return await refresh_session(request, "gem_bid")
+
+@api_router.post("/gem-bid/auth/logout")
+async def gem_bid_logout(request: RefreshRequest):
+    await revoke_refresh_token(db, request.refresh_token, "gem_bid")
+    return {"message": "Logged out"}
 
 @api_router.get("/gem-bid/scheduler/status")
 async def get_scheduler_status_endpoint(user: dict = Depends(verify_gem_token)):
@@ -1372,13 +1733,20 @@ async def get_scheduler_status_endpoint(user: dict = Depends(verify_gem_token)):
     return status
 
 # GEM BID CRUD Endpoints
-@api_router.get("/gem-bid/bids", response_model=List[GemBid])
-async def get_gem_bids(status_filter: Optional[str] = None, user: dict = Depends(verify_gem_token)):
+@api_router.get("/gem-bid/bids", response_model=Union[Page[GemBid], List[GemBid]])
+async def get_gem_bids(
+    status_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
+    user: dict = Depends(verify_gem_token)
+):
     query = {}
     if status_filter:
         query["status"] = status_filter
-    bids = await db.gem_bids.find(query, {"_id": 0}).sort("created_date", -1).to_list(1000)
-    return bids
+    if legacy:
+        return await db.gem_bids.find(query, {"_id": 0}).sort("created_date", -1).to_list(None)
+    return await fetch_page(db.gem_bids, query, cursor, limit)
 
 @api_router.get("/gem-bid/bids/new")
 async def get_new_bids(user: dict = Depends(verify_gem_token)):
@@ -1399,10 +1767,14 @@ async def get_completed_bids(user: dict = Depends(verify_gem_token)):
     return bids
 
 @api_router.get("/gem-bid/bids/{bid_id}", response_model=GemBid)
-async def get_gem_bid(bid_id: str, user: dict = Depends(verify_gem_token)):
+async def get_gem_bid(bid_id: str, request: Request, response: Response, user: dict = Depends(verify_gem_token)):
+    not_modified = await check_not_modified(db.gem_bids, bid_id, request)
+    if not_modified:
+        return not_modified
     bid = await db.gem_bids.find_one({"id": bid_id}, {"_id": 0})
     if not bid:
         raise HTTPException(status_code=404, detail="Bid not found")
+    set_etag(response, bid)
     return bid
 
 @api_router.post("/gem-bid/bids", response_model=GemBid)
@@ -1436,7 +1808,7 @@ async def update_gem_bid(bid_id: str, bid: GemBidCreate, user: dict = Depends(ve
         status_history.append(GemBidStatusUpdate(status=bid.status).model_dump())
         update_data["status_history"] = status_history
     
-    await db.gem_bids.update_one({"id": bid_id}, {"$set": update_data})
+    await db.gem_bids.update_one({"id": bid_id}, {"$set": update_data, "$inc": {"revision": 1}})
     updated = await db.gem_bids.find_one({"id": bid_id}, {"_id": 0})
     return updated
 
@@ -1456,7 +1828,7 @@ async def update_gem_bid_status(bid_id: str, status: str, user: dict = Depends(v
     
     await db.gem_bids.update_one(
         {"id": bid_id},
-        {"$set": {"status": status, "status_history": status_history}}
+        {"$set": {"status": status, "status_history": status_history}, "$inc": {"revision": 1}}
     )
     return {"message": f"Status updated to {status}"}
 
@@ -1507,7 +1879,7 @@ async def upload_gem_bid_document(bid_id: str, file: UploadFile = File(...), use
         "uploaded_at": datetime.now(timezone.utc).isoformat()
     })
     
-    await db.gem_bids.update_one({"id": bid_id}, {"$set": {"documents": documents}})
+    await db.gem_bids.update_one({"id": bid_id}, {"$set": {"documents": documents}, "$inc": {"revision": 1}})
     return {"message": "Document uploaded", "document_url": document_url, "filename": file.filename}
 
 @api_router.delete("/gem-bid/bids/{bid_id}/documents/{doc_index}")
@@ -1528,7 +1900,7 @@ async def delete_gem_bid_document(bid_id: str, doc_index: int, user: dict = Depe
     
     # Remove from list
     documents.pop(doc_index)
-    await db.gem_bids.update_one({"id": bid_id}, {"$set": {"documents": documents}})
+    await db.gem_bids.update_one({"id": bid_id}, {"$set": {"documents": documents}, "$inc": {"revision": 1}})
     return {"message": "Document deleted"}
 
 @api_router.get("/gem-bid/uploads/{filename}")
@@ -1541,6 +1913,8 @@ async def serve_gem_upload(filename: str):
 # GEM BID Excel Template Download
 @api_router.get("/gem-bid/template/download")
 async def download_gem_bid_template(user: dict = Depends(verify_gem_token)):
+    from openpyxl import Workbook
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "GEM Bids"
@@ -1568,114 +1942,116 @@ async def download_gem_bid_template(user: dict = Depends(verify_gem_token)):
     )
 
 # GEM BID Bulk Upload
-@api_router.post("/gem-bid/bulk-upload")
-async def bulk_upload_gem_bids(file: UploadFile = File(...), user: dict = Depends(verify_gem_token)):
-    content = await file.read()
-    wb = load_workbook(io.BytesIO(content))
-    ws = wb.active
-    
+async def import_gem_bids(source, progress: ImportProgress):
     bids_created = 0
     errors = []
     
-    for row_idx, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
-        if not row[1]: # Gem Bid No is now at index 1
-            continue
-        try:
-            # Validate required fields
-            firm_name = str(row[0]).strip() if row[0] else None
-            gem_bid_no = str(row[1]).strip()
-            bid_details = str(row[2]).strip() if row[2] else None
-            description = str(row[3]).strip() if row[3] else None
-            start_date = str(row[4]).strip() if row[4] else None
-            end_date = str(row[5]).strip() if row[5] else None
-            emd_amount = float(row[6]) if row[6] else None
-            quantity = float(row[7]) if row[7] else None
+    async for chunk in iter_sheet_chunks(source, width=14):
+        progress.rows_parsed += len(chunk)
+        docs = []
+        labels = []
+        for row_idx, row in chunk:
+            if not row[1]: # Gem Bid No is now at index 1
+                continue
+            try:
+                # Validate required fields
+                firm_name = str(row[0]).strip() if row[0] else None
+                gem_bid_no = str(row[1]).strip()
+                bid_details = str(row[2]).strip() if row[2] else None
+                description = str(row[3]).strip() if row[3] else None
+                start_date = str(row[4]).strip() if row[4] else None
+                end_date = str(row[5]).strip() if row[5] else None
+                emd_amount = float(row[6]) if row[6] else None
+                quantity = float(row[7]) if row[7] else None
             
-            # Map remaining fields
-            city = str(row[8]).strip() if len(row) > 8 and row[8] else None
-            department = str(row[9]).strip() if len(row) > 9 and row[9] else None
-            item_category = str(row[10]).strip() if len(row) > 10 and row[10] else None
-            epbg_percentage = float(row[11]) if len(row) > 11 and row[11] else None
-            epbg_month = int(row[12]) if len(row) > 12 and row[12] else None
-            status = str(row[13]).strip() if len(row) > 13 and row[13] else "Shortlisted"
+                # Map remaining fields
+                city = str(row[8]).strip() if len(row) > 8 and row[8] else None
+                department = str(row[9]).strip() if len(row) > 9 and row[9] else None
+                item_category = str(row[10]).strip() if len(row) > 10 and row[10] else None
+                epbg_percentage = float(row[11]) if len(row) > 11 and row[11] else None
+                epbg_month = int(row[12]) if len(row) > 12 and row[12] else None
+                status = str(row[13]).strip() if len(row) > 13 and row[13] else "Shortlisted"
             
-            if not all([start_date, end_date, emd_amount is not None, quantity is not None]):
-                errors.append(f"Row {row_idx}: Missing required fields")
-                continue
+                if not all([start_date, end_date, emd_amount is not None, quantity is not None]):
+                    errors.append(f"Row {row_idx}: Missing required fields")
+                    continue
             
-            if status not in GEM_BID_STATUSES:
-                status = "Shortlisted"
+                if status not in GEM_BID_STATUSES:
+                    status = "Shortlisted"
             
-            bid = GemBid(
-                Firm_name=firm_name,
-                gem_bid_no=gem_bid_no,
-                Bid_details=bid_details,
-                description=description,
-                start_date=start_date,
-                end_date=end_date,
-                emd_amount=emd_amount,
-                quantity=quantity,
-                city=city,
-                department=department,
-                item_category=item_category,
-                epbg_percentage=epbg_percentage,
-                epbg_month=epbg_month,
-                status=status,
-                status_history=[GemBidStatusUpdate(status=status)]
-            )
-            await db.gem_bids.insert_one(bid.model_dump())
-            bids_created += 1
-        except Exception as e:
-            errors.append(f"Row {row_idx}: {str(e)}")
+                bid = GemBid(
+                    Firm_name=firm_name,
+                    gem_bid_no=gem_bid_no,
+                    Bid_details=bid_details,
+                    description=description,
+                    start_date=start_date,
+                    end_date=end_date,
+                    emd_amount=emd_amount,
+                    quantity=quantity,
+                    city=city,
+                    department=department,
+                    item_category=item_category,
+                    epbg_percentage=epbg_percentage,
+                    epbg_month=epbg_month,
+                    status=status,
+                    status_history=[GemBidStatusUpdate(status=status)]
+                )
+                docs.append(bid.model_dump())
+                labels.append(f"Row {row_idx}")
+            except Exception as e:
+                errors.append(f"Row {row_idx}: {str(e)}")
+        bids_created += await insert_chunk(db.gem_bids, docs, labels, errors)
+        progress.inserted, progress.errored = bids_created, len(errors)
+        await progress.save()
     
     return {"created": bids_created, "errors": errors}
 
+@api_router.post("/gem-bid/bulk-upload")
+async def bulk_upload_gem_bids(file: UploadFile = File(...), wait: bool = False, user: dict = Depends(verify_gem_token)):
+    # wait=true imports inside the request and returns {created, errors}
+    if wait:
+        return await import_gem_bids(file.file, ImportProgress())
+    return await enqueue_import_job("gem_bids", file, system="gem_bid", created_by=user.get("email"))
+
 # GEM BID Statuses List (for dropdown)
 @api_router.get("/gem-bid/statuses")
 async def get_gem_bid_statuses(user: dict = Depends(verify_gem_token)):
     return GEM_BID_STATUSES
 
 # GEM BID Orders Endpoints
-@api_router.get("/gem-bid/orders", response_model=List[GemOrder])
-async def get_gem_orders(user: dict = Depends(verify_gem_token)):
-    orders = await db.gem_orders.find({}, {"_id": 0}).sort("created_date", -1).to_list(1000)
-    
-    # Handle backward compatibility for old single-SKU orders
-    for order in orders:
-        if "items" not in order or not order["items"]:
-            # Synthesize an items list from root fields
-            order["items"] = [{
-                "sku": order.get("sku", "-"),
-                "vendor": order.get("vendor", "-"),
-                "price": order.get("price", 0),
-                "quantity": order.get("quantity", 0),
-                "invoice_value": order.get("invoice_value", 0),
-                "advance_paid": order.get("advance_paid", 0),
-                "remaining_amount": order.get("remaining_amount", 0),
-                "date": order.get("date", ""),
-                "delivery_date": order.get("delivery_date", "")
-            }]
-    return orders
+@api_router.get("/gem-bid/orders", response_model=Union[Page[GemOrder], List[GemOrder]])
+async def get_gem_orders(
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    legacy: bool = False,
+    user: dict = Depends(verify_gem_token)
+):
+    if legacy:
+        orders = await db.gem_orders.find({}, {"_id": 0}).sort("created_date", -1).to_list(None)
+    else:
+        page = await fetch_page(db.gem_orders, {}, cursor, limit)
+        orders = page["items"]
+    
+    # Old single-SKU orders are upgraded on read until format_migrations completes
+    if not is_migrated("gem_orders"):
+        orders = [upgrade_legacy("gem_orders", order) for order in orders]
+    
+    if legacy:
+        return orders
+    return {"items": orders, "next_cursor": page["next_cursor"]}
 
 @api_router.get("/gem-bid/orders/{order_id}", response_model=GemOrder)
-async def get_gem_order(order_id: str, user: dict = Depends(verify_gem_token)):
+async def get_gem_order(order_id: str, request: Request, response: Response, user: dict = Depends(verify_gem_token)):
+    not_modified = await check_not_modified(db.gem_orders, order_id, request)
+    if not_modified:
+        return not_modified
     order = await db.gem_orders.find_one({"id": order_id}, {"_id": 0})
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
-        
-    # Handle backward compatibility
-    if "items" not in order or not order["items"]:
-        order["items"] = [{
-            "sku": order.get("sku", "-"),
-            "vendor": order.get("vendor", "-"),
-            "price": order.get("price", 0),
-            "quantity": order.get("quantity", 0),
-            "invoice_value": order.get("invoice_value", 0),
-            "advance_paid": order.get("advance_paid", 0),
-            "remaining_amount": order.get("remaining_amount", 0),
-            "date": order.get("date", ""),
-            "delivery_date": order.get("delivery_date", "")
-        }]
+    set_etag(response, order)
+    
+    if not is_migrated("gem_orders"):
+        upgrade_legacy("gem_orders", order)
     return order
 
 @api_router.post("/gem-bid/orders", response_model=GemOrder)
@@ -1701,7 +2077,7 @@ async def update_gem_order(order_id: str, order: GemOrderCreate, user: dict = De
         item.remaining_amount = round(item.invoice_value - item.advance_paid, 2)
     
     update_data = order.model_dump()
-    await db.gem_orders.update_one({"id": order_id}, {"$set": update_data})
+    await db.gem_orders.update_one({"id": order_id}, {"$set": update_data, "$inc": {"revision": 1}})
     updated = await db.gem_orders.find_one({"id": order_id}, {"_id": 0})
     return updated
 
@@ -1712,6 +2088,17 @@ async def delete_gem_order(order_id: str, user: dict = Depends(verify_gem_token)
         raise HTTPException(status_code=404, detail="Order not found")
     return {"message": "Order deleted"}
 
+# ============== IMPORT JOBS ==============
+
+@api_router.get("/import-jobs/{job_id}")
+async def get_import_job_status(job_id: str, user: dict = Depends(verify_token)):
+    """Poll a background bulk-upload job (CRM and GEM BID tokens are both accepted)"""
+    job = await get_import_job(job_id)
+    # Jobs are only visible to the system that created them
+    if not job or job.get("system") != user.get("system", "crm"):
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
 # ============== ROOT ==============
 
 @api_router.get("/")
@@ -1726,11 +2113,23 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 @app.on_event("shutdown")
 async def shutdown():
-    shutdown_scheduler()
-    mongo_client.close()
+    if deferred_startup_task:
+        deferred_startup_task.cancel()
+        await asyncio.gather(deferred_startup_task, return_exceptions=True)
+    await shutdown_import_workers()
+    await stop_lead_sync_watcher()
+    await stop_session_sync()
+    await stop_format_migrations()
+    await shutdown_scheduler()
+    shutdown_credentials()
+    if isinstance(db, MemoryDatabase) and db.journal:
+        await db.journal.close()
+    if mongo_client:
+        mongo_client.close()
 
 
@@ -0,0 +1,123 @@
+"""
+JWT Verification Cache for authenticated requests
+Bounded LRU cache of decoded token claims, keyed by a hash of the token and
+kept until the token's `exp`. A page view fires many API calls with the same
+bearer token; after the first one, authentication is a dictionary lookup
+instead of a signature check.
+
+Only tokens that verified successfully are cached (failures are never
+stored, so garbage tokens cannot flush the cache), and entries expire with
+the token, so an expired token still fails with "Token expired".
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import jwt
+
+logger = logging.getLogger(__name__)
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+
+def token_key(token: str) -> bytes:
+    # The raw bearer token is never kept in memory longer than the request
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+
+class TokenCache:
+    """
+    LRU of {token hash: (exp, claims)}
+
+    Dependencies may run on the event loop or in FastAPI's threadpool, so
+    lookups and updates take a lock.
+    """
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, claims = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def set(self, token: str, claims: dict):
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        key = token_key(token)
+        with self.lock:
+            self.entries[key] = (expires_at, claims)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+token_cache = TokenCache()
+
+
+def decode_token(token: str, key: str, algorithms: list) -> dict:
+    """
+    jwt.decode with the result cached until the token expires
+
+    Args:
+        token: Encoded JWT
+        key: Signing secret
+        algorithms: Accepted algorithms
+
+    Returns:
+        dict: A copy of the claims (callers may modify it)
+
+    Raises:
+        jwt.ExpiredSignatureError, jwt.InvalidTokenError: as jwt.decode
+    """
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, key, algorithms=algorithms)
+        token_cache.set(token, claims)
+    return dict(claims)
+
+
+def get_token_cache_stats() -> dict:
+    return token_cache.stats()
@@ -5,6 +5,16 @@ const AuthContext = createContext(null);
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api";
 
+// Milliseconds until the access token's `exp` claim
+const msUntilExpiry = (token) => {
+  try {
+    const payload = JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/")));
+    return payload.exp * 1000 - Date.now();
+  } catch {
+    return 0;
+  }
+};
+
 export const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem("crm_token"));
@@ -23,7 +33,8 @@ export const AuthProvider = ({ children }) => {
             logout();
           }
         } catch {
-          logout();
+          // Expired access token: the refresh token may still be valid
+          if (!(await refreshSession())) logout();
         }
       }
       setLoading(false);
@@ -31,6 +42,22 @@ export const AuthProvider = ({ children }) => {
     verifyToken();
   }, [token]);
 
+  // Follow tokens refreshed by other tabs instead of refreshing again
+  useEffect(() => {
+    const onStorage = (e) => {
+      if (e.key === "crm_token" && e.newValue) setToken(e.newValue);
+    };
+    window.addEventListener("storage", onStorage);
+    return () => window.removeEventListener("storage", onStorage);
+  }, []);
+
+  // Renew the short-lived access token a minute before it expires
+  useEffect(() => {
+    if (!token) return;
+    const refreshTimer = setTimeout(refreshSession, Math.max(msUntilExpiry(token) - 60 * 1000, 0));
+    return () => clearTimeout(refreshTimer);
+  }, [token]);
+
   // Auto logout after 30 minutes of inactivity
   useEffect(() => {
     let inactivityTimer;
@@ -62,15 +89,46 @@ export const AuthProvider = ({ children }) => {
 
   const login = async (email, password) => {
     const response = await axios.post(`${API_URL}/auth/login`, { email, password });
-    const { token: newToken, user: userData } = response.data;
+    const { token: newToken, refresh_token: refreshToken, user: userData } = response.data;
     localStorage.setItem("crm_token", newToken);
+    localStorage.setItem("crm_refresh_token", refreshToken);
     setToken(newToken);
     setUser(userData);
     return response.data;
   };
 
+  // Trade the refresh token for a new pair; each refresh token works once,
+  // so open tabs take turns and reuse a pair another tab already fetched
+  const refreshSession = async () => {
+    const refresh = async () => {
+      const storedToken = localStorage.getItem("crm_token");
+      if (storedToken && storedToken !== token && msUntilExpiry(storedToken) > 60 * 1000) {
+        setToken(storedToken);
+        return true;
+      }
+      const refreshToken = localStorage.getItem("crm_refresh_token");
+      if (!refreshToken) return false;
+      try {
+        const response = await axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken });
+        localStorage.setItem("crm_token", response.data.token);
+        localStorage.setItem("crm_refresh_token", response.data.refresh_token);
+        setToken(response.data.token);
+        setUser(response.data.user);
+        return true;
+      } catch {
+        return false;
+      }
+    };
+    return navigator.locks ? navigator.locks.request("crm_refresh", refresh) : refresh();
+  };
+
   const logout = () => {
+    const refreshToken = localStorage.getItem("crm_refresh_token");
+    if (refreshToken) {
+      axios.post(`${API_URL}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     localStorage.removeItem("crm_token");
+    localStorage.removeItem("crm_refresh_token");
     setToken(null);
     setUser(null);
   };
@@ -5,6 +5,16 @@ const GemBidAuthContext = createContext(null);
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api/gem-bid";
 
+// Milliseconds until the access token's `exp` claim
+const msUntilExpiry = (token) => {
+  try {
+    const payload = JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/")));
+    return payload.exp * 1000 - Date.now();
+  } catch {
+    return 0;
+  }
+};
+
 export const GemBidAuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [token, setToken] = useState(localStorage.getItem("gem_bid_token"));
@@ -13,15 +23,16 @@ export const GemBidAuthProvider = ({ children }) => {
   useEffect(() => {
     if (token) {
       // Verify token is still valid
-      axios.get(`${API_URL}/bids`, {
+      axios.get(`${API_URL}/bids?limit=1`, {
         headers: { Authorization: `Bearer ${token}` }
       })
       .then(() => {
         const userData = JSON.parse(localStorage.getItem("gem_bid_user") || "{}");
         setUser(userData);
       })
-      .catch(() => {
-        logout();
+      .catch(async () => {
+        // Expired access token: the refresh token may still be valid
+        if (!(await refreshSession())) logout();
       })
       .finally(() => setLoading(false));
     } else {
@@ -29,11 +40,28 @@ export const GemBidAuthProvider = ({ children }) => {
     }
   }, [token]);
 
+  // Follow tokens refreshed by other tabs instead of refreshing again
+  useEffect(() => {
+    const onStorage = (e) => {
+      if (e.key === "gem_bid_token" && e.newValue) setToken(e.newValue);
+    };
+    window.addEventListener("storage", onStorage);
+    return () => window.removeEventListener("storage", onStorage);
+  }, []);
+
+  // Renew the short-lived access token a minute before it expires
+  useEffect(() => {
+    if (!token) return;
+    const refreshTimer = setTimeout(refreshSession, Math.max(msUntilExpiry(token) - 60 * 1000, 0));
+    return () => clearTimeout(refreshTimer);
+  }, [token]);
+
   const login = async (email, password) => {
     const response = await axios.post(`${API_URL}/auth/login`, { email, password });
-    const { token: newToken, user: userData } = response.data;
+    const { token: newToken, refresh_token: refreshToken, user: userData } = response.data;
     
     localStorage.setItem("gem_bid_token", newToken);
+    localStorage.setItem("gem_bid_refresh_token", refreshToken);
     localStorage.setItem("gem_bid_user", JSON.stringify(userData));
     setToken(newToken);
     setUser(userData);
@@ -41,8 +69,37 @@ export const GemBidAuthProvider = ({ children }) => {
     return response.data;
   };
 
+  // Trade the refresh token for a new pair; each refresh token works once,
+  // so open tabs take turns and reuse a pair another tab already fetched
+  const refreshSession = async () => {
+    const refresh = async () => {
+      const storedToken = localStorage.getItem("gem_bid_token");
+      if (storedToken && storedToken !== token && msUntilExpiry(storedToken) > 60 * 1000) {
+        setToken(storedToken);
+        return true;
+      }
+      const refreshToken = localStorage.getItem("gem_bid_refresh_token");
+      if (!refreshToken) return false;
+      try {
+        const response = await axios.post(`${API_URL}/auth/refresh`, { refresh_token: refreshToken });
+        localStorage.setItem("gem_bid_token", response.data.token);
+        localStorage.setItem("gem_bid_refresh_token", response.data.refresh_token);
+        setToken(response.data.token);
+        return true;
+      } catch {
+        return false;
+      }
+    };
+    return navigator.locks ? navigator.locks.request("gem_bid_refresh", refresh) : refresh();
+  };
+
   const logout = () => {
+    const refreshToken = localStorage.getItem("gem_bid_refresh_token");
+    if (refreshToken) {
+      axios.post(`${API_URL}/auth/logout`, { refresh_token: refreshToken }).catch(() => {});
+    }
     localStorage.removeItem("gem_bid_token");
+    localStorage.removeItem("gem_bid_refresh_token");
     localStorage.removeItem("gem_bid_user");
     setToken(null);
     setUser(null);
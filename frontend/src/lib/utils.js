@@ -1,6 +1,33 @@
+import axios from "axios";
 import { clsx } from "clsx";
 import { twMerge } from "tailwind-merge"
 
 export function cn(...inputs) {
   return twMerge(clsx(inputs));
 }
+
+// Poll a background bulk-upload job until it finishes and return the job.
+// Gives up after `timeoutMs` and returns the job with status "processing"
+// (it keeps running on the server); throws after `maxErrors` failed polls
+// in a row.
+export async function waitForImportJob(jobId, config, intervalMs = 1000, timeoutMs = 5 * 60 * 1000, maxErrors = 5) {
+  const url = `${process.env.REACT_APP_BACKEND_URL}/api/import-jobs/${jobId}`;
+  const deadline = Date.now() + timeoutMs;
+  let job = { id: jobId };
+  let errors = 0;
+  while (Date.now() < deadline) {
+    try {
+      const { data } = await axios.get(url, config);
+      if (data.status === "completed" || data.status === "failed") {
+        return data;
+      }
+      job = data;
+      errors = 0;
+    } catch (error) {
+      errors += 1;
+      if (errors >= maxErrors) throw error;
+    }
+    await new Promise((resolve) => setTimeout(resolve, intervalMs));
+  }
+  return { ...job, status: "processing" };
+}
@@ -23,6 +23,7 @@ import {
   AlertDialogTitle,
 } from "../components/ui/alert-dialog";
 import { toast } from "sonner";
+import { waitForImportJob } from "../lib/utils";
 import { Plus, Search, Edit2, Trash2, Upload, Download, Users } from "lucide-react";
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api";
@@ -40,7 +41,7 @@ const Customers = () => {
 
   const fetchCustomers = async () => {
     try {
-      const response = await axios.get(`${API_URL}/customers`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/customers?legacy=true`, getAuthHeader());
       setCustomers(response.data);
     } catch (error) {
       toast.error("Failed to load customers");
@@ -79,9 +80,17 @@ const Customers = () => {
           },
         }
       );
-      toast.success(`Created ${response.data.created} customers`);
-      if (response.data.errors?.length > 0) {
-        toast.warning(`${response.data.errors.length} errors occurred`);
+      toast.info("Import started");
+      const job = await waitForImportJob(response.data.job_id, getAuthHeader());
+      if (job.status === "failed") {
+        toast.error(`Import failed: ${job.error}`);
+      } else if (job.status === "processing") {
+        toast.info("Import is still processing; refresh the list later to see the new customers");
+      } else {
+        toast.success(`Created ${job.inserted} customers`);
+        if (job.errored > 0) {
+          toast.warning(`${job.errored} errors occurred`);
+        }
       }
       fetchCustomers();
     } catch (error) {
@@ -50,7 +50,7 @@ const LeadForm = () => {
 
   const fetchCustomers = async () => {
     try {
-      const response = await axios.get(`${API_URL}/customers`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/customers?legacy=true`, getAuthHeader());
       setCustomers(response.data);
     } catch (error) {
       toast.error("Failed to load customers");
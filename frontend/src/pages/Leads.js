@@ -33,6 +33,7 @@ import {
 import { Label } from "../components/ui/label";
 import { Badge } from "../components/ui/badge";
 import { toast } from "sonner";
+import { waitForImportJob } from "../lib/utils";
 import { Plus, Search, Edit2, Trash2, Upload, Download, ClipboardList, ArrowRightCircle, Eye } from "lucide-react";
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api";
@@ -54,7 +55,7 @@ const Leads = () => {
 
   const fetchLeads = async () => {
     try {
-      const response = await axios.get(`${API_URL}/leads`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/leads?legacy=true`, getAuthHeader());
       setLeads(response.data);
     } catch (error) {
       toast.error("Failed to load leads");
@@ -117,9 +118,17 @@ const Leads = () => {
           },
         }
       );
-      toast.success(`Created ${response.data.created} leads`);
-      if (response.data.errors?.length > 0) {
-        toast.warning(`${response.data.errors.length} errors occurred`);
+      toast.info("Import started");
+      const job = await waitForImportJob(response.data.job_id, getAuthHeader());
+      if (job.status === "failed") {
+        toast.error(`Import failed: ${job.error}`);
+      } else if (job.status === "processing") {
+        toast.info("Import is still processing; refresh the list later to see the new leads");
+      } else {
+        toast.success(`Created ${job.inserted} leads`);
+        if (job.errored > 0) {
+          toast.warning(`${job.errored} errors occurred`);
+        }
       }
       fetchLeads();
     } catch (error) {
@@ -42,7 +42,7 @@ const ProformaInvoices = () => {
 
   const fetchInvoices = async () => {
     try {
-      const response = await axios.get(`${API_URL}/proforma-invoices`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/proforma-invoices?legacy=true`, getAuthHeader());
       setInvoices(response.data);
     } catch (error) {
       toast.error("Failed to load proforma invoices");
@@ -45,7 +45,7 @@ const PurchaseOrderForm = () => {
 
   const fetchProformaInvoices = async () => {
     try {
-      const response = await axios.get(`${API_URL}/proforma-invoices`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/proforma-invoices?legacy=true`, getAuthHeader());
       setProformaInvoices(response.data);
     } catch (error) {
       console.error("Failed to load proforma invoices");
@@ -24,6 +24,7 @@ import {
 } from "../components/ui/alert-dialog";
 import { Badge } from "../components/ui/badge";
 import { toast } from "sonner";
+import { waitForImportJob } from "../lib/utils";
 import { Plus, Search, Edit2, Trash2, Upload, Download, ShoppingCart, Eye } from "lucide-react";
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api";
@@ -42,7 +43,7 @@ const PurchaseOrders = () => {
 
   const fetchOrders = async () => {
     try {
-      const response = await axios.get(`${API_URL}/purchase-orders`, getAuthHeader());
+      const response = await axios.get(`${API_URL}/purchase-orders?legacy=true`, getAuthHeader());
       setOrders(response.data);
     } catch (error) {
       toast.error("Failed to load purchase orders");
@@ -81,9 +82,17 @@ const PurchaseOrders = () => {
           },
         }
       );
-      toast.success(`Created ${response.data.created} purchase orders`);
-      if (response.data.errors?.length > 0) {
-        toast.warning(`${response.data.errors.length} errors occurred`);
+      toast.info("Import started");
+      const job = await waitForImportJob(response.data.job_id, getAuthHeader());
+      if (job.status === "failed") {
+        toast.error(`Import failed: ${job.error}`);
+      } else if (job.status === "processing") {
+        toast.info("Import is still processing; refresh the list later to see the new purchase orders");
+      } else {
+        toast.success(`Created ${job.inserted} purchase orders`);
+        if (job.errored > 0) {
+          toast.warning(`${job.errored} errors occurred`);
+        }
       }
       fetchOrders();
     } catch (error) {
@@ -22,6 +22,7 @@ import {
 } from "../../components/ui/select";
 import { Badge } from "../../components/ui/badge";
 import { toast } from "sonner";
+import { waitForImportJob } from "../../lib/utils";
 import { Plus, Upload, Download, Eye, Pencil, Trash2, Search, FileText } from "lucide-react";
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + "/api/gem-bid";
@@ -146,11 +147,17 @@ const NewBids = () => {
         }
       });
 
-      const { created, errors } = response.data;
-      toast.success(`${created} bids uploaded successfully`);
-      if (errors.length > 0) {
-        toast.warning(`${errors.length} rows had errors`);
-        console.error("Upload errors:", errors);
+      const job = await waitForImportJob(response.data.job_id, getAuthHeader());
+      if (job.status === "failed") {
+        toast.error(`Import failed: ${job.error}`);
+      } else if (job.status === "processing") {
+        toast.info("Import is still processing; refresh the list later to see the new bids");
+      } else {
+        toast.success(`${job.inserted} bids uploaded successfully`);
+        if (job.errored > 0) {
+          toast.warning(`${job.errored} rows had errors`);
+          console.error("Upload errors:", job.errors);
+        }
       }
       fetchBids();
     } catch (error) {
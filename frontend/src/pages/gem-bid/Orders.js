@@ -42,7 +42,7 @@ const Orders = () => {
 
     const fetchOrders = async () => {
         try {
-            const response = await axios.get(`${API_URL}/orders`, getAuthHeader());
+            const response = await axios.get(`${API_URL}/orders?legacy=true`, getAuthHeader());
             setOrders(response.data);
         } catch (error) {
             toast.error("Failed to load orders");
@@ -0,0 +1,145 @@
+"""
+Login Sessions - Tests
+Exercises backend/auth_sessions.py: refresh token rotation, reuse detection
+and the in-memory revoked-session set, against the in-memory database
+"""
+import pytest
+import asyncio
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import auth_sessions
+from auth_sessions import (
+    create_session, rotate_refresh_token, revoke_refresh_token, is_revoked, sync_revoked_sessions, utcnow,
+    REFRESH_TOKENS_COLLECTION, REVOKED_SESSIONS_COLLECTION
+)
+from memory_store import MemoryDatabase
+from db_migrations import run_migrations
+
+USER = {"email": "test@bora.tech", "name": "TEST User"}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def new_database():
+    db = MemoryDatabase()
+    await run_migrations(db)
+    return db
+
+
+@pytest.fixture(autouse=True)
+def empty_revocations():
+    auth_sessions.revoked_sessions.clear()
+    yield
+    auth_sessions.revoked_sessions.clear()
+
+
+class TestRefreshTokens:
+    """Refresh tokens are single-use and bound to their system"""
+
+    def test_rotation(self):
+        """Test a refresh token yields a successor in the same session and is then spent"""
+        async def scenario():
+            db = await new_database()
+            sid, first = await create_session(db, USER, "crm")
+            session, second = await rotate_refresh_token(db, first, "crm")
+            third = await rotate_refresh_token(db, second, "crm")
+            stored = await db[REFRESH_TOKENS_COLLECTION].find({}, {"_id": 0}).to_list(None)
+            return sid, session, second, third, stored
+
+        sid, session, second, third, stored = run(scenario())
+        assert session == {"sid": sid, **USER}
+        assert third is not None and third[0]["sid"] == sid
+        assert second != third[1]
+        assert all(doc["token_hash"] != second for doc in stored)
+        assert [doc["used"] for doc in stored] == [True, True, False]
+
+    def test_wrong_system_and_expired_token_rejected(self):
+        """Test a CRM token cannot refresh GEM BID and an expired token is refused"""
+        async def scenario():
+            db = await new_database()
+            _, token = await create_session(db, USER, "crm")
+            wrong_system = await rotate_refresh_token(db, token, "gem_bid")
+            await db[REFRESH_TOKENS_COLLECTION].update_many({}, {"$set": {"expires_at": utcnow() - timedelta(seconds=1)}})
+            expired = await rotate_refresh_token(db, token, "crm")
+            return wrong_system, expired
+
+        assert run(scenario()) == (None, None)
+
+    def test_reuse_revokes_session(self):
+        """Test presenting a long-spent refresh token ends the whole session"""
+        async def scenario():
+            db = await new_database()
+            sid, first = await create_session(db, USER, "crm")
+            _, second = await rotate_refresh_token(db, first, "crm")
+            await db[REFRESH_TOKENS_COLLECTION].update_many(
+                {"used": True}, {"$set": {"used_at": utcnow() - timedelta(minutes=1)}}
+            )
+            replayed = await rotate_refresh_token(db, first, "crm")
+            successor = await rotate_refresh_token(db, second, "crm")
+            return sid, replayed, successor
+
+        sid, replayed, successor = run(scenario())
+        assert replayed is None and successor is None
+        assert is_revoked(sid)
+
+    def test_reuse_within_grace_window_keeps_session(self):
+        """Test a second tab presenting the just-spent token is refused without revoking"""
+        async def scenario():
+            db = await new_database()
+            sid, first = await create_session(db, USER, "crm")
+            _, second = await rotate_refresh_token(db, first, "crm")
+            replayed = await rotate_refresh_token(db, first, "crm")
+            successor = await rotate_refresh_token(db, second, "crm")
+            return sid, replayed, successor
+
+        sid, replayed, successor = run(scenario())
+        assert replayed is None
+        assert successor is not None and successor[0]["sid"] == sid
+        assert not is_revoked(sid)
+
+
+class TestRevocation:
+    """Revoked sessions are checked in memory and shared through the database"""
+
+    def test_logout_revokes_session(self):
+        """Test logout deletes the session's refresh tokens and refuses its access tokens"""
+        async def scenario():
+            db = await new_database()
+            sid, token = await create_session(db, USER, "gem_bid")
+            other_sid, _ = await create_session(db, USER, "gem_bid")
+            logged_out = await revoke_refresh_token(db, token, "gem_bid")
+            unknown = await revoke_refresh_token(db, "TEST-unknown", "gem_bid")
+            remaining = await db[REFRESH_TOKENS_COLLECTION].distinct("sid")
+            return sid, other_sid, logged_out, unknown, remaining
+
+        sid, other_sid, logged_out, unknown, remaining = run(scenario())
+        assert logged_out and not unknown
+        assert is_revoked(sid) and not is_revoked(other_sid)
+        assert remaining == [other_sid]
+
+    def test_sync_loads_other_workers_revocations_and_prunes(self):
+        """Test the sync picks up revocations written elsewhere and forgets expired ones"""
+        async def scenario():
+            db = await new_database()
+            now = utcnow()
+            await db[REVOKED_SESSIONS_COLLECTION].insert_many([
+                {"sid": "TEST-live", "expires_at": now + timedelta(minutes=5)},
+                {"sid": "TEST-old", "expires_at": now - timedelta(minutes=5)},
+            ])
+            auth_sessions.revoked_sessions["TEST-stale"] = now - timedelta(seconds=1)
+            await sync_revoked_sessions(db, prune_expired=True)
+            return await db[REVOKED_SESSIONS_COLLECTION].distinct("sid")
+
+        assert run(scenario()) == ["TEST-live"]
+        assert is_revoked("TEST-live")
+        assert not is_revoked("TEST-old") and not is_revoked("TEST-stale")
+        assert not is_revoked(None)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
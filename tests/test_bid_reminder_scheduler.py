@@ -0,0 +1,219 @@
+"""
+Bid Reminder Scheduler Leadership - Tests
+Exercises backend/bid_reminder_scheduler.py: the leader loop survives a
+failed scheduler start and releases its lease, leader services run only
+while leading, and a reminder round (per bid or as one digest) flags every
+bid it sends, against the in-memory database
+"""
+import pytest
+import asyncio
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import bid_reminder_scheduler
+import email_service
+from bid_reminder_scheduler import LOCK_COLLECTION, LOCK_ID, REMINDER_BATCH_SIZE
+from memory_store import MemoryCollection, MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.stopped = False
+
+    def shutdown(self, wait=True):
+        self.stopped = True
+
+
+class TestSchedulerLeadership:
+    """Scheduler start failures are retried rather than ending leadership"""
+
+    def test_failed_start_is_retried_off_the_event_loop(self, monkeypatch):
+        """Test a start error is logged, retried on the next tick and the lease released at shutdown"""
+        attempts = []
+        started = FakeScheduler()
+
+        def start(event_loop):
+            attempts.append(threading.current_thread() is threading.main_thread())
+            if len(attempts) == 1:
+                raise RuntimeError("TEST job store unavailable")
+            return started
+
+        monkeypatch.setattr(bid_reminder_scheduler, "LEASE_SECONDS", 0.06)
+        monkeypatch.setattr(bid_reminder_scheduler, "_start_persistent_scheduler", start)
+
+        async def scenario():
+            db = MemoryDatabase()
+            bid_reminder_scheduler.db = db
+            task = asyncio.create_task(bid_reminder_scheduler._lead_scheduler())
+            for _ in range(100):
+                if bid_reminder_scheduler.scheduler is started:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            return await db[LOCK_COLLECTION].find_one({"_id": LOCK_ID})
+
+        lock = run(scenario())
+        assert attempts == [False, False]
+        assert started.stopped
+        assert lock is None
+        assert bid_reminder_scheduler.scheduler is None and not bid_reminder_scheduler.is_leader
+
+    def test_leader_services_follow_leadership(self, monkeypatch):
+        """Test a registered service starts with the scheduler and stops when leadership ends"""
+        events = []
+
+        async def stop():
+            events.append("stop")
+
+        monkeypatch.setattr(bid_reminder_scheduler, "LEASE_SECONDS", 0.06)
+        monkeypatch.setattr(bid_reminder_scheduler, "_start_persistent_scheduler", lambda event_loop: FakeScheduler())
+        monkeypatch.setattr(bid_reminder_scheduler, "leader_services", [])
+        bid_reminder_scheduler.add_leader_service(lambda: events.append("start"), stop)
+
+        async def scenario():
+            bid_reminder_scheduler.db = MemoryDatabase()
+            task = asyncio.create_task(bid_reminder_scheduler._lead_scheduler())
+            for _ in range(10):
+                await asyncio.sleep(0.03)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        run(scenario())
+        assert events == ["start", "stop"]
+        assert not bid_reminder_scheduler.services_running
+
+
+def end_date(days_ahead):
+    day = datetime.now(timezone.utc).date() + timedelta(days=days_ahead)
+    return f"{day.isoformat()}T11:00:00"
+
+
+@pytest.fixture
+def bulk_writes(monkeypatch):
+    """Sizes of the bulk_write calls made on gem_bids"""
+    sizes = []
+    bulk_write = MemoryCollection.bulk_write
+
+    async def record(collection, requests, *args, **kwargs):
+        if collection.name == "gem_bids":
+            sizes.append(len(requests))
+        return await bulk_write(collection, requests, *args, **kwargs)
+
+    monkeypatch.setattr(MemoryCollection, "bulk_write", record)
+    return sizes
+
+
+class TestReminderRound:
+    """A daily check reminds every bid ending tomorrow exactly once"""
+
+    def test_every_bid_is_reminded_once(self, monkeypatch, bulk_writes):
+        """Test 1,050 pending bids are all sent and flagged in batches; reminded ones are never re-sent"""
+        sent = []
+
+        async def send_bid_reminders(reminders):
+            sent.extend(reminder["gem_bid_no"] for reminder in reminders)
+            return [True] * len(reminders)
+
+        monkeypatch.setattr(bid_reminder_scheduler, "REMINDER_MODE", "per_bid")
+        monkeypatch.setattr(email_service, "send_bid_reminders", send_bid_reminders)
+
+        async def scenario():
+            db = MemoryDatabase()
+            bid_reminder_scheduler.db = db
+            await db.gem_bids.insert_many(
+                [{"id": f"TEST-P{i}", "gem_bid_no": f"TEST-P{i}", "end_date": end_date(1)} for i in range(1050)]
+                + [{"id": f"TEST-R{i}", "gem_bid_no": f"TEST-R{i}", "end_date": end_date(1), "reminder_sent": True}
+                   for i in range(30)]
+                + [{"id": f"TEST-L{i}", "gem_bid_no": f"TEST-L{i}", "end_date": end_date(2)} for i in range(10)]
+            )
+            await bid_reminder_scheduler.check_and_send_reminders()
+            first_round = list(sent)
+            await bid_reminder_scheduler.check_and_send_reminders()
+            flagged = await db.gem_bids.count_documents({"id": {"$regex": "^TEST-P"}, "reminder_sent": True})
+            later = await db.gem_bids.count_documents({"id": {"$regex": "^TEST-L"}, "reminder_sent": True})
+            return first_round, flagged, later
+
+        first_round, flagged, later = run(scenario())
+        assert sorted(first_round) == sorted(f"TEST-P{i}" for i in range(1050))
+        assert sent == first_round
+        assert flagged == 1050 and later == 0
+        assert len(bulk_writes) == -(-1050 // REMINDER_BATCH_SIZE)
+        assert max(bulk_writes) <= REMINDER_BATCH_SIZE
+
+    def test_failed_sends_are_not_flagged(self, monkeypatch, bulk_writes):
+        """Test only delivered reminders are flagged, so the rest are retried next round"""
+        async def send_bid_reminders(reminders):
+            return [not reminder["gem_bid_no"].endswith("7") for reminder in reminders]
+
+        monkeypatch.setattr(bid_reminder_scheduler, "REMINDER_MODE", "per_bid")
+        monkeypatch.setattr(email_service, "send_bid_reminders", send_bid_reminders)
+
+        async def scenario():
+            db = MemoryDatabase()
+            bid_reminder_scheduler.db = db
+            await db.gem_bids.insert_many([{"id": f"TEST-B{i}", "gem_bid_no": f"TEST-B{i}", "end_date": end_date(1)} for i in range(20)])
+            await bid_reminder_scheduler.check_and_send_reminders()
+            pending = await db.gem_bids.find({"reminder_sent": {"$ne": True}}, {"_id": 0, "id": 1}).to_list(None)
+            return sorted(bid["id"] for bid in pending)
+
+        assert run(scenario()) == ["TEST-B17", "TEST-B7"]
+
+
+class FakeDispatcher:
+    def __init__(self, accept):
+        self.accept = accept
+        self.messages = []
+
+    async def send(self, message):
+        self.messages.append(message)
+        return self.accept
+
+
+class TestReminderDigest:
+    """Digest mode sends one email and flags the bids only once it is delivered"""
+
+    def run_digest_round(self, monkeypatch, accept):
+        dispatcher = FakeDispatcher(accept)
+        monkeypatch.setattr(bid_reminder_scheduler, "REMINDER_MODE", "digest")
+        monkeypatch.setattr(email_service, "is_smtp_configured", lambda: True)
+        monkeypatch.setattr(email_service, "get_mail_dispatcher", lambda: dispatcher)
+
+        async def scenario():
+            db = MemoryDatabase()
+            bid_reminder_scheduler.db = db
+            await db.gem_bids.insert_many(
+                [{"id": f"TEST-D{i}", "gem_bid_no": f"TEST-D{i}", "end_date": end_date(1),
+                  "department": f"TEST Dept {i % 3}", "city": "Pune"} for i in range(250)]
+                + [{"id": "TEST-R", "gem_bid_no": "TEST-R", "end_date": end_date(1), "reminder_sent": True}]
+            )
+            await bid_reminder_scheduler.check_and_send_reminders()
+            return await db.gem_bids.count_documents({"id": {"$regex": "^TEST-D"}, "reminder_sent": True})
+
+        return dispatcher.messages, run(scenario())
+
+    def test_delivered_digest_flags_every_bid(self, monkeypatch, bulk_writes):
+        """Test one message covers all pending bids and every one is flagged"""
+        messages, flagged = self.run_digest_round(monkeypatch, accept=True)
+        assert len(messages) == 1
+        assert messages[0]["Subject"].startswith("250 GEM bid(s)")
+        assert flagged == 250
+        assert len(bulk_writes) == -(-250 // REMINDER_BATCH_SIZE)
+
+    def test_failed_digest_flags_nothing(self, monkeypatch, bulk_writes):
+        """Test a digest the server refuses leaves every bid to be reminded next round"""
+        messages, flagged = self.run_digest_round(monkeypatch, accept=False)
+        assert len(messages) == 1
+        assert flagged == 0
+        assert bulk_writes == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,139 @@
+"""
+Credential Store - Tests
+Exercises backend/credentials.py: bcrypt hashing and verification off the
+event loop, cost-factor upgrades and the failed-login rate limiter
+"""
+import pytest
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import credentials
+from passlib.context import CryptContext
+from credentials import (
+    LoginRateLimiter, hash_password, verify_password, matches_plaintext, shutdown_credentials,
+    reserve_login_attempt, record_login_success
+)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def fast_hashing(monkeypatch):
+    # The minimum cost keeps the suite fast; behaviour does not depend on it
+    monkeypatch.setattr(credentials, "pwd_context", CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4, bcrypt__min_rounds=4
+    ))
+    monkeypatch.setattr(credentials, "_dummy_hash", None)
+    yield
+    shutdown_credentials()
+
+
+class TestPasswordHashing:
+    """Passwords are stored as bcrypt hashes and checked off the event loop"""
+
+    def test_hash_and_verify(self):
+        """Test a hash verifies its own password only"""
+        async def scenario():
+            stored = await hash_password("TEST-secret")
+            return stored, await verify_password("TEST-secret", stored), await verify_password("wrong", stored)
+
+        stored, good, bad = run(scenario())
+        assert stored.startswith("$2b$04$")
+        assert "TEST-secret" not in stored
+        assert good == (True, None)
+        assert bad == (False, None)
+
+    def test_unknown_user_and_malformed_hash(self):
+        """Test a missing or unrecognised hash never verifies"""
+        async def scenario():
+            return await verify_password("TEST-secret", None), await verify_password("TEST-secret", "TEST-secret")
+
+        assert run(scenario()) == ((False, None), (False, None))
+
+    def test_lower_cost_hash_is_upgraded(self, monkeypatch):
+        """Test verification returns a replacement hash after the cost factor is raised"""
+        async def scenario():
+            stored = await hash_password("TEST-secret")
+            monkeypatch.setattr(credentials, "pwd_context", CryptContext(
+                schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5, bcrypt__min_rounds=5
+            ))
+            return await verify_password("TEST-secret", stored)
+
+        matches, new_hash = run(scenario())
+        assert matches
+        assert new_hash.startswith("$2b$05$")
+
+    def test_matches_plaintext(self):
+        """Test the environment-credential comparison"""
+        assert matches_plaintext("TEST-secret", "TEST-secret")
+        assert not matches_plaintext("TEST-secre", "TEST-secret")
+
+
+class TestLoginRateLimiter:
+    """Failed logins are limited per key within a sliding window"""
+
+    def test_limit_reached_after_failures(self):
+        """Test a key is refused once it reaches the failure limit"""
+        limiter = LoginRateLimiter(3, window=60)
+        for _ in range(2):
+            limiter.record_failure("TEST-key")
+        assert limiter.retry_after("TEST-key") == 0
+        limiter.record_failure("TEST-key")
+        assert 0 < limiter.retry_after("TEST-key") <= 60
+        assert limiter.retry_after("other") == 0
+        assert limiter.stats()["rejected"] == 1
+
+    def test_reset_and_window_expiry(self):
+        """Test a success clears failures and old failures fall out of the window"""
+        limiter = LoginRateLimiter(1, window=0.05)
+        limiter.record_failure("TEST-key")
+        limiter.reset("TEST-key")
+        assert limiter.retry_after("TEST-key") == 0
+
+        limiter.record_failure("TEST-key")
+        assert limiter.retry_after("TEST-key") > 0
+        time.sleep(0.06)
+        assert limiter.retry_after("TEST-key") == 0
+        assert limiter.stats()["tracked_keys"] == 0
+
+    def test_tracked_keys_are_bounded(self):
+        """Test the least recently failed keys are dropped beyond max_keys"""
+        limiter = LoginRateLimiter(1, window=60, max_keys=2)
+        for key in ("a", "b", "c"):
+            limiter.record_failure(key)
+        assert limiter.retry_after("a") == 0
+        assert limiter.retry_after("c") > 0
+
+    def test_reserve_counts_before_the_check(self):
+        """Test attempts are counted up front, refused at the limit and refunded on success"""
+        limiter = LoginRateLimiter(2, window=60)
+        assert limiter.reserve("TEST-key") == 0
+        assert limiter.reserve("TEST-key") == 0
+        assert limiter.reserve("TEST-key") > 0
+        limiter.refund("TEST-key")
+        assert limiter.reserve("TEST-key") == 0
+        limiter.refund("TEST-key")
+        limiter.refund("TEST-key")
+        assert limiter.stats()["tracked_keys"] == 0
+
+    def test_concurrent_logins_stop_at_the_limit(self, monkeypatch):
+        """Test in-flight attempts count toward the limit and a success frees its IP slot"""
+        monkeypatch.setattr(credentials, "account_limiter", LoginRateLimiter(3, window=60))
+        monkeypatch.setattr(credentials, "ip_limiter", LoginRateLimiter(4, window=60))
+        # Five attempts start before any password check finishes
+        allowed = [reserve_login_attempt("TEST-ip", "Test@Example.com", "crm") == 0 for _ in range(5)]
+        assert allowed == [True, True, True, False, False]
+
+        record_login_success("TEST-ip", "test@example.com", "crm")
+        assert reserve_login_attempt("TEST-ip", "other@example.com", "crm") == 0
+        assert reserve_login_attempt("TEST-ip", "other@example.com", "crm") == 0
+        assert reserve_login_attempt("TEST-ip", "third@example.com", "crm") > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
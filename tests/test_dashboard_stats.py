@@ -0,0 +1,53 @@
+"""
+Dashboard Stats - Tests
+Exercises backend/dashboard_stats.py: counter deltas only apply once the
+stats document has been reconciled, against the in-memory database
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from dashboard_stats import bump_stats, ensure_dashboard_stats, get_dashboard_stats, STATS_COLLECTION, STATS_ID
+from memory_store import MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestDashboardStats:
+    """The KPI document is rebuilt before deltas are trusted"""
+
+    def test_delta_before_reconcile_is_not_stored(self):
+        """Test a write on an existing database does not create a partial stats document"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([{"id": f"TEST-C{i}"} for i in range(3)])
+            await bump_stats(db, total_customers=1)
+            partial = await db[STATS_COLLECTION].find_one({"_id": STATS_ID})
+            rebuilt = await ensure_dashboard_stats(db)
+            again = await ensure_dashboard_stats(db)
+            await db.customers.insert_one({"id": "TEST-C3"})
+            await bump_stats(db, total_customers=1)
+            return partial, rebuilt, again, await get_dashboard_stats(db)
+
+        partial, rebuilt, again, stats = run(scenario())
+        assert partial is None
+        assert rebuilt and not again
+        assert stats["total_customers"] == 4
+
+    def test_unreconciled_document_is_rebuilt_on_read(self):
+        """Test a stats document left by the old upserting bump_stats is rebuilt"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([{"id": f"TEST-C{i}"} for i in range(3)])
+            await db[STATS_COLLECTION].insert_one({"_id": STATS_ID, "total_customers": 1})
+            return await get_dashboard_stats(db)
+
+        assert run(scenario())["total_customers"] == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,55 @@
+"""
+Index Migrations - Tests
+Exercises backend/db_migrations.py: duplicates blocking a unique index are
+reported and only hold back their own version, against the in-memory
+database
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from db_migrations import MIGRATIONS, MIGRATIONS_COLLECTION, MigrationError, find_duplicates, get_applied_versions, run_migrations
+from memory_store import MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestIndexMigrations:
+    """A version that cannot be applied fails loudly without blocking the rest"""
+
+    def test_duplicates_fail_only_their_version(self):
+        """Test duplicate customer ids fail v1, are reported by _id, and later versions still apply"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([{"id": "TEST-C1"}, {"id": "TEST-C1"}, {"id": "TEST-C2"}])
+            duplicates = await find_duplicates(db, MIGRATIONS[0])
+            with pytest.raises(MigrationError) as raised:
+                await run_migrations(db)
+            return duplicates, raised.value, await get_applied_versions(db)
+
+        duplicates, error, applied = run(scenario())
+        assert [(d["collection"], d["index"], d["key"], d["count"], len(d["ids"])) for d in duplicates] == [
+            ("customers", "id_unique", {"id": "TEST-C1"}, 2, 2)
+        ]
+        assert list(error.failed) == [1]
+        assert applied == {m["version"] for m in MIGRATIONS} - {1}
+
+    def test_clean_database_applies_everything(self):
+        """Test every version is applied and recorded when nothing clashes"""
+        async def scenario():
+            db = MemoryDatabase()
+            applied = await run_migrations(db)
+            return applied, await db[MIGRATIONS_COLLECTION].count_documents({}), await run_migrations(db)
+
+        applied, recorded, again = run(scenario())
+        assert applied == sorted(m["version"] for m in MIGRATIONS)
+        assert recorded == len(MIGRATIONS)
+        assert again == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,98 @@
+"""
+Email Service - Tests
+Exercises backend/email_service.py: the reminder digest groups bids by
+department and city, and reminder templates HTML-escape bid fields in the
+HTML part only
+"""
+import pytest
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from email_service import EmailTemplate, Markup, build_bid_digest_message, build_bid_reminder_message, group_bids_for_digest
+
+UNSAFE_DETAILS = "Pumps & valves <script>alert('x')</script>"
+
+
+def bid(gem_bid_no, department=None, city=None, bid_details="TEST details"):
+    return {"gem_bid_no": gem_bid_no, "bid_details": bid_details, "department": department, "city": city}
+
+
+def bodies(message):
+    """(text, html) bodies of a multipart/alternative message"""
+    text, html = message.get_payload()
+    return text.get_payload(decode=True).decode(), html.get_payload(decode=True).decode()
+
+
+class TestBidDigest:
+    """One digest email lists every bid, grouped by department then city"""
+
+    def test_groups_are_sorted_case_insensitively(self):
+        """Test groups sort by department then city, ignoring case, keeping bid order within a group"""
+        groups = group_bids_for_digest([
+            bid("TEST-1", "zeta", "Pune"),
+            bid("TEST-2", "Alpha", "pune"),
+            bid("TEST-3", "alpha", "Delhi"),
+            bid("TEST-4", "zeta", "Pune"),
+        ])
+        assert [(key, [b["gem_bid_no"] for b in group]) for key, group in groups] == [
+            (("alpha", "Delhi"), ["TEST-3"]),
+            (("Alpha", "pune"), ["TEST-2"]),
+            (("zeta", "Pune"), ["TEST-1", "TEST-4"]),
+        ]
+
+    def test_missing_department_or_city_is_grouped_as_unspecified(self):
+        """Test bids without a department or city land in an 'Unspecified' group"""
+        groups = dict(group_bids_for_digest([
+            bid("TEST-1"),
+            bid("TEST-2", department="", city="Agra"),
+            bid("TEST-3", department="Rail"),
+        ]))
+        assert [b["gem_bid_no"] for b in groups[("Unspecified department", "Unspecified city")]] == ["TEST-1"]
+        assert [b["gem_bid_no"] for b in groups[("Unspecified department", "Agra")]] == ["TEST-2"]
+        assert [b["gem_bid_no"] for b in groups[("Rail", "Unspecified city")]] == ["TEST-3"]
+        assert list(groups) == sorted(groups, key=lambda key: (key[0].lower(), key[1].lower()))
+
+    def test_message_lists_every_bid_under_its_group(self):
+        """Test the digest subject counts all bids and both parts list them group by group"""
+        message = build_bid_digest_message([
+            bid("TEST-1", "Rail", "Pune"),
+            bid("TEST-2", "Defence", "Agra"),
+            bid("TEST-3", "Rail", "Pune"),
+        ], "18 Oct 2026")
+        text, html = bodies(message)
+        assert message["Subject"] == "3 GEM bid(s) end on 18 Oct 2026"
+        assert "Defence / Agra (1)" in text and "Rail / Pune (2)" in text
+        assert text.index("Defence / Agra") < text.index("TEST-2") < text.index("Rail / Pune") < text.index("TEST-1") < text.index("TEST-3")
+        for gem_bid_no in ("TEST-1", "TEST-2", "TEST-3"):
+            assert gem_bid_no in html
+
+
+class TestTemplateEscaping:
+    """Bid fields are escaped in HTML and left as typed in plain text"""
+
+    def test_reminder_escapes_details_in_html_only(self):
+        """Test <script> and & in bid_details are escaped in the HTML part and unchanged in the text part"""
+        text, html = bodies(build_bid_reminder_message("TEST-1", UNSAFE_DETAILS, "18 Oct 2026"))
+        assert "Pumps &amp; valves &lt;script&gt;alert(&#x27;x&#x27;)&lt;/script&gt;" in html
+        assert "<script>" not in html
+        assert UNSAFE_DETAILS in text
+
+    def test_digest_escapes_details_in_html_only(self):
+        """Test the digest rows escape bid_details and group headers in HTML but not in text"""
+        text, html = bodies(build_bid_digest_message([bid("TEST-1", "R&D", "Pune", UNSAFE_DETAILS)], "18 Oct 2026"))
+        assert "&lt;script&gt;" in html and "<script>" not in html
+        assert "R&amp;D" in html
+        assert UNSAFE_DETAILS in text and "R&D / Pune" in text
+
+    def test_markup_is_not_escaped(self):
+        """Test Markup values render verbatim while plain strings are escaped"""
+        template = EmailTemplate("<p>{safe}|{unsafe}</p>", autoescape=True)
+        rendered = template.render(safe=Markup("<b>A&B</b>"), unsafe="<b>A&B</b>")
+        assert rendered == "<p><b>A&B</b>|&lt;b&gt;A&amp;B&lt;/b&gt;</p>"
+        assert isinstance(rendered, Markup)
+        assert EmailTemplate("{value}", autoescape=False).render(value="<b>") == "<b>"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -6,6 +6,7 @@ import pytest
 import requests
 import os
 import io
+import time
 from openpyxl import Workbook
 
 BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
@@ -73,6 +74,30 @@ class TestGemBidAuthentication:
             "password": CRM_PASSWORD
         })
         assert response.status_code == 401, "CRM credentials should not work for GEM BID"
+    
+    def test_gem_bid_refresh_and_logout(self):
+        """Test the refresh token rotates, and logout revokes the session's access token"""
+        login = requests.post(f"{BASE_URL}/api/gem-bid/auth/login", json={
+            "email": GEM_BID_EMAIL,
+            "password": GEM_BID_PASSWORD
+        }).json()
+        assert login["refresh_token"] and login["expires_in"] > 0
+        
+        response = requests.post(f"{BASE_URL}/api/gem-bid/auth/refresh", json={"refresh_token": login["refresh_token"]})
+        assert response.status_code == 200, f"Refresh failed: {response.text}"
+        refreshed = response.json()
+        assert refreshed["user"]["email"] == GEM_BID_EMAIL
+        assert refreshed["refresh_token"] != login["refresh_token"]
+        
+        # CRM refresh endpoint does not accept GEM BID refresh tokens
+        response = requests.post(f"{BASE_URL}/api/auth/refresh", json={"refresh_token": refreshed["refresh_token"]})
+        assert response.status_code == 401
+        
+        headers = {"Authorization": f"Bearer {refreshed['token']}"}
+        assert requests.get(f"{BASE_URL}/api/gem-bid/bids?limit=1", headers=headers).status_code == 200
+        response = requests.post(f"{BASE_URL}/api/gem-bid/auth/logout", json={"refresh_token": refreshed["refresh_token"]})
+        assert response.status_code == 200
+        assert requests.get(f"{BASE_URL}/api/gem-bid/bids?limit=1", headers=headers).status_code == 401
 
 
 class TestGemBidTokenIsolation:
@@ -608,7 +633,7 @@ class TestGemBidExcelOperations:
         }
         
         response = requests.post(
-            f"{BASE_URL}/api/gem-bid/bulk-upload",
+            f"{BASE_URL}/api/gem-bid/bulk-upload?wait=true",
             files=files,
             headers=auth_header
         )
@@ -618,10 +643,53 @@ class TestGemBidExcelOperations:
         assert data["created"] >= 1, "At least one bid should be created"
         
         # Cleanup - find and delete the test bid
-        bids_response = requests.get(f"{BASE_URL}/api/gem-bid/bids", headers=auth_header)
+        bids_response = requests.get(f"{BASE_URL}/api/gem-bid/bids?legacy=true", headers=auth_header)
         for bid in bids_response.json():
             if bid["gem_bid_no"] == "TEST_BULK/2024/B/001":
                 requests.delete(f"{BASE_URL}/api/gem-bid/bids/{bid['id']}", headers=auth_header)
+    
+    def test_bulk_upload_background_job(self, auth_header):
+        """Test bulk upload queues an import job that can be polled to completion"""
+        wb = Workbook()
+        ws = wb.active
+        ws.append([
+            "Firm Name", "Gem Bid No*", "Bid Details", "Description", "Start Date* (YYYY-MM-DD)", "End Date* (YYYY-MM-DD)",
+            "EMD Amount*", "Quantity*", "City", "Department", "Item Category",
+            "EPBG Percentage", "EPBG Month", "Status*"
+        ])
+        ws.append([
+            "TEST Firm", "TEST_JOB/2024/B/001", "Details", "Background import test", "2024-01-15", "2024-02-15",
+            50000, 100, "Delhi", "Ministry of Finance", "Electronics", 5, 12, "Shortlisted"
+        ])
+        output = io.BytesIO()
+        wb.save(output)
+        
+        response = requests.post(
+            f"{BASE_URL}/api/gem-bid/bulk-upload",
+            files={"file": ("test_job.xlsx", output.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")},
+            headers=auth_header
+        )
+        assert response.status_code == 200, f"Expected 200, got {response.status_code}: {response.text}"
+        data = response.json()
+        assert data["status"] == "queued"
+        job_id = data["job_id"]
+        
+        job = None
+        for _ in range(30):
+            job = requests.get(f"{BASE_URL}/api/import-jobs/{job_id}", headers=auth_header).json()
+            if job["status"] in ("completed", "failed"):
+                break
+            time.sleep(1)
+        assert job["status"] == "completed", f"Import job did not complete: {job}"
+        assert job["rows_parsed"] == 1
+        assert job["inserted"] == 1
+        assert job["errored"] == 0
+        
+        # Cleanup
+        bids_response = requests.get(f"{BASE_URL}/api/gem-bid/bids?legacy=true", headers=auth_header)
+        for bid in bids_response.json():
+            if bid["gem_bid_no"] == "TEST_JOB/2024/B/001":
+                requests.delete(f"{BASE_URL}/api/gem-bid/bids/{bid['id']}", headers=auth_header)
 
 
 class TestDataIsolation:
@@ -678,7 +746,7 @@ class TestDataIsolation:
         bid_id = create_response.json()["id"]
         
         # Check that it doesn't appear in CRM leads
-        leads_response = requests.get(f"{BASE_URL}/api/leads", headers=crm_header)
+        leads_response = requests.get(f"{BASE_URL}/api/leads?legacy=true", headers=crm_header)
         leads = leads_response.json()
         lead_ids = [l.get("id") for l in leads]
         assert bid_id not in lead_ids, "GEM BID should not appear in CRM leads"
@@ -0,0 +1,97 @@
+"""
+Import Job Queue - Tests
+Exercises backend/import_jobs.py: jobs interrupted by shutdown or by a dead
+process are queued again with their uploaded file, against the in-memory
+database
+"""
+import pytest
+import asyncio
+import io
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import import_jobs
+from import_jobs import init_import_workers, shutdown_import_workers, enqueue_import_job, get_import_job
+from memory_store import MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(import_jobs, "IMPORT_UPLOAD_DIR", tmp_path)
+    return tmp_path
+
+
+async def import_forever(source, progress):
+    await asyncio.Event().wait()
+
+
+async def import_nothing(source, progress):
+    return {"created": 0, "errors": []}
+
+
+async def wait_for_status(job_id, status):
+    for _ in range(100):
+        job = await get_import_job(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.01)
+    return job
+
+
+class TestImportJobRecovery:
+    """Unfinished jobs are never left `running`"""
+
+    def test_shutdown_requeues_running_job(self, upload_dir):
+        """Test a job cancelled by shutdown returns to queued and runs at the next start"""
+        async def scenario():
+            db = MemoryDatabase()
+            init_import_workers(db, {"customers": import_forever}, worker_count=1)
+            upload = SimpleNamespace(filename="TEST.xlsx", file=io.BytesIO(b"rows"))
+            job_id = (await enqueue_import_job("customers", upload, "crm"))["job_id"]
+            await wait_for_status(job_id, "running")
+            await shutdown_import_workers()
+            interrupted = await get_import_job(job_id)
+            kept = list(upload_dir.iterdir())
+
+            init_import_workers(db, {"customers": import_nothing}, worker_count=1)
+            finished = await wait_for_status(job_id, "completed")
+            await shutdown_import_workers()
+            return interrupted, kept, finished
+
+        interrupted, kept, finished = run(scenario())
+        assert interrupted["status"] == "queued" and interrupted["started_at"] is None
+        assert len(kept) == 1
+        assert finished["status"] == "completed"
+        assert list(upload_dir.iterdir()) == []
+
+    def test_stale_running_job_is_requeued(self, upload_dir):
+        """Test a job left running by a dead process is picked up once it times out"""
+        async def scenario():
+            db = MemoryDatabase()
+            source = upload_dir / "TEST-stale.xlsx"
+            source.write_bytes(b"rows")
+            await db.import_jobs.insert_many([
+                {"id": "TEST-stale", "kind": "customers", "status": "running", "file_path": str(source),
+                 "started_at": "2020-01-01T00:00:00+00:00"},
+                {"id": "TEST-live", "kind": "customers", "status": "running", "file_path": str(source),
+                 "started_at": "2999-01-01T00:00:00+00:00"},
+            ])
+            init_import_workers(db, {"customers": import_nothing}, worker_count=1)
+            stale = await wait_for_status("TEST-stale", "completed")
+            live = await get_import_job("TEST-live")
+            await shutdown_import_workers()
+            return stale, live
+
+        stale, live = run(scenario())
+        assert stale["status"] == "completed"
+        assert live["status"] == "running"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
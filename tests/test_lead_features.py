@@ -551,7 +551,7 @@ class TestBulkUpload:
             with open(temp_file_path, "rb") as f:
                 files = {"file": ("leads.xlsx", f, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")}
                 upload_response = requests.post(
-                    f"{BASE_URL}/api/leads/bulk-upload",
+                    f"{BASE_URL}/api/leads/bulk-upload?wait=true",
                     files=files,
                     headers=auth_headers
                 )
@@ -562,7 +562,7 @@ class TestBulkUpload:
             print(f"✓ Bulk upload created {result['created']} lead(s)")
             
             # Verify the lead has part numbers
-            leads_response = requests.get(f"{BASE_URL}/api/leads", headers=auth_headers)
+            leads_response = requests.get(f"{BASE_URL}/api/leads?legacy=true", headers=auth_headers)
             leads = leads_response.json()
             
             # Find the lead we just created
@@ -0,0 +1,74 @@
+"""
+Lead -> Proforma Invoice Sync - Tests
+Exercises backend/lead_sync.py: synced fields follow the lead, except the
+products and total of an invoice edited by hand, against the in-memory
+database
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from lead_sync import check_proforma_consistency, sync_proforma_from_lead
+from memory_store import MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+LEAD_PRODUCTS = [{"product": "TEST-Widget", "quantity": 2, "price": 50, "amount": 100}]
+EDITED_PRODUCTS = [{"product": "TEST-Edited", "quantity": 1, "price": 80, "amount": 80}]
+
+
+async def seed(db):
+    await db.leads.insert_one({
+        "id": "TEST-L1", "customer_name": "TEST Customer", "is_converted": True,
+        "products": LEAD_PRODUCTS, "total_amount": 100, "tender_document": None, "working_sheet": None,
+    })
+    await db.proforma_invoices.insert_many([
+        {"id": "TEST-PI1", "lead_id": "TEST-L1", "customer_name": "TEST Old name",
+         "products": [], "total_amount": 0, "tender_document": None, "working_sheet": None},
+        {"id": "TEST-PI2", "lead_id": "TEST-L1", "customer_name": "TEST Old name",
+         "products": EDITED_PRODUCTS, "total_amount": 80, "tender_document": None, "working_sheet": None,
+         "hand_edited": True},
+    ])
+
+
+class TestProformaConsistency:
+    """Hand-edited products are not drift"""
+
+    def test_hand_edited_products_are_not_reported(self):
+        """Test the check only flags the lead-owned fields of a hand-edited invoice"""
+        async def scenario():
+            db = MemoryDatabase()
+            await seed(db)
+            return await check_proforma_consistency(db)
+
+        result = run(scenario())
+        drifted = {row["id"]: set(row["fields"]) for row in result["drifted"]}
+        assert drifted == {
+            "TEST-PI1": {"products", "total_amount", "customer_name"},
+            "TEST-PI2": {"customer_name"},
+        }
+
+    def test_sync_keeps_hand_edited_products(self):
+        """Test a sync copies the lead's products only onto invoices not edited by hand"""
+        async def scenario():
+            db = MemoryDatabase()
+            await seed(db)
+            await sync_proforma_from_lead(db, "TEST-L1")
+            invoices = await db.proforma_invoices.find({}, {"_id": 0}).to_list(None)
+            return {invoice["id"]: invoice for invoice in invoices}, await check_proforma_consistency(db)
+
+        invoices, result = run(scenario())
+        assert invoices["TEST-PI1"]["products"] == LEAD_PRODUCTS
+        assert invoices["TEST-PI2"]["products"] == EDITED_PRODUCTS
+        assert invoices["TEST-PI2"]["total_amount"] == 80
+        assert invoices["TEST-PI2"]["customer_name"] == "TEST Customer"
+        assert result["drifted"] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
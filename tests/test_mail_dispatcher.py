@@ -0,0 +1,139 @@
+"""
+Mail Dispatcher - SMTP Tests
+Sends bid reminders through backend/mail_dispatcher.py to a local aiosmtpd
+server standing in for the real SMTP provider
+"""
+import pytest
+import asyncio
+import socket
+import sys
+from email.message import EmailMessage
+from pathlib import Path
+
+pytest.importorskip("aiosmtpd")
+import aiosmtplib
+from aiosmtpd.controller import Controller
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from mail_dispatcher import MailDispatcher
+
+
+class RecordingHandler:
+    """Accepts every message, optionally answering the first ones with 451"""
+
+    def __init__(self, transient_failures=0):
+        self.transient_failures = transient_failures
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.transient_failures:
+            self.transient_failures -= 1
+            return "451 Try again later"
+        self.messages.append(envelope)
+        return "250 OK"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def make_message(i):
+    message = EmailMessage()
+    message["From"] = "crm@test.com"
+    message["To"] = "sales@test.com"
+    message["Subject"] = f"TEST reminder {i}"
+    message.set_content(f"Bid TEST-{i} ends tomorrow")
+    return message
+
+
+class TestMailDispatcher:
+    """Pooled SMTP dispatch against a local aiosmtpd server"""
+
+    @pytest.fixture
+    def smtp_server(self):
+        handler = RecordingHandler()
+        controller = Controller(handler, hostname="127.0.0.1", port=free_port())
+        controller.start()
+        yield controller
+        controller.stop()
+
+    def dispatcher(self, controller, **kwargs):
+        return MailDispatcher(
+            hostname=controller.hostname,
+            port=controller.port,
+            start_tls=False,
+            retry_backoff=0.01,
+            **kwargs
+        )
+
+    def test_send_many_reuses_pooled_connections(self, smtp_server):
+        """Test 20 messages go out over at most pool_size connections"""
+        dispatcher = self.dispatcher(smtp_server, pool_size=3)
+
+        async def run():
+            try:
+                return await dispatcher.send_many([make_message(i) for i in range(20)])
+            finally:
+                await dispatcher.close()
+
+        results = asyncio.run(run())
+        assert results == [True] * 20
+        assert len(smtp_server.handler.messages) == 20
+        assert dispatcher.connections_opened <= 3
+
+    def test_transient_failure_is_retried(self, smtp_server):
+        """Test a 451 reply is retried and the message still delivered"""
+        smtp_server.handler.transient_failures = 2
+        dispatcher = self.dispatcher(smtp_server, pool_size=1, max_retries=3)
+
+        async def run():
+            try:
+                return await dispatcher.send(make_message(0))
+            finally:
+                await dispatcher.close()
+
+        assert asyncio.run(run()) is True
+        assert len(smtp_server.handler.messages) == 1
+
+    def test_gives_up_after_max_retries(self, smtp_server):
+        """Test a persistently failing send reports failure"""
+        smtp_server.handler.transient_failures = 10
+        dispatcher = self.dispatcher(smtp_server, pool_size=1, max_retries=2)
+
+        async def run():
+            try:
+                return await dispatcher.send(make_message(0))
+            finally:
+                await dispatcher.close()
+
+        assert asyncio.run(run()) is False
+        assert smtp_server.handler.messages == []
+
+    def test_failed_login_closes_the_connection(self, smtp_server, monkeypatch):
+        """Test a connection whose login is refused is closed rather than leaked"""
+        closed = []
+        close = aiosmtplib.SMTP.close
+
+        def record_close(smtp):
+            closed.append(smtp)
+            close(smtp)
+
+        monkeypatch.setattr(aiosmtplib.SMTP, "close", record_close)
+        # The test server offers no AUTH, so every login fails
+        dispatcher = self.dispatcher(smtp_server, pool_size=1, max_retries=2, username="TEST", password="TEST")
+
+        async def run():
+            try:
+                return await dispatcher.send(make_message(0))
+            finally:
+                await dispatcher.close()
+
+        assert asyncio.run(run()) is False
+        assert len(closed) == 1 and not closed[0].is_connected
+        assert dispatcher.connections_opened == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,125 @@
+"""
+Demo Data Persistence - Tests
+Exercises backend/memory_persistence.py: the operation log, snapshots,
+compaction and recovery of the in-memory demo database
+"""
+import pytest
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from memory_store import MemoryDatabase
+from memory_persistence import open_journal, segment_name, SNAPSHOT_FILE
+from db_migrations import run_migrations
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def reopen(path):
+    db = MemoryDatabase()
+    journal = await open_journal(db, path)
+    return db, journal
+
+
+async def write_leads(db):
+    await run_migrations(db)
+    await db.leads.insert_many([
+        {"id": f"TEST-L{i}", "customer_id": f"TEST-C{i % 2}", "created_date": datetime(2024, 1, i + 1)}
+        for i in range(5)
+    ])
+    await db.leads.update_one({"id": "TEST-L1"}, {"$set": {"status": "Won"}})
+    await db.leads.delete_one({"id": "TEST-L4"})
+    await db.scratch.insert_one({"id": "TEST-S1"})
+    await db.drop_collection("scratch")
+
+
+async def snapshot_of(db):
+    return {
+        name: sorted(await collection.find({}, {"_id": 0}).to_list(None), key=lambda doc: str(doc.get("id")))
+        for name, collection in db.collections.items()
+    }
+
+
+class TestMemoryJournal:
+    """Changes survive a restart through the log and through snapshots"""
+
+    def test_log_replay_restores_documents_and_indexes(self, tmp_path):
+        """Test inserts, updates, deletes and drops are replayed from the log"""
+        async def scenario():
+            db, journal = await reopen(tmp_path)
+            await write_leads(db)
+            before = await snapshot_of(db)
+            await journal.close()
+
+            restored, journal = await reopen(tmp_path)
+            after = await snapshot_of(restored)
+            lead = await restored.leads.find_one({"id": "TEST-L1"}, {"_id": 0})
+            indexes = await restored.leads.index_information()
+            names = await restored.list_collection_names()
+            await journal.close()
+            return before, after, lead, indexes, names
+
+        before, after, lead, indexes, names = run(scenario())
+        assert after == before
+        assert lead["status"] == "Won"
+        assert lead["created_date"] == datetime(2024, 1, 2)
+        assert "id_unique" in indexes and "customer_id" in indexes
+        assert "scratch" not in names
+
+    def test_compaction_replaces_log_with_snapshot(self, tmp_path):
+        """Test compaction writes a snapshot, deletes covered segments and keeps later writes"""
+        async def scenario():
+            db, journal = await reopen(tmp_path)
+            await write_leads(db)
+            await journal.compact()
+            await db.leads.insert_one({"id": "TEST-L9", "customer_id": "TEST-C9"})
+            before = await snapshot_of(db)
+            segments = sorted(p.name for p in tmp_path.glob("log.*.bson"))
+            await journal.close()
+
+            restored, journal = await reopen(tmp_path)
+            after = await snapshot_of(restored)
+            by_customer = await restored.leads.count_documents({"customer_id": "TEST-C9"})
+            await journal.close()
+            return before, after, segments, by_customer
+
+        before, after, segments, by_customer = run(scenario())
+        assert (tmp_path / SNAPSHOT_FILE).exists()
+        assert segments == [segment_name(2)]
+        assert after == before
+        assert by_customer == 1
+
+    def test_torn_record_is_discarded(self, tmp_path):
+        """Test a partly written record at the end of the log is dropped on recovery"""
+        async def scenario():
+            db, journal = await reopen(tmp_path)
+            await db.customers.insert_one({"id": "TEST-C1"})
+            await db.customers.insert_one({"id": "TEST-C2"})
+            await journal.close()
+            segment = tmp_path / segment_name(1)
+            segment.write_bytes(segment.read_bytes()[:-3])
+
+            restored, journal = await reopen(tmp_path)
+            ids = await restored.customers.distinct("id")
+            await journal.close()
+            return ids
+
+        assert run(scenario()) == ["TEST-C1"]
+
+    def test_directory_is_owned_by_one_process(self, tmp_path):
+        """Test a second journal on the same directory is refused"""
+        async def scenario():
+            db, journal = await reopen(tmp_path)
+            second = await open_journal(MemoryDatabase(), tmp_path)
+            await journal.close()
+            return second
+
+        assert run(scenario()) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,236 @@
+"""
+In-Memory Storage Engine - Tests
+Exercises backend/memory_store.py (the demo-mode / test database) with the
+indexes from db_migrations and the pipelines the API runs against MongoDB
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from memory_store import MemoryDatabase
+from db_migrations import run_migrations
+from dashboard_stats import CONTRIBUTION_PIPELINE
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def migrated_db():
+    db = MemoryDatabase()
+    await run_migrations(db)
+    return db
+
+
+def customer(i):
+    return {
+        "id": f"TEST-C{i:03d}",
+        "customer_name": f"Customer {i}",
+        "created_date": f"2024-01-{i % 28 + 1:02d}T00:00:{i % 60:02d}",
+        "tags": ["all", f"group{i % 3}"],
+    }
+
+
+class TestMemoryStoreQueries:
+    """find / count with indexes, operators, sort, skip, limit and projection"""
+
+    def test_indexed_equality_and_in(self):
+        """Test id and $in lookups go through the declared unique index"""
+        async def scenario():
+            db = await migrated_db()
+            await db.customers.insert_many([customer(i) for i in range(50)])
+            found = await db.customers.find_one({"id": "TEST-C007"}, {"_id": 0, "id": 1})
+            several = await db.customers.find({"id": {"$in": ["TEST-C001", "TEST-C002", "missing"]}}).to_list(None)
+            return found, several, db.customers.indexes["id_unique"].ops
+
+        found, several, ops = run(scenario())
+        assert found == {"id": "TEST-C007"}
+        assert [doc["id"] for doc in several] == ["TEST-C001", "TEST-C002"]
+        assert ops == 2
+
+    def test_operators_and_array_fields(self):
+        """Test comparison, regex, $exists, $nin and array element matching"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([customer(i) for i in range(30)])
+            count = db.customers.count_documents
+            return [
+                await count({"tags": "group1"}),
+                await count({"customer_name": {"$regex": "^customer 1", "$options": "i"}}),
+                await count({"created_date": {"$gte": "2024-01-10", "$lt": "2024-01-12"}}),
+                await count({"missing_field": {"$exists": False}}),
+                await count({"tags": {"$nin": ["group0", "group1"]}}),
+                await count({"$or": [{"id": "TEST-C001"}, {"tags.1": "group2"}]}),
+            ]
+
+        assert run(scenario()) == [10, 11, 2, 30, 10, 11]
+
+    def test_sort_skip_limit_projection(self):
+        """Test keyset-style sort on (created_date, id) with skip/limit and projection"""
+        async def scenario():
+            db = await migrated_db()
+            await db.customers.insert_many([customer(i) for i in range(40)])
+            cursor = db.customers.find({}, {"_id": 0, "id": 1}).sort([("created_date", -1), ("id", -1)]).skip(2).limit(3)
+            return await cursor.to_list(None)
+
+        expected = sorted((customer(i) for i in range(40)), key=lambda c: (c["created_date"], c["id"]), reverse=True)
+        assert run(scenario()) == [{"id": c["id"]} for c in expected[2:5]]
+
+    def test_sort_index_walk_sees_writes(self):
+        """Test a sorted page served from the page index reflects later inserts, updates and deletes"""
+        async def scenario():
+            db = await migrated_db()
+            await db.customers.insert_many([customer(i) for i in range(40)])
+            page = lambda: db.customers.find({"tags": "group1"}, {"_id": 0, "id": 1}).sort(
+                [("created_date", -1), ("id", -1)]
+            ).limit(2).to_list(2)
+            first = await page()
+            await db.customers.update_one({"id": "TEST-C001"}, {"$set": {"created_date": "2025-01-01"}})
+            await db.customers.delete_one({"id": first[0]["id"]})
+            await db.customers.insert_one({**customer(99), "created_date": "2025-02-01"})
+            return first, await page(), db.customers.indexes["created_date_id_page"].ops
+
+        first, second, ops = run(scenario())
+        assert second == [{"id": "TEST-C001"}, first[1]]
+        assert ops == 2
+
+    def test_case_insensitive_collation(self):
+        """Test the customer_name_ci index and collation match names case-insensitively"""
+        async def scenario():
+            db = await migrated_db()
+            await db.customers.insert_one(customer(1))
+            return await db.customers.find(
+                {"customer_name": {"$in": ["CUSTOMER 1"]}}
+            ).collation({"locale": "en", "strength": 2}).to_list(None)
+
+        assert [doc["id"] for doc in run(scenario())] == ["TEST-C001"]
+
+    def test_case_insensitive_query_skips_case_sensitive_index(self):
+        """Test a collated query is not answered from an exact-case index or _id"""
+        ci = {"locale": "en", "strength": 2}
+
+        async def scenario():
+            db = MemoryDatabase()
+            await db.vendors.create_index("name")
+            await db.vendors.insert_one({"_id": "ACME-1", "name": "ACME"})
+            by_name = await db.vendors.count_documents({"name": "acme"}, collation=ci)
+            by_id = await db.vendors.count_documents({"_id": "acme-1"}, collation=ci)
+            exact = await db.vendors.count_documents({"name": "acme"})
+            return by_name, by_id, exact
+
+        assert run(scenario()) == (1, 1, 0)
+
+    def test_unsupported_operator_raises(self):
+        """Test operators outside the supported subset fail loudly"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_one(customer(1))
+            return await db.customers.find_one({"id": {"$where": "true"}})
+
+        with pytest.raises(OperationFailure):
+            run(scenario())
+
+
+class TestMemoryStoreWrites:
+    """Updates, upserts, unique indexes and bulk writes"""
+
+    def test_unique_index_rejects_duplicates(self):
+        """Test duplicate ids raise DuplicateKeyError and BulkWriteError with row indexes"""
+        async def scenario():
+            db = await migrated_db()
+            await db.customers.insert_one(customer(1))
+            with pytest.raises(DuplicateKeyError):
+                await db.customers.insert_one(customer(1))
+            with pytest.raises(BulkWriteError) as error:
+                await db.customers.insert_many([customer(2), customer(1), customer(3)], ordered=False)
+            return error.value.details, await db.customers.count_documents({})
+
+        details, total = run(scenario())
+        assert details["nInserted"] == 2
+        assert [e["index"] for e in details["writeErrors"]] == [1]
+        assert total == 3
+
+    def test_update_operators_and_reindexing(self):
+        """Test $set/$inc/$push update the document and its index entries"""
+        async def scenario():
+            db = await migrated_db()
+            await db.leads.insert_one({"id": "TEST-L1", "customer_id": "old", "revision": 0})
+            result = await db.leads.update_one(
+                {"id": "TEST-L1"},
+                {"$set": {"customer_id": "new", "contact.email": "a@test.com"}, "$inc": {"revision": 1}, "$push": {"notes": "x"}}
+            )
+            by_old = await db.leads.count_documents({"customer_id": "old"})
+            lead = await db.leads.find_one({"customer_id": "new"}, {"_id": 0})
+            return result.modified_count, by_old, lead
+
+        modified, by_old, lead = run(scenario())
+        assert modified == 1
+        assert by_old == 0
+        assert lead == {"id": "TEST-L1", "customer_id": "new", "revision": 1, "contact": {"email": "a@test.com"}, "notes": ["x"]}
+
+    def test_upserts_and_find_one_and_update(self):
+        """Test upserts seed from the filter and find_one_and_update returns the new document"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.stats.update_one({"_id": "dashboard"}, {"$inc": {"total": 2}}, upsert=True)
+            result = await db.stats.bulk_write([UpdateOne({"_id": "dashboard"}, {"$inc": {"total": 1}})])
+            job = await db.import_jobs.find_one_and_update(
+                {"id": "TEST-J1", "status": "queued"},
+                {"$set": {"status": "running"}},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            return result.modified_count, await db.stats.find_one({"_id": "dashboard"}), job
+
+        modified, stats, job = run(scenario())
+        assert modified == 1
+        assert stats == {"_id": "dashboard", "total": 3}
+        assert job == {"id": "TEST-J1", "status": "running"}
+
+
+class TestMemoryStoreAggregation:
+    """$lookup / $match / $project pipelines used by the API"""
+
+    def test_contribution_pipeline(self):
+        """Test the dashboard margin contribution pipeline computes PI minus linked PO totals"""
+        async def scenario():
+            db = await migrated_db()
+            await db.proforma_invoices.insert_many([
+                {"id": "TEST-PI1", "total_amount": 1000},
+                {"id": "TEST-PI2", "total_amount": 500},
+            ])
+            await db.purchase_orders.insert_many([
+                {"id": "TEST-PO1", "proforma_invoice_id": "TEST-PI1", "total_amount": 600},
+                {"id": "TEST-PO2", "proforma_invoice_id": "TEST-PI1", "amount": 100},
+            ])
+            return await db.proforma_invoices.aggregate(CONTRIBUTION_PIPELINE).to_list(None)
+
+        assert run(scenario()) == [{"id": "TEST-PI1", "margin_contribution": 300}]
+
+    def test_unwind_group_and_sort(self):
+        """Test $unwind, $group accumulators and $sort"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([customer(i) for i in range(9)])
+            return await db.customers.aggregate([
+                {"$unwind": "$tags"},
+                {"$match": {"tags": {"$ne": "all"}}},
+                {"$group": {"_id": "$tags", "count": {"$sum": 1}, "first": {"$min": "$id"}}},
+                {"$sort": {"_id": 1}},
+            ]).to_list(None)
+
+        assert run(scenario()) == [
+            {"_id": "group0", "count": 3, "first": "TEST-C000"},
+            {"_id": "group1", "count": 3, "first": "TEST-C001"},
+            {"_id": "group2", "count": 3, "first": "TEST-C002"},
+        ]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
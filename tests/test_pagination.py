@@ -0,0 +1,47 @@
+"""
+Keyset Pagination - Tests
+Exercises fetch_page in backend/server.py: walking the cursor visits every
+document once, including legacy rows without a created_date, against the
+in-memory database
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+from server import fetch_page
+from memory_store import MemoryDatabase
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestKeysetPagination:
+    """Cursor pages cover the whole collection in sort order"""
+
+    def test_null_created_date_is_paged_last(self):
+        """Test documents with null or missing created_date are reached after every dated one"""
+        async def scenario():
+            db = MemoryDatabase()
+            await db.customers.insert_many([
+                {"id": "TEST-A", "created_date": "2024-01-01T00:00:00+00:00"},
+                {"id": "TEST-B"},
+                {"id": "TEST-C", "created_date": None},
+                {"id": "TEST-D", "created_date": "2025-01-01T00:00:00+00:00"},
+                {"id": "TEST-E", "created_date": "2024-01-01T00:00:00+00:00"},
+            ])
+            seen, cursor = [], None
+            while True:
+                page = await fetch_page(db.customers, {}, cursor, 2)
+                seen += [item["id"] for item in page["items"]]
+                cursor = page["next_cursor"]
+                if not cursor:
+                    return seen
+
+        assert run(scenario()) == ["TEST-D", "TEST-E", "TEST-A", "TEST-C", "TEST-B"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -40,19 +40,19 @@ class TestPIEnhancements:
         """Clean up test-created data"""
         try:
             # Get all leads and delete TEST_ prefixed ones
-            leads = self.session.get(f"{BASE_URL}/api/leads").json()
+            leads = self.session.get(f"{BASE_URL}/api/leads?legacy=true").json()
             for lead in leads:
                 if lead.get("customer_name", "").startswith("TEST_"):
                     self.session.delete(f"{BASE_URL}/api/leads/{lead['id']}")
             
             # Get all PIs and delete TEST_ prefixed ones
-            pis = self.session.get(f"{BASE_URL}/api/proforma-invoices").json()
+            pis = self.session.get(f"{BASE_URL}/api/proforma-invoices?legacy=true").json()
             for pi in pis:
                 if pi.get("customer_name", "").startswith("TEST_"):
                     self.session.delete(f"{BASE_URL}/api/proforma-invoices/{pi['id']}")
             
             # Get all customers and delete TEST_ prefixed ones
-            customers = self.session.get(f"{BASE_URL}/api/customers").json()
+            customers = self.session.get(f"{BASE_URL}/api/customers?legacy=true").json()
             for customer in customers:
                 if customer.get("customer_name", "").startswith("TEST_"):
                     self.session.delete(f"{BASE_URL}/api/customers/{customer['id']}")
@@ -446,25 +446,180 @@ class TestAPIEndpoints:
         self.session.headers.update({"Authorization": f"Bearer {token}"})
     
     def test_get_proforma_invoices_list(self):
-        """Test GET /api/proforma-invoices returns list"""
+        """Test GET /api/proforma-invoices returns a page"""
         response = self.session.get(f"{BASE_URL}/api/proforma-invoices")
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
-        print(f"✓ GET /api/proforma-invoices returns {len(response.json())} items")
+        data = response.json()
+        assert isinstance(data["items"], list)
+        assert "next_cursor" in data
+        print(f"✓ GET /api/proforma-invoices returns {len(data['items'])} items")
     
     def test_get_leads_list(self):
-        """Test GET /api/leads returns list"""
+        """Test GET /api/leads returns a page"""
         response = self.session.get(f"{BASE_URL}/api/leads")
         assert response.status_code == 200
-        assert isinstance(response.json(), list)
-        print(f"✓ GET /api/leads returns {len(response.json())} items")
+        data = response.json()
+        assert isinstance(data["items"], list)
+        assert "next_cursor" in data
+        print(f"✓ GET /api/leads returns {len(data['items'])} items")
     
     def test_get_customers_list(self):
-        """Test GET /api/customers returns list"""
+        """Test GET /api/customers returns a page"""
         response = self.session.get(f"{BASE_URL}/api/customers")
         assert response.status_code == 200
+        data = response.json()
+        assert isinstance(data["items"], list)
+        assert "next_cursor" in data
+        print(f"✓ GET /api/customers returns {len(data['items'])} items")
+    
+    def test_get_customers_legacy_list(self):
+        """Test GET /api/customers?legacy=true keeps the unpaginated list"""
+        response = self.session.get(f"{BASE_URL}/api/customers?legacy=true")
+        assert response.status_code == 200
         assert isinstance(response.json(), list)
-        print(f"✓ GET /api/customers returns {len(response.json())} items")
+        print(f"✓ GET /api/customers?legacy=true returns {len(response.json())} items")
+    
+    def test_customers_cursor_pagination(self):
+        """Test walking /api/customers with cursor/limit visits every customer once"""
+        expected = {c["id"] for c in self.session.get(f"{BASE_URL}/api/customers?legacy=true").json()}
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.session.get(f"{BASE_URL}/api/customers", params=params)
+            assert response.status_code == 200
+            data = response.json()
+            assert len(data["items"]) <= 2
+            seen.extend(c["id"] for c in data["items"])
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        assert len(seen) == len(set(seen)), "Pages should not overlap"
+        assert set(seen) == expected
+        print(f"✓ Cursor pagination visited {len(seen)} customers")
+    
+    def test_invalid_cursor_rejected(self):
+        """Test a malformed cursor returns 400"""
+        response = self.session.get(f"{BASE_URL}/api/customers", params={"cursor": "not-a-cursor"})
+        assert response.status_code == 400
+    
+    def test_dashboard_kpi_tracks_customers(self):
+        """Test the materialized KPI document follows customer create/delete"""
+        before = self.session.get(f"{BASE_URL}/api/dashboard/kpi").json()["total_customers"]
+        customer = self.session.post(f"{BASE_URL}/api/customers", json={
+            "customer_name": "TEST_KPI_Customer",
+            "contact_number": "9876543210",
+            "email": "kpi@test.com"
+        }).json()
+        assert self.session.get(f"{BASE_URL}/api/dashboard/kpi").json()["total_customers"] == before + 1
+        
+        self.session.delete(f"{BASE_URL}/api/customers/{customer['id']}")
+        assert self.session.get(f"{BASE_URL}/api/dashboard/kpi").json()["total_customers"] == before
+    
+    def test_dashboard_reconcile(self):
+        """Test reconcile rebuilds the KPI document from the collections"""
+        response = self.session.post(f"{BASE_URL}/api/dashboard/reconcile")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["total_customers"] == len(self.session.get(f"{BASE_URL}/api/customers?legacy=true").json())
+
+    def test_customer_list_cache_invalidated_on_write(self):
+        """Test cached customer lists are hit on repeat and dropped on create/delete"""
+        self.session.get(f"{BASE_URL}/api/customers?legacy=true")
+        hits = self.session.get(f"{BASE_URL}/api/cache/stats").json()["hits"]
+        before = self.session.get(f"{BASE_URL}/api/customers?legacy=true").json()
+        assert self.session.get(f"{BASE_URL}/api/cache/stats").json()["hits"] == hits + 1
+
+        customer = self.session.post(f"{BASE_URL}/api/customers", json={
+            "customer_name": "TEST_Cache_Customer",
+            "contact_number": "9876543210",
+            "email": "cache@test.com"
+        }).json()
+        after = self.session.get(f"{BASE_URL}/api/customers?legacy=true").json()
+        assert len(after) == len(before) + 1
+
+        self.session.delete(f"{BASE_URL}/api/customers/{customer['id']}")
+        assert len(self.session.get(f"{BASE_URL}/api/customers?legacy=true").json()) == len(before)
+
+    def test_customer_detail_etag(self):
+        """Test detail GET answers If-None-Match with 304 until the customer is updated"""
+        payload = {"customer_name": "TEST_ETag_Customer", "contact_number": "9876543210", "email": "etag@test.com"}
+        customer = self.session.post(f"{BASE_URL}/api/customers", json=payload).json()
+        url = f"{BASE_URL}/api/customers/{customer['id']}"
+
+        response = self.session.get(url)
+        etag = response.headers.get("ETag")
+        assert response.status_code == 200
+        assert etag
+
+        response = self.session.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+        self.session.put(url, json={**payload, "customer_name": "TEST_ETag_Customer_Updated"})
+        response = self.session.get(url, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers.get("ETag") != etag
+        assert response.json()["customer_name"] == "TEST_ETag_Customer_Updated"
+
+        self.session.delete(url)
+
+    def test_cache_stats(self):
+        """Test the cache stats endpoint exposes hit/miss/eviction counters"""
+        response = self.session.get(f"{BASE_URL}/api/cache/stats")
+        assert response.status_code == 200
+        data = response.json()
+        for key in ["hits", "misses", "evictions", "size", "maxsize", "ttl_seconds"]:
+            assert key in data
+
+    def test_db_pool_stats(self):
+        """Test the pool stats endpoint exposes connection and checkout wait metrics"""
+        response = self.session.get(f"{BASE_URL}/api/db/pool-stats")
+        assert response.status_code == 200
+        data = response.json()
+        for key in ["connections_open", "connections_in_use", "checkouts", "checkout_wait_ms"]:
+            assert key in data
+        assert data["connections_in_use"] <= data["connections_open"]
+
+    def test_db_index_usage_requires_login(self):
+        """Test index usage counters are only served to logged-in users"""
+        assert requests.get(f"{BASE_URL}/api/db/index-usage").status_code in (401, 403)
+        assert self.session.get(f"{BASE_URL}/api/db/index-usage").status_code == 200
+
+    def test_token_cache_stats(self):
+        """Test repeated requests with the same token are served from the token cache"""
+        hits = self.session.get(f"{BASE_URL}/api/auth/token-cache-stats").json()["hits"]
+        response = self.session.get(f"{BASE_URL}/api/auth/token-cache-stats")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["hits"] == hits + 1
+        assert data["size"] <= data["maxsize"]
+
+    def test_refresh_token_rotation(self):
+        """Test /auth/refresh issues a new pair, refuses a spent token and logout ends the session"""
+        login = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "sunil@bora.tech",
+            "password": "sunil@1202"
+        }).json()
+        response = requests.post(f"{BASE_URL}/api/auth/refresh", json={"refresh_token": login["refresh_token"]})
+        assert response.status_code == 200
+        refreshed = response.json()
+        headers = {"Authorization": f"Bearer {refreshed['token']}"}
+        assert requests.get(f"{BASE_URL}/api/auth/verify", headers=headers).status_code == 200
+
+        # A spent token is refused; replayed right away (another tab) it leaves the session alone
+        response = requests.post(f"{BASE_URL}/api/auth/refresh", json={"refresh_token": login["refresh_token"]})
+        assert response.status_code == 401
+        assert requests.get(f"{BASE_URL}/api/auth/verify", headers=headers).status_code == 200
+
+        # Logout revokes the session, including the refreshed access token
+        response = requests.post(f"{BASE_URL}/api/auth/logout", json={"refresh_token": refreshed["refresh_token"]})
+        assert response.status_code == 200
+        assert requests.get(f"{BASE_URL}/api/auth/verify", headers=headers).status_code == 401
+        response = requests.post(f"{BASE_URL}/api/auth/refresh", json={"refresh_token": refreshed["refresh_token"]})
+        assert response.status_code == 401
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+"""
+Response Cache - Tests
+Exercises backend/response_cache.py: invalidation by collection and reads
+that race a write
+"""
+import pytest
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import response_cache
+from response_cache import CacheBackend, TTLCache, cached_response, invalidate_cache, set_cache_backend
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache():
+    previous = response_cache.cache
+    set_cache_backend(TTLCache(maxsize=16, ttl=60))
+    yield
+    set_cache_backend(previous)
+
+
+class TestResponseCache:
+    """Cached responses are dropped or never stored when their collections change"""
+
+    def test_invalidation_by_collection(self):
+        """Test a write to a read collection drops the entry and others are kept"""
+        calls = []
+
+        @cached_response("customers")
+        async def list_customers(page: int):
+            calls.append(page)
+            return {"page": page, "call": len(calls)}
+
+        async def scenario():
+            first = await list_customers(page=1)
+            cached = await list_customers(page=1)
+            invalidate_cache("leads")
+            still_cached = await list_customers(page=1)
+            invalidate_cache("customers")
+            return first, cached, still_cached, await list_customers(page=1)
+
+        first, cached, still_cached, refetched = run(scenario())
+        assert first == cached == still_cached
+        assert refetched["call"] == 2
+
+    def test_read_racing_a_write_is_not_stored(self):
+        """Test a result computed across an invalidation is returned but not cached"""
+        calls = []
+
+        @cached_response("customers")
+        async def list_customers():
+            calls.append(1)
+            if len(calls) == 1:
+                # The write lands (and invalidates) while this read is in flight
+                invalidate_cache("customers")
+            return {"call": len(calls)}
+
+        async def scenario():
+            return await list_customers(), await list_customers(), await list_customers()
+
+        assert run(scenario()) == ({"call": 1}, {"call": 2}, {"call": 2})
+
+    def test_backend_interface_is_abstract(self):
+        """Test a backend missing methods cannot be instantiated"""
+        class Partial(CacheBackend):
+            def get(self, key):
+                return None
+
+        with pytest.raises(TypeError):
+            Partial()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
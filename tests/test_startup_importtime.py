@@ -0,0 +1,67 @@
+"""
+Startup Profile - Import Time Budget
+Imports backend/server.py under `python -X importtime` in a fresh interpreter
+and checks that heavy, rarely used machinery stays out of the import path and
+that the total import time stays within budget
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# About 1.5x the measured median (~900 ms), so an eager heavy import fails
+# it; raise it on a slow runner rather than loosening the default
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1350"))
+
+# Loaded on first use (Excel import/export, reminder emails, scheduler start)
+LAZY_MODULES = ["openpyxl", "aiosmtplib", "email_service", "mail_dispatcher", "apscheduler"]
+
+
+def profile_import(module="server"):
+    """
+    Import `module` in a clean interpreter
+
+    Returns:
+        dict: {top-level module name: cumulative import time in ms}
+    """
+    env = {k: v for k, v in os.environ.items() if k not in ("MONGO_URI", "MONGO_URL")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        top = name.strip().split(".")[0]
+        timings[top] = max(timings.get(top, 0), int(cumulative) / 1000)
+    return timings
+
+
+@pytest.fixture(scope="module")
+def timings():
+    return profile_import()
+
+
+class TestStartupImportTime:
+    """Import-time profile of the API module"""
+
+    def test_heavy_modules_are_lazy(self, timings):
+        """Test Excel, email and scheduler libraries are not imported with the app"""
+        eager = [name for name in LAZY_MODULES if name in timings]
+        assert eager == [], f"imported at startup: {eager}"
+
+    def test_import_within_budget(self, timings):
+        """Test importing server stays within IMPORT_BUDGET_MS"""
+        assert timings["server"] <= IMPORT_BUDGET_MS, (
+            f"import server took {timings['server']:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)"
+        )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
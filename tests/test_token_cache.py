@@ -0,0 +1,79 @@
+"""
+JWT Verification Cache - Tests
+Exercises backend/token_cache.py: decoded claims are reused until the token
+expires, failures are never cached, and the LRU stays bounded
+"""
+import pytest
+import sys
+import time
+from pathlib import Path
+
+import jwt
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+import token_cache
+from token_cache import TokenCache, decode_token
+
+SECRET = "test-secret-for-token-cache-tests!"
+
+
+def make_token(seconds=60, **claims):
+    return jwt.encode({"email": "test@bora.tech", "exp": int(time.time()) + seconds, **claims}, SECRET, algorithm="HS256")
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(token_cache, "token_cache", TokenCache(maxsize=2))
+    return token_cache.token_cache
+
+
+class TestTokenCache:
+    """decode_token caching behaviour"""
+
+    def test_repeat_decode_is_a_hit(self, fresh_cache):
+        """Test the second decode of a token is served from the cache"""
+        token = make_token()
+        first = decode_token(token, SECRET, ["HS256"])
+        second = decode_token(token, SECRET, ["HS256"])
+        assert first == second
+        assert (fresh_cache.hits, fresh_cache.misses) == (1, 1)
+
+    def test_claims_are_copied(self, fresh_cache):
+        """Test callers modifying the claims do not change the cached entry"""
+        token = make_token()
+        decode_token(token, SECRET, ["HS256"])["email"] = "changed"
+        assert decode_token(token, SECRET, ["HS256"])["email"] == "test@bora.tech"
+
+    def test_expired_entry_is_rechecked(self, fresh_cache):
+        """Test a cached token past its exp fails verification again"""
+        token = make_token(seconds=1)
+        decode_token(token, SECRET, ["HS256"])
+        time.sleep(1.1)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            decode_token(token, SECRET, ["HS256"])
+        assert fresh_cache.expirations == 1
+        assert len(fresh_cache.entries) == 0
+
+    def test_invalid_tokens_are_not_cached(self, fresh_cache):
+        """Test tokens with a bad signature raise every time and are never stored"""
+        token = jwt.encode({"email": "x", "exp": int(time.time()) + 60}, "another-secret-for-token-cache-tests", algorithm="HS256")
+        for _ in range(2):
+            with pytest.raises(jwt.InvalidSignatureError):
+                decode_token(token, SECRET, ["HS256"])
+        assert len(fresh_cache.entries) == 0
+        assert fresh_cache.misses == 2
+
+    def test_least_recently_used_is_evicted(self, fresh_cache):
+        """Test the cache keeps at most maxsize tokens, dropping the least recently used"""
+        tokens = [make_token(name=str(i)) for i in range(3)]
+        decode_token(tokens[0], SECRET, ["HS256"])
+        decode_token(tokens[1], SECRET, ["HS256"])
+        decode_token(tokens[0], SECRET, ["HS256"])
+        decode_token(tokens[2], SECRET, ["HS256"])
+        assert fresh_cache.evictions == 1
+        assert fresh_cache.get(tokens[0]) is not None
+        assert fresh_cache.get(tokens[1]) is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])